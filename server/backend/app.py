@@ -315,21 +315,43 @@ from PIL import Image
 import io
 import base64
 import os
+import random
+import threading
 import warnings
 from tensorflow.keras.applications.efficientnet import preprocess_input
+import sys
+
+# Shared server infrastructure (server/common)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.metrics import REGISTRY as metrics, collect_stages, register_metrics_endpoint
+from common.request_log import RequestLogger, model_file_version, stage_timings
 
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)
+register_metrics_endpoint(app, service="backend")
+
+# Structured per-request log records (JSON lines, background writer)
+request_log = RequestLogger.from_env("backend")
 
 # ===========================
 # CONFIGURATION
 # ===========================
-MODEL_PATH = "models/final_finetuned_model.keras"
-ENCODER_PATH = "metadata/encoders/onehot_encoder.pkl"
-SCALER_PATH = "metadata/encoders/scaler.pkl"
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_PATH = BASE_DIR / "models/final_finetuned_model.keras"
+ENCODER_PATH = BASE_DIR / "metadata/encoders/onehot_encoder.pkl"
+SCALER_PATH = BASE_DIR / "metadata/encoders/scaler.pkl"
 IMG_SIZE = (224, 224)
+API_VERSION = "3.1.0-confidence-fixed"
+
+# "production": lean request path (reduced-size decode, preallocated batch
+#               buffer, no per-request verification)
+# "debug":      reference path with verbose logging and verification on
+#               every request
+PREPROCESS_MODE = os.environ.get("PREPROCESS_MODE", "production").lower()
+# Fraction of production requests that still run verify_preprocessing
+PREPROCESS_VERIFY_SAMPLE_RATE = float(os.environ.get("PREPROCESS_VERIFY_SAMPLE_RATE", "0"))
 
 # ===========================
 # LOAD MODEL AND ENCODERS
@@ -341,6 +363,7 @@ try:
     scaler = joblib.load(SCALER_PATH)
     print("✅ Model loaded successfully!")
     print("✅ Encoders loaded successfully!")
+    MODEL_VERSION = model_file_version(MODEL_PATH)
 except Exception as e:
     print(f"❌ Error loading model: {e}")
     import traceback
@@ -348,6 +371,7 @@ except Exception as e:
     model = None
     encoder = None
     scaler = None
+    MODEL_VERSION = None
 
 # ===========================
 # CONFIGURATION FOR METADATA
@@ -379,13 +403,29 @@ SPECIES_MAPPING = {
 # ===========================
 # HELPER FUNCTIONS
 # ===========================
-def encode_metadata(agar, species, time_hr):
+def parse_time_hours(colony_age):
+    """Extract time in hours from a colony age string ("48 hours" -> 48, default 48)."""
+    time_hr_str = ''.join(filter(str.isdigit, str(colony_age)))
+    return int(time_hr_str) if time_hr_str else 48
+
+def determine_species(characteristics):
+    """Map the selected bacterial characteristics to a species label for metadata encoding."""
+    if "Oxidase positive" in characteristics and "Gram negative" in characteristics:
+        return "Unknown"
+    if "Burkholderia" in characteristics or "pseudomallei" in str(characteristics).lower():
+        return "Bpseudomallei"
+    return "Unknown"
+
+def encode_metadata_sklearn(agar, species, time_hr):
     """
-    Encode metadata into feature vector.
+    Encode metadata into feature vector with the fitted sklearn transformers.
     
     ✅ MATCHES split_data_correctly.py:
        - OneHotEncoder for categorical features
        - StandardScaler for numeric features
+    
+    This is the reference path: the request path uses METADATA_TABLE, which
+    is compiled from the same transformers and verified against this function.
     """
     try:
         with warnings.catch_warnings():
@@ -405,10 +445,6 @@ def encode_metadata(agar, species, time_hr):
             # Concatenate
             metadata_vector = np.concatenate([encoded_cats[0], scaled_nums[0]], axis=0)
             
-            print(f"   ✅ Metadata encoded:")
-            print(f"      Agar: {agar_normalized}, Species: {species_normalized}, Time: {time_hr}h")
-            print(f"      Vector shape: {metadata_vector.shape}")
-            
             return metadata_vector.astype(np.float32)
     
     except Exception as e:
@@ -417,6 +453,102 @@ def encode_metadata(agar, species, time_hr):
         traceback.print_exc()
         return None
 
+def build_metadata_table(encoder, scaler):
+    """
+    Compile the fitted encoder and scaler into a lookup table.
+    
+    Every request normalizes agar/species through AGAR_MAPPING and
+    SPECIES_MAPPING, so only a handful of one-hot prefixes can ever occur;
+    they are transformed once here. StandardScaler is affine in time_hr, so
+    it is captured as slope/intercept by transforming 0 and 1.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        
+        pairs = [
+            (agar_value, species_value)
+            for agar_value in sorted(set(AGAR_MAPPING.values()))
+            for species_value in sorted(set(SPECIES_MAPPING.values()))
+        ]
+        encoded = encoder.transform(np.array(pairs, dtype=object))
+        if hasattr(encoded, "toarray"):
+            encoded = encoded.toarray()
+        encoded = np.asarray(encoded, dtype=np.float64)
+        
+        intercept = np.asarray(scaler.transform(np.array([[0.0]])), dtype=np.float64)[0]
+        slope = np.asarray(scaler.transform(np.array([[1.0]])), dtype=np.float64)[0] - intercept
+    
+    return {
+        "prefixes": {pair: row for pair, row in zip(pairs, encoded)},
+        "prefix_width": int(encoded.shape[1]),
+        "time_slope": slope,
+        "time_intercept": intercept,
+        "width": int(encoded.shape[1] + slope.shape[0]),
+    }
+
+def lookup_metadata(table, agar_normalized, species_normalized, time_hr):
+    """Encode already-normalized metadata using the precomputed table."""
+    k = table["prefix_width"]
+    metadata_vector = np.empty(table["width"], dtype=np.float32)
+    metadata_vector[:k] = table["prefixes"][(agar_normalized, species_normalized)]
+    metadata_vector[k:] = table["time_slope"] * float(time_hr) + table["time_intercept"]
+    return metadata_vector
+
+def verify_metadata_table(table, sample_times=(0, 12, 24, 36, 48, 72, 96, 120)):
+    """
+    Check the lookup table against the sklearn transformers for every
+    agar/species combination and a spread of incubation times.
+    
+    Returns a list of mismatch descriptions (empty when the table is exact).
+    """
+    mismatches = []
+    for agar_value, species_value in table["prefixes"]:
+        for time_hr in sample_times:
+            expected = encode_metadata_sklearn(agar_value, species_value, time_hr)
+            actual = lookup_metadata(table, agar_value, species_value, time_hr)
+            if (expected is None or expected.shape != actual.shape
+                    or not np.allclose(expected, actual, rtol=1e-6, atol=1e-6)):
+                mismatches.append(f"{agar_value}/{species_value}/{time_hr}h")
+    return mismatches
+
+def encode_metadata(agar, species, time_hr):
+    """
+    Encode metadata into feature vector.
+    
+    Uses the precomputed METADATA_TABLE when it passed verification at
+    startup, otherwise falls back to the sklearn transformers.
+    """
+    if METADATA_TABLE is None:
+        return encode_metadata_sklearn(agar, species, time_hr)
+    
+    try:
+        agar_normalized = AGAR_MAPPING.get(agar, "Blood")
+        species_normalized = SPECIES_MAPPING.get(species.lower(), "Unknown")
+        return lookup_metadata(METADATA_TABLE, agar_normalized, species_normalized, time_hr)
+    
+    except Exception as e:
+        print(f"   ❌ Error encoding metadata: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+# ===========================
+# PRECOMPUTED METADATA TABLE
+# ===========================
+METADATA_TABLE = None
+if encoder is not None and scaler is not None:
+    try:
+        _table = build_metadata_table(encoder, scaler)
+        _mismatches = verify_metadata_table(_table)
+        if _mismatches:
+            print(f"⚠️  Metadata lookup table disagrees with sklearn for {len(_mismatches)} cases "
+                  f"(e.g. {', '.join(_mismatches[:3])}); using sklearn transformers per request")
+        else:
+            METADATA_TABLE = _table
+            print(f"✅ Metadata lookup table verified ({len(_table['prefixes'])} agar/species combinations)")
+    except Exception as e:
+        print(f"⚠️  Could not build metadata lookup table: {e}; using sklearn transformers per request")
+
 def preprocess_image(image_data):
     """
     Preprocess image for model input.
@@ -482,6 +614,80 @@ def preprocess_image(image_data):
         traceback.print_exc()
         return None
 
+def decode_image_bytes(image_data):
+    """Return raw image bytes from a base64 string (optionally a data URL) or bytes."""
+    if isinstance(image_data, str):
+        if ',' in image_data:
+            image_data = image_data.split(',', 1)[1]
+        return base64.b64decode(image_data)
+    return image_data
+
+def load_gray_image(image_bytes, size=IMG_SIZE):
+    """
+    Open an image as grayscale, decoding at reduced size where possible.
+    
+    For JPEG, draft() asks libjpeg to decode straight to a single luma channel
+    at the smallest DCT scale that is still >= size, so a 12 MP phone photo is
+    never materialized at full resolution. Other formats decode normally.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', size)
+    if img.mode != 'L':
+        img = img.convert('L')
+    return img
+
+_batch_buffers = threading.local()
+
+def _batch_buffer():
+    """Per-thread preallocated (1, H, W, 3) float32 model input buffer."""
+    buf = getattr(_batch_buffers, "buf", None)
+    if buf is None:
+        buf = np.empty((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+        _batch_buffers.buf = buf
+    return buf
+
+def prepare_image_batch(img_gray, out=None):
+    """
+    Resize a grayscale PIL image in one step and write it into a batch buffer.
+    
+    The gray plane is broadcast across the three channels during the copy
+    into the float32 buffer instead of being stacked into a new array.
+    The returned array is reused by the next call on the same thread.
+    """
+    if img_gray.size != IMG_SIZE:
+        img_gray = img_gray.resize(IMG_SIZE)
+    if out is None:
+        out = _batch_buffer()
+    out[0] = np.asarray(img_gray)[:, :, np.newaxis]
+    return preprocess_input(out)
+
+def preprocess_image_fast(image_data):
+    """
+    Production preprocessing: same steps as preprocess_image (grayscale,
+    224x224, 3 channels, EfficientNet preprocess_input) without the
+    intermediate copies, full-resolution decode or logging.
+    """
+    try:
+        return prepare_image_batch(load_gray_image(decode_image_bytes(image_data)))
+    except Exception as e:
+        print(f"   ❌ Error preprocessing image: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def run_model(img_array, metadata_vector):
+    """Run the CNN on a preprocessed image batch and metadata vector; returns the raw sigmoid output."""
+    metadata_batch = np.expand_dims(metadata_vector, axis=0)
+    with metrics.stage("cnn_inference"):
+        prediction = model.predict([img_array, metadata_batch], verbose=0)
+    return float(prediction[0][0])
+
+def should_verify_preprocessing():
+    """Verification runs on every request in debug mode, sampled otherwise."""
+    if PREPROCESS_MODE == "debug":
+        return True
+    return PREPROCESS_VERIFY_SAMPLE_RATE > 0 and random.random() < PREPROCESS_VERIFY_SAMPLE_RATE
+
 def verify_preprocessing(img_array):
     """
     Verify that preprocessing matches training expectations
@@ -507,8 +713,9 @@ def health_check():
         "status": "healthy",
         "model_loaded": bool(model is not None),
         "encoders_loaded": bool(encoder is not None and scaler is not None),
-        "version": "3.1.0-confidence-fixed",
+        "version": API_VERSION,
         "preprocessing": "Grayscale → 3-channel → EfficientNet preprocess_input",
+        "preprocessing_mode": PREPROCESS_MODE,
         "confidence_logic": "Fixed - Flips confidence for negative results",
         "model_type": "EfficientNetB0 + Metadata MLP"
     }), 200
@@ -531,18 +738,32 @@ def predict():
     - Proper metadata encoding
     - EfficientNet preprocessing
     - ✅ CORRECTED confidence logic (flips for negative results)
+    - One structured log record per request, written off the request thread
     """
+    log_record = {"endpoint": "/predict", "model_version": MODEL_VERSION, "api_version": API_VERSION}
+    
+    with collect_stages() as stages:
+        payload, status = run_prediction(log_record)
+    
+    log_record["status"] = status
+    log_record["timings_ms"] = stage_timings(stages)
+    request_log.log(log_record)
+    
+    return jsonify(payload), status
+
+def run_prediction(log_record):
+    """Handles one /predict request; returns (JSON payload, HTTP status)."""
     try:
         if model is None or encoder is None or scaler is None:
-            return jsonify({
+            return {
                 "error": "Model or encoders not loaded",
                 "message": "ML model or encoders failed to load. Please check server logs."
-            }), 500
+            }, 500
         
         data = request.get_json()
         
         if not data:
-            return jsonify({"error": "No data provided"}), 400
+            return {"error": "No data provided"}, 400
         
         # Extract parameters
         image_base64 = data.get('image')
@@ -551,53 +772,44 @@ def predict():
         characteristics = data.get('characteristics', [])
         
         if not image_base64:
-            return jsonify({"error": "No image provided"}), 400
-        
-        print(f"\n{'='*80}")
-        print(f"🔮 PROCESSING PREDICTION REQUEST")
-        print(f"{'='*80}")
-        print(f"📋 Input Parameters:")
-        print(f"   Agar: {agar}")
-        print(f"   Colony age: {colony_age}")
-        print(f"   Characteristics: {characteristics}")
+            return {"error": "No image provided"}, 400
         
         # Extract time in hours from colony age string
-        time_hr_str = ''.join(filter(str.isdigit, colony_age))
-        time_hr = int(time_hr_str) if time_hr_str else 48
+        time_hr = parse_time_hours(colony_age)
         
         # Determine species
-        species = "Unknown"
-        if "Oxidase positive" in characteristics and "Gram negative" in characteristics:
-            species = "Unknown"
-        elif "Burkholderia" in characteristics or "pseudomallei" in str(characteristics).lower():
-            species = "Bpseudomallei"
+        species = determine_species(characteristics)
+        
+        log_record["metadata"] = {
+            "agar": agar,
+            "colony_age": colony_age,
+            "time_hours": time_hr,
+            "species": species,
+        }
         
         # ✅ Preprocess image (Grayscale conversion + EfficientNet)
-        print(f"\n🖼️  IMAGE PROCESSING:")
-        img_array = preprocess_image(image_base64)
+        with metrics.stage("image_preprocess"):
+            if PREPROCESS_MODE == "debug":
+                print(f"\n🖼️  IMAGE PROCESSING:")
+                img_array = preprocess_image(image_base64)
+            else:
+                img_array = preprocess_image_fast(image_base64)
         if img_array is None:
-            return jsonify({"error": "Failed to process image"}), 400
+            log_record["error"] = "Failed to process image"
+            return {"error": "Failed to process image"}, 400
         
-        # Verify preprocessing
-        preproc_checks = verify_preprocessing(img_array)
-        if not preproc_checks['shape_correct']:
-            print(f"   ⚠️  WARNING: Image shape mismatch! Expected (1, 224, 224, 3), got {img_array.shape}")
+        # Verify preprocessing (every request in debug mode, sampled in production)
+        preproc_checks = verify_preprocessing(img_array) if should_verify_preprocessing() else None
         
         # ✅ Encode metadata (matches training encoding)
-        print(f"\n🔤 METADATA ENCODING:")
-        metadata_vector = encode_metadata(agar, species, time_hr)
+        with metrics.stage("metadata_encode"):
+            metadata_vector = encode_metadata(agar, species, time_hr)
         if metadata_vector is None:
-            return jsonify({"error": "Failed to encode metadata"}), 400
-        
-        metadata_batch = np.expand_dims(metadata_vector, axis=0)
+            log_record["error"] = "Failed to encode metadata"
+            return {"error": "Failed to encode metadata"}, 400
         
         # ✅ Make prediction
-        print(f"\n🤖 MODEL PREDICTION:")
-        print(f"   Running inference...")
-        prediction = model.predict([img_array, metadata_batch], verbose=0)
-        model_raw_output = float(prediction[0][0])
-        
-        print(f"   ✅ Raw model output: {model_raw_output:.4f}")
+        model_raw_output = run_model(img_array, metadata_vector)
         
         # ===========================
         # ✅ CORRECTED CONFIDENCE LOGIC
@@ -626,10 +838,18 @@ def predict():
         
         display_confidence_pct = float(round(display_confidence * 100, 2))
         
-        print(f"   📊 Model Raw Output: {model_raw_output:.4f}")
-        print(f"   📊 Display Confidence: {display_confidence:.4f} ({display_confidence_pct}%)")
-        print(f"   📊 Result: {result}")
-        print(f"   📊 Confidence Level: {confidence_level}")
+        log_record.update({
+            "probability": round(model_raw_output, 4),
+            "is_bpseudo": bool(is_bpseudo),
+            "confidence_level": confidence_level,
+        })
+        if request_log.sample_debug() or PREPROCESS_MODE == "debug":
+            log_record["debug"] = {
+                "characteristics": characteristics,
+                "preprocess_mode": PREPROCESS_MODE,
+                "preprocessing_checks": preproc_checks,
+                "metadata_vector": [round(float(v), 6) for v in metadata_vector],
+            }
         
         # ✅ Prepare comprehensive response (all values JSON-serializable)
         response = {
@@ -653,36 +873,32 @@ def predict():
                 "image_format": "Grayscale → 3-channel RGB",
                 "size": f"{IMG_SIZE[0]}x{IMG_SIZE[1]}",
                 "normalization": "EfficientNet preprocess_input ([-1, 1])",
-                "verification": {
-                    "shape_correct": bool(preproc_checks['shape_correct']),
-                    "dtype_correct": bool(preproc_checks['dtype_correct']),
-                    "range_correct": bool(preproc_checks['range_correct']),
-                    "value_range": f"[{float(preproc_checks['min_value']):.3f}, {float(preproc_checks['max_value']):.3f}]"
-                }
+                "mode": PREPROCESS_MODE,
             },
             "model_version": "EfficientNetB0 + Metadata MLP",
-            "api_version": "3.1.0-confidence-fixed"
+            "api_version": API_VERSION
         }
         
-        print(f"\n✅ PREDICTION COMPLETE:")
-        print(f"   Result: {result}")
-        print(f"   Confidence: {display_confidence_pct}%")
-        print(f"{'='*80}\n")
+        if preproc_checks is not None:
+            response["preprocessing_details"]["verification"] = {
+                "shape_correct": bool(preproc_checks['shape_correct']),
+                "dtype_correct": bool(preproc_checks['dtype_correct']),
+                "range_correct": bool(preproc_checks['range_correct']),
+                "value_range": f"[{float(preproc_checks['min_value']):.3f}, {float(preproc_checks['max_value']):.3f}]"
+            }
         
-        return jsonify(response), 200
+        return response, 200
     
     except Exception as e:
-        print(f"\n❌ ERROR IN PREDICTION:")
-        print(f"   {str(e)}")
         import traceback
-        traceback.print_exc()
-        print(f"{'='*80}\n")
+        log_record["error"] = str(e)
+        log_record["traceback"] = traceback.format_exc()
         
-        return jsonify({
+        return {
             "error": "Prediction failed",
             "message": str(e),
             "api_version": "3.1.0"
-        }), 500
+        }, 500
 
 def get_interpretation(model_raw_output, agar):
     """
@@ -779,6 +995,12 @@ def test_preprocessing():
         
         checks = verify_preprocessing(img_array)
         
+        # Compare the production path against the reference path
+        fast_array = preprocess_image_fast(image_base64)
+        production_max_abs_diff = (
+            float(np.max(np.abs(fast_array - img_array))) if fast_array is not None else None
+        )
+        
         return jsonify({
             "status": "✅ Success" if all(checks.values()) else "⚠️ Check details",
             "preprocessing_checks": {
@@ -796,6 +1018,10 @@ def test_preprocessing():
             "normalization": "EfficientNet preprocess_input",
             "expected_range": "[-1, 1] approximately",
             "image_format": "Grayscale → 3-channel RGB",
+            "production_mode": {
+                "active": PREPROCESS_MODE == "production",
+                "max_abs_diff_vs_reference": production_max_abs_diff,
+            },
             "note": "✅ Preprocessing matches training pipeline"
         }), 200
     
@@ -852,7 +1078,7 @@ def model_info():
             "7. Run inference",
             "8. ✅ Apply corrected confidence logic"
         ],
-        "api_version": "3.1.0-confidence-fixed"
+        "api_version": API_VERSION
     }), 200
 
 # ===========================
@@ -866,7 +1092,8 @@ def not_found(error):
             "/health",
             "/predict",
             "/test-preprocessing",
-            "/info"
+            "/info",
+            "/metrics"
         ]
     }), 404
 
@@ -892,6 +1119,7 @@ if __name__ == '__main__':
     print(f"   🔮 /predict             → Make predictions")
     print(f"   🧪 /test-preprocessing  → Test image preprocessing")
     print(f"   ℹ️  /info               → Model information")
+    print(f"   📈 /metrics            → Prometheus metrics")
     print(f"\n⚙️  PREPROCESSING PIPELINE:")
     print(f"   1. Convert image to GRAYSCALE")
     print(f"   2. Expand grayscale to 3-channel RGB")
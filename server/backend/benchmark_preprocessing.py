@@ -0,0 +1,111 @@
+"""
+Benchmark: reference vs production image preprocessing
+
+Measures the per-request cost of the /predict preprocessing step in both
+modes of app.py:
+
+    reference  -> preprocess_image() + verify_preprocessing()
+    production -> preprocess_image_fast()
+
+Usage:
+    python benchmark_preprocessing.py                      # synthetic 12 MP JPEG
+    python benchmark_preprocessing.py --image plate.jpg    # real photo
+    python benchmark_preprocessing.py --iterations 200 --width 3000 --height 4000
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+import app
+
+
+def synthetic_jpeg(width, height, quality=85):
+    """Phone-sized JPEG of a plate-like radial gradient with noise."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    r = np.hypot(xx - width / 2, yy - height / 2) / (min(width, height) / 2)
+    base = np.clip(200 - 90 * r, 20, 255)
+    rgb = np.stack([base, base * 0.9, base * 0.7], axis=2)
+    rgb += rng.normal(0, 8, rgb.shape)
+    img = Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), "RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def time_calls(fn, payload, iterations, warmup=3):
+    for _ in range(warmup):
+        fn(payload)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(payload)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "mean_ms": statistics.fmean(samples),
+    }
+
+
+def reference(payload):
+    # The reference path prints on every call; discard it so terminal speed
+    # does not dominate the measurement.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.verify_preprocessing(app.preprocess_image(payload))
+
+
+def production(payload):
+    return app.preprocess_image_fast(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Path to a real plate photo (default: synthetic JPEG)")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_bytes = f.read()
+        source = args.image
+    else:
+        image_bytes = synthetic_jpeg(args.width, args.height)
+        source = f"synthetic {args.width}x{args.height} JPEG"
+    payload = base64.b64encode(image_bytes).decode("ascii")
+
+    ref = reference(payload)
+    fast = production(payload)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ref_array = app.preprocess_image(payload)
+    max_diff = float(np.max(np.abs(fast - ref_array)))
+
+    results = {
+        "reference": time_calls(reference, payload, args.iterations),
+        "production": time_calls(production, payload, args.iterations),
+    }
+
+    print(f"\nInput: {source} ({len(image_bytes) / 1024:.0f} KB), {args.iterations} iterations")
+    print(f"{'mode':<12}{'median ms':>12}{'p95 ms':>12}{'mean ms':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['median_ms']:>12.2f}{r['p95_ms']:>12.2f}{r['mean_ms']:>12.2f}")
+
+    saving = results["reference"]["median_ms"] - results["production"]["median_ms"]
+    speedup = results["reference"]["median_ms"] / max(results["production"]["median_ms"], 1e-9)
+    print(f"\nPer-request saving (median): {saving:.2f} ms ({speedup:.1f}x faster)")
+    print(f"Reference verification range_correct: {ref['range_correct']}")
+    print(f"Max abs pixel difference production vs reference: {max_diff:.2f} (0-255 scale)")
+
+
+if __name__ == "__main__":
+    main()
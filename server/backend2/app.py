@@ -1,16 +1,6 @@
 import sys
 import os
 
-# ============================================================
-# Fix Windows console encoding
-# Prevents crash if logs contain special characters.
-# ============================================================
-if sys.stdout.encoding != "utf-8":
-    sys.stdout.reconfigure(encoding="utf-8", errors="replace")
-
-if sys.stderr.encoding != "utf-8":
-    sys.stderr.reconfigure(encoding="utf-8", errors="replace")
-
 
 # pyrefly: ignore [missing-import]
 from flask import Flask, request, jsonify   
@@ -19,19 +9,44 @@ from flask_cors import CORS
 import joblib
 import base64
 import io
+import time
+from contextlib import nullcontext
 # pyrefly: ignore [missing-import]
 from PIL import Image
+import cv2
+import numpy as np
 import pandas as pd
 
 # ============================================================
 # Import project feature extraction pipeline
 # These MUST match the same feature extraction used in training.
 # ============================================================
-from src.preprocessing import preprocess_image_for_features
+from src import preprocessing
+from src.preprocessing import (
+    TTA_TRANSFORMS, augmented_views, crop_plate, detect_plates, standardize_image, standardize_image_native,
+)
 from src.roberts_features import extract_roberts_features
 from src.texture_features import extract_texture_features
 from src.colony_features import extract_colony_features
-from src.config import MODEL_PATH, DECISION_THRESHOLD
+from src.config import (
+    DEBUG_ARTIFACTS_DIR, DECISION_THRESHOLD, DRIFT_REFERENCE_PATH, FEATURE_IMAGE_SIZE, MODEL_PATH, PROFILES_DIR,
+    SHADOW_DIR, SIMILAR_INDEX_DIR, THRESHOLD_TABLE_PATH,
+)
+from src.artifacts import capturing, not_capturing
+from src.drift import DRIFT_HALF_LIFE, DriftMonitor
+from src.quality import assess_quality, thumbnail as quality_thumbnail
+from src.similar_index import SimilarCaseIndex
+from src.tiled_features import extract_tiled_features
+from src.thresholds import load_threshold_table, lookup_threshold
+
+# Shared server infrastructure (server/common)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.concurrency import StepGraph
+from common.debug_artifacts import DebugArtifactWriter
+from common.metrics import REGISTRY as metrics, collect_stages, instrument_function, register_metrics_endpoint
+from common.profiling import RequestProfiler, caller_allowed, profiling_requested
+from common.request_log import RequestLogger, model_file_version, stage_timings
+from common.shadow import ShadowEvaluator
 
 
 # ============================================================
@@ -39,6 +54,18 @@ from src.config import MODEL_PATH, DECISION_THRESHOLD
 # ============================================================
 app = Flask(__name__)
 CORS(app)
+register_metrics_endpoint(app, service="backend2")
+
+# Structured per-request log records (JSON lines, background writer)
+request_log = RequestLogger.from_env("backend2")
+
+# Sampled mask / gray / edge / binary images per request (background writer,
+# bounded queue, daily disk quota). Off unless DEBUG_ARTIFACT_SAMPLE_RATE > 0.
+debug_artifacts = DebugArtifactWriter.from_env(DEBUG_ARTIFACTS_DIR)
+
+# Time the steps inside standardize_image without touching the feature code.
+instrument_function(preprocessing, "detect_plate_mask")
+instrument_function(preprocessing, "normalize_gray", stage="clahe")
 
 
 # ============================================================
@@ -46,6 +73,7 @@ CORS(app)
 # The saved model bundle contains:
 # 1. pipeline          -> trained sklearn pipeline
 # 2. feature_columns  -> exact feature order used during training
+# 3. threshold        -> decision threshold chosen by src.train (optional)
 # ============================================================
 print("[INFO] Loading model from:", MODEL_PATH)
 
@@ -53,16 +81,163 @@ try:
     bundle = joblib.load(MODEL_PATH)
     model = bundle["pipeline"]
     feature_columns = bundle["feature_columns"]
+    DECISION_THRESHOLD = float(bundle.get("threshold", DECISION_THRESHOLD))
+    MODEL_VERSION = model_file_version(MODEL_PATH)
 
     print("[INFO] Model loaded successfully.")
     print("[INFO] Number of feature columns:", len(feature_columns))
     print("[INFO] Model classes:", list(model.classes_))
     print("[INFO] Decision threshold:", DECISION_THRESHOLD)
+    print("[INFO] Model version:", MODEL_VERSION)
 
 except Exception as e:
     print("[ERROR] Failed to load model:", str(e))
     model = None
     feature_columns = None
+    MODEL_VERSION = None
+
+
+# ============================================================
+# Per-stratum decision thresholds (written by src.evaluate)
+# Falls back to DECISION_THRESHOLD for strata not in the table.
+# ============================================================
+try:
+    THRESHOLD_TABLE = load_threshold_table(THRESHOLD_TABLE_PATH)
+    if THRESHOLD_TABLE:
+        print("[INFO] Threshold table loaded:", THRESHOLD_TABLE_PATH)
+except Exception as e:
+    print("[ERROR] Failed to load threshold table:", str(e))
+    THRESHOLD_TABLE = None
+
+
+def threshold_for(agar: str, time_hr) -> float:
+    return lookup_threshold(THRESHOLD_TABLE, agar, time_hr, DECISION_THRESHOLD)
+
+
+# ============================================================
+# Shadow models (common/shadow.py)
+# SHADOW_MODELS=models/candidate.pkl[,...] scores each /predict's feature
+# row with candidate bundles on a background worker and records how often
+# they agree with the live model. Responses never wait on it.
+# ============================================================
+def load_shadow_model(path: str):
+    """(score(features, meta) -> probability, threshold) for a candidate model bundle."""
+    candidate = joblib.load(path)
+    pipeline, columns = candidate["pipeline"], candidate["feature_columns"]
+    positive = list(pipeline.classes_).index(1)
+    missing = sorted(set(columns) - set(feature_columns or ()) - {"agar", "time_hr"})
+    if missing:
+        print(f"[WARN] Shadow model {path} uses features the server does not compute (scored as 0):", missing)
+
+    def score(features: dict, meta: dict) -> float:
+        row = pd.DataFrame([{**features, "agar": meta["agar"], "time_hr": meta["time_hr"]}])
+        return float(pipeline.predict_proba(row.reindex(columns=columns, fill_value=0))[0, positive])
+
+    return score, float(candidate.get("threshold", DECISION_THRESHOLD))
+
+
+shadow = ShadowEvaluator.from_env(SHADOW_DIR)
+for shadow_path in filter(None, os.environ.get("SHADOW_MODELS", "").split(",")):
+    try:
+        shadow_score, shadow_threshold = load_shadow_model(shadow_path.strip())
+        shadow.add(os.path.basename(shadow_path.strip()), shadow_score, shadow_threshold,
+                   version=model_file_version(shadow_path.strip()))
+        print("[INFO] Shadow model loaded:", shadow_path.strip(), "threshold", shadow_threshold)
+    except Exception as e:
+        print("[ERROR] Failed to load shadow model:", shadow_path, str(e))
+
+
+# ============================================================
+# Similar-case index (built by src.similar_index)
+# Read-only by default: live cases are unlabeled, so they only join the
+# historical cases when SIMILAR_APPEND=1 opts in.
+# ============================================================
+SIMILAR_APPEND = os.environ.get("SIMILAR_APPEND", "0") == "1"
+SIMILAR_MAX_K = 50
+
+try:
+    similar_index = SimilarCaseIndex.open(os.environ.get("SIMILAR_INDEX_DIR", SIMILAR_INDEX_DIR))
+    if similar_index is not None:
+        print("[INFO] Similar-case index loaded:", similar_index.count, "cases")
+except Exception as e:
+    print("[ERROR] Failed to load similar-case index:", str(e))
+    similar_index = None
+
+
+# ============================================================
+# Feature-drift monitor (reference built by src.drift)
+# Every scored feature vector updates fixed-size per-agar sketches
+# (microseconds per request); GET /drift compares them with the
+# training feature table.
+# ============================================================
+try:
+    drift_monitor = DriftMonitor.load(
+        os.environ.get("DRIFT_REFERENCE_PATH", DRIFT_REFERENCE_PATH),
+        half_life=int(os.environ.get("DRIFT_HALF_LIFE", DRIFT_HALF_LIFE)),
+    )
+    if drift_monitor is not None:
+        print("[INFO] Drift reference loaded:", ", ".join(drift_monitor.strata))
+except Exception as e:
+    print("[ERROR] Failed to load drift reference:", str(e))
+    drift_monitor = None
+
+
+# ============================================================
+# Feature resolution
+# standard -> 256x256 standardized image (what the shipped model expects)
+# native   -> full-resolution plate ROI, tile-parallel extraction
+#             (needs a model trained with build_feature_table --native-resolution)
+# ============================================================
+FEATURE_RESOLUTION = os.environ.get("FEATURE_RESOLUTION", "standard")
+NATIVE_RESOLUTION = FEATURE_RESOLUTION == "native"
+print("[INFO] Feature resolution:", FEATURE_RESOLUTION)
+
+# The three extractors only read img_gray and mask, so an otherwise idle server
+# runs them concurrently; under load the graph falls back to running them in turn.
+FEATURE_STEPS = (
+    StepGraph("features")
+    .add("roberts", extract_roberts_features, stage="roberts_features")
+    .add("texture", extract_texture_features, stage="texture_features")
+    .add("colony", extract_colony_features, stage="colony_features")
+)
+
+
+# ============================================================
+# Image-quality gate (src/quality.py)
+# QUALITY_GATE=log (default) records failed checks in the request log and
+# scores the photo anyway; enforce rejects blurry, badly exposed, glary or
+# badly framed photos with HTTP 422 before feature extraction; off skips
+# the checks. The QUALITY_* limits were tuned on synthetic plates only, so
+# enforce is opt-in until they are checked on real ones.
+# POST /quality runs the checks alone for live camera preview.
+# ============================================================
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "log").lower()
+QUALITY_GATE = {"0": "off", "1": "enforce"}.get(QUALITY_GATE, QUALITY_GATE)
+if QUALITY_GATE not in ("off", "log", "enforce"):
+    print("[WARN] Unknown QUALITY_GATE", repr(QUALITY_GATE), "- using log")
+    QUALITY_GATE = "log"
+print("[INFO] Quality gate:", QUALITY_GATE)
+
+
+# ============================================================
+# Test-time augmentation (opt-in per request: "tta": true or a view count)
+# Rotated / mirrored views of the standardized image are featurized and
+# scored in one predict_proba batch; the reported probability is their mean.
+# TTA_VIEWS is the view count for "tta": true (2-8, default 8).
+# ============================================================
+TTA_VIEWS = int(os.environ.get("TTA_VIEWS", len(TTA_TRANSFORMS)))
+
+
+def parse_tta_views(value) -> int:
+    """View count requested by the "tta" field; 0 means a single pass."""
+    if value is None or value is False:
+        return 0
+    views = TTA_VIEWS if value is True else int(value)
+    if views <= 1:
+        return 0
+    if views > len(TTA_TRANSFORMS):
+        raise ValueError(f"tta must be true or a view count up to {len(TTA_TRANSFORMS)}")
+    return views
 
 
 # ============================================================
@@ -110,26 +285,67 @@ def extract_features(img: Image.Image, agar: str, time_hr: int) -> pd.DataFrame:
     """
     # Preprocess image
     # Returns grayscale image and plate mask.
-    img_gray, mask = preprocess_image_for_features(img)
-
-    # Extract image features
-    roberts_features = extract_roberts_features(img_gray, mask)
-    texture_features = extract_texture_features(img_gray, mask)
-    colony_features = extract_colony_features(img_gray, mask)
-
-    # Combine all extracted features
-    features = {
-        **roberts_features,
-        **texture_features,
-        **colony_features,
-    }
+    with metrics.stage("standardize"):
+        _, img_gray, mask = standardize_request_image(img)
+
+    return extract_features_from_gray(img_gray, mask, agar, time_hr)
+
+
+def standardize_request_image(img: Image.Image) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(256x256 BGR thumbnail for the quality gate, standardized gray image, plate mask)."""
+    image_bgr = cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+    if not NATIVE_RESOLUTION:
+        return standardize_image(image_bgr, tuple(FEATURE_IMAGE_SIZE))
+    _, img_gray, mask = standardize_image_native(image_bgr)
+    return quality_thumbnail(image_bgr), img_gray, mask
 
-    # Add metadata features expected by the model
-    features["agar"] = agar
-    features["time_hr"] = time_hr
 
-    # Convert to DataFrame
-    df = pd.DataFrame([features])
+def request_thumbnail(img: Image.Image) -> np.ndarray:
+    """The thumbnail standardize_request_image gives the quality gate, without standardizing."""
+    return quality_thumbnail(cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR))
+
+
+def extract_features_from_gray(
+    img_gray: np.ndarray, mask: np.ndarray, agar: str, time_hr: int
+) -> pd.DataFrame:
+    """
+    Extracts features from an already standardized grayscale image and plate mask.
+    """
+    return features_frame([image_features(img_gray, mask)], agar, time_hr)
+
+
+def image_features(img_gray: np.ndarray, mask: np.ndarray) -> dict:
+    """Roberts, texture and colony features of one standardized plate image."""
+    if NATIVE_RESOLUTION:
+        with metrics.stage("tiled_features"):
+            features = extract_tiled_features(img_gray, mask)
+    else:
+        # Combine all extracted features (always roberts, texture, colony order)
+        features = {}
+        for step_features in FEATURE_STEPS.run(img_gray, mask).values():
+            features.update(step_features)
+    return features
+
+
+def tta_probabilities(
+    img_gray: np.ndarray, mask: np.ndarray, features: dict, agar: str, time_hr: int, views: int
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """Model rows and class-1 probabilities of the first `views` TTA views (features: the identity view's)."""
+    rows = [features]
+    # Debug captures stay those of the identity view, consistent with gray/mask.
+    with metrics.stage("tta_views"), not_capturing():
+        for _, view_gray, view_mask in augmented_views(img_gray, mask, views)[1:]:
+            rows.append(image_features(view_gray, view_mask))
+    X = features_frame(rows, agar, time_hr)
+    return X, get_bpseudomallei_probabilities(X)
+
+
+def features_frame(rows: list[dict], agar: str, time_hr: int) -> pd.DataFrame:
+    """One model-ready row per feature dict, all with the same metadata."""
+    # Add metadata features expected by the model
+    df = pd.DataFrame(rows)
+    df["agar"] = agar
+    df["time_hr"] = time_hr
 
     # Align feature columns exactly as model was trained
     # Missing columns are filled with 0.
@@ -151,7 +367,8 @@ def get_bpseudomallei_probability(X: pd.DataFrame) -> float:
     """
     Returns probability for class 1 = B. pseudomallei.
     """
-    probas = model.predict_proba(X)[0]
+    with metrics.stage("predict_proba"):
+        probas = model.predict_proba(X)[0]
     class_labels = list(model.classes_)
 
     if 1 not in class_labels:
@@ -165,6 +382,54 @@ def get_bpseudomallei_probability(X: pd.DataFrame) -> float:
     return prob_bpseudo
 
 
+def get_bpseudomallei_probabilities(X: pd.DataFrame) -> np.ndarray:
+    """Class-1 probability for every row of X, from a single predict_proba call."""
+    with metrics.stage("predict_proba"):
+        probas = model.predict_proba(X)
+    class_labels = list(model.classes_)
+    if 1 not in class_labels:
+        raise ValueError(
+            f"Model does not contain class label 1. Found classes: {class_labels}"
+        )
+    return probas[:, class_labels.index(1)]
+
+
+# ============================================================
+# Helper: Result text shown to the user
+# Confidence:
+# If positive -> confidence = probability of B. pseudomallei
+# If negative -> confidence = probability of not B. pseudomallei
+# ============================================================
+def describe_result(prob_bpseudo: float, is_bpseudo: bool) -> dict:
+    if is_bpseudo:
+        return {
+            "result": "Probably Burkholderia pseudomallei",
+            "confidence": round(prob_bpseudo * 100, 2),
+            "interpretation": (
+                "High probability of B. pseudomallei. "
+                "Confirmatory testing is recommended."
+            ),
+            "recommendations": [
+                "Perform API 20NE / PCR confirmatory tests",
+                "Review colony morphology and clinical context",
+                "Handle as suspected B. pseudomallei until confirmed",
+            ],
+        }
+    return {
+        "result": "Not Burkholderia pseudomallei",
+        "confidence": round((1.0 - prob_bpseudo) * 100, 2),
+        "interpretation": (
+            "Low probability of B. pseudomallei. "
+            "Consider alternative diagnoses."
+        ),
+        "recommendations": [
+            "Continue differential diagnosis",
+            "Review morphology and culture conditions",
+            "Confirm with laboratory testing if clinically required",
+        ],
+    }
+
+
 # ============================================================
 # API: Health check
 # ============================================================
@@ -175,6 +440,15 @@ def health():
             "status": "ok" if model is not None else "model_not_loaded",
             "model_loaded": model is not None,
             "threshold": DECISION_THRESHOLD,
+            "threshold_table": THRESHOLD_TABLE is not None,
+            "feature_resolution": FEATURE_RESOLUTION,
+            "feature_steps": {"parallel": FEATURE_STEPS.parallel_runs, "sequential": FEATURE_STEPS.sequential_runs},
+            "similar_cases": similar_index.count if similar_index is not None else None,
+            "drift_monitor": drift_monitor is not None,
+            "quality_gate": QUALITY_GATE,
+            "debug_artifacts": debug_artifacts.stats() if debug_artifacts.enabled else None,
+            "shadow_models": list(shadow.stats()["models"]) if shadow.enabled else None,
+            "model_version": MODEL_VERSION,
             "model_classes": [int(c) for c in model.classes_] if model is not None else None,
             "feature_columns": len(feature_columns) if feature_columns is not None else None,
         }
@@ -193,116 +467,388 @@ def health():
 # ============================================================
 @app.route("/predict", methods=["POST"])
 def predict():
+    # One structured log record per request, written off the request thread.
+    log_record = {"endpoint": "/predict", "model_version": MODEL_VERSION}
+
+    with collect_stages() as stages:
+        payload, status = run_prediction(log_record)
+
+    log_record["status"] = status
+    log_record["timings_ms"] = stage_timings(stages)
+    request_log.log(log_record)
+
+    return jsonify(payload), status
+
+
+def run_prediction(log_record: dict) -> tuple[dict, int]:
+    """Handles one /predict request; returns (JSON payload, HTTP status)."""
     try:
         # Check model loaded
         if model is None or feature_columns is None:
-            return jsonify(
-                {
-                    "error": "Model not loaded",
-                    "message": "Please check server logs and model path.",
-                }
-            ), 500
+            return {
+                "error": "Model not loaded",
+                "message": "Please check server logs and model path.",
+            }, 500
 
         data = request.get_json()
 
         if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+            return {"error": "No JSON data provided"}, 400
 
         image_base64 = data.get("image")
         agar = data.get("agar", "Blood")
         colony_age = data.get("colony_age", "48")
 
         if not image_base64:
-            return jsonify({"error": "No image provided"}), 400
+            return {"error": "No image provided"}, 400
 
         # Extract incubation time
         time_hr = parse_time_hours(colony_age)
 
-        print("\n" + "=" * 70)
-        print("[PREDICT] New prediction request")
-        print(f"[PREDICT] Agar       : {agar}")
-        print(f"[PREDICT] Colony age : {colony_age}")
-        print(f"[PREDICT] Time hours : {time_hr}")
-
-        # Decode image
-        img = decode_image(image_base64)
+        try:
+            tta_views = parse_tta_views(data.get("tta"))
+        except (TypeError, ValueError) as e:
+            return {"error": "Invalid tta", "message": str(e)}, 400
 
-        # Extract features
-        X = extract_features(img, agar, time_hr)
+        log_record["metadata"] = {
+            "agar": agar,
+            "colony_age": colony_age,
+            "time_hours": time_hr,
+        }
+        if tta_views:
+            log_record["metadata"]["tta_views"] = tta_views
+
+        # Opt-in profiling (X-Profile header, allowed callers only)
+        profile_request = profiling_requested(request)
+        if profile_request and not caller_allowed(request):
+            return {"error": "Profiling not allowed for this caller"}, 403
+        profiler = RequestProfiler(PROFILES_DIR, label="predict") if profile_request else nullcontext()
+
+        # Sampled requests keep references to their intermediate images
+        artifact_meta = {"endpoint": "/predict", "model_version": MODEL_VERSION, **log_record["metadata"]}
+        with profiler, capturing(debug_artifacts.sample()) as artifacts:
+            # Decode image
+            with metrics.stage("decode"):
+                img = decode_image(image_base64)
+
+            with metrics.stage("standardize"):
+                thumb, img_gray, mask = standardize_request_image(img)
+
+            # Reject unusable photos before spending CPU on features (log-only by default)
+            if QUALITY_GATE != "off":
+                with metrics.stage("quality"):
+                    quality = assess_quality(thumb)
+                if not quality["ok"]:
+                    log_record["quality"] = [reason["check"] for reason in quality["reasons"]]
+                if not quality["ok"] and QUALITY_GATE == "enforce":
+                    log_record["debug_artifacts"] = debug_artifacts.submit(
+                        {"thumbnail": thumb, **artifacts}, {**artifact_meta, "quality": quality}
+                    )
+                    return {
+                        "error": "Image quality check failed",
+                        "message": " ".join(reason["message"] for reason in quality["reasons"]),
+                        "quality": quality,
+                    }, 422
+
+            # Extract features
+            features = image_features(img_gray, mask)
+
+            # Correct probability:
+            # prob_bpseudo = probability of class 1
+            if tta_views:
+                X, view_probabilities = tta_probabilities(img_gray, mask, features, agar, time_hr, tta_views)
+                prob_bpseudo = float(view_probabilities.mean())
+            else:
+                X = features_frame([features], agar, time_hr)
+                prob_bpseudo = get_bpseudomallei_probability(X)
+
+        if drift_monitor is not None:
+            drift_monitor.update(features, agar)
 
-        # Correct probability:
-        # prob_bpseudo = probability of class 1
-        prob_bpseudo = get_bpseudomallei_probability(X)
+        # Apply threshold
+        threshold = threshold_for(agar, time_hr)
+        is_bpseudo = prob_bpseudo >= threshold
 
-        print("[PREDICT] Model classes:", list(model.classes_))
-        print(
-            f"[PREDICT] Probability B. pseudomallei: {prob_bpseudo:.4f}"
-        )
-        print(f"[PREDICT] Threshold: {DECISION_THRESHOLD}")
+        # Candidates see the unaugmented row, so compare with the live model's score of that row.
+        if shadow.enabled:
+            primary = float(view_probabilities[0]) if tta_views else prob_bpseudo
+            shadow.submit(features, primary, threshold, {"agar": agar, "time_hr": time_hr})
 
-        # Apply threshold
-        is_bpseudo = prob_bpseudo >= DECISION_THRESHOLD
-
-        # Confidence shown to user:
-        # If positive -> confidence = probability of B. pseudomallei
-        # If negative -> confidence = probability of not B. pseudomallei
-        if is_bpseudo:
-            confidence = prob_bpseudo
-            result = "Probably Burkholderia pseudomallei"
-            interpretation = (
-                "High probability of B. pseudomallei. "
-                "Confirmatory testing is recommended."
-            )
-            recommendations = [
-                "Perform API 20NE / PCR confirmatory tests",
-                "Review colony morphology and clinical context",
-                "Handle as suspected B. pseudomallei until confirmed",
-            ]
-        else:
-            confidence = 1.0 - prob_bpseudo
-            result = "Not Burkholderia pseudomallei"
-            interpretation = (
-                "Low probability of B. pseudomallei. "
-                "Consider alternative diagnoses."
+        if artifacts:
+            log_record["debug_artifacts"] = debug_artifacts.submit(
+                artifacts, {**artifact_meta, "probability": prob_bpseudo, "threshold": threshold}
             )
-            recommendations = [
-                "Continue differential diagnosis",
-                "Review morphology and culture conditions",
-                "Confirm with laboratory testing if clinically required",
-            ]
 
-        print(f"[PREDICT] Result     : {result}")
-        print(f"[PREDICT] Confidence : {confidence * 100:.2f}%")
-        print("=" * 70 + "\n")
+        case_id = None
+        if similar_index is not None and SIMILAR_APPEND:
+            try:
+                with metrics.stage("similar_append"):
+                    case_id = similar_index.append(similar_index.vectorize(X), agar, time_hr, prob_bpseudo)
+            except OSError as e:
+                log_record["similar_append_error"] = str(e)
 
-        return jsonify(
+        description = describe_result(prob_bpseudo, is_bpseudo)
+
+        log_record.update(
             {
-                "result": result,
-                "confidence": round(confidence * 100, 2),
-                "probability_bpseudomallei": round(prob_bpseudo, 4),
-                "threshold": DECISION_THRESHOLD,
+                "probability": round(prob_bpseudo, 4),
+                "threshold": threshold,
                 "is_bpseudo": bool(is_bpseudo),
-                "metadata": {
-                    "agar": agar,
-                    "colony_age": colony_age,
-                    "time_hours": time_hr,
-                    "characteristics": data.get("characteristics", []),
-                },
-                "interpretation": interpretation,
-                "recommendations": recommendations,
             }
-        ), 200
+        )
+        if tta_views:
+            log_record["tta_std"] = round(float(view_probabilities.std()), 4)
+        if request_log.sample_debug():
+            log_record["debug"] = {
+                "image_size": list(img.size),
+                "characteristics": data.get("characteristics", []),
+                "features": X.iloc[0].to_dict(),
+            }
+
+        response = {
+            "result": description["result"],
+            "confidence": description["confidence"],
+            "probability_bpseudomallei": round(prob_bpseudo, 4),
+            "threshold": threshold,
+            "is_bpseudo": bool(is_bpseudo),
+            "metadata": {
+                "agar": agar,
+                "colony_age": colony_age,
+                "time_hours": time_hr,
+                "characteristics": data.get("characteristics", []),
+            },
+            "interpretation": description["interpretation"],
+            "recommendations": description["recommendations"],
+        }
+        if tta_views:
+            response["tta"] = {
+                "views": [name for name, _, _ in TTA_TRANSFORMS[:tta_views]],
+                "probabilities": [round(float(p), 4) for p in view_probabilities],
+                "std": round(float(view_probabilities.std()), 4),
+                "min": round(float(view_probabilities.min()), 4),
+                "max": round(float(view_probabilities.max()), 4),
+            }
+        if case_id is not None:
+            response["case_id"] = case_id
+
+        if profile_request:
+            response["profile"] = profiler.summary()
+
+        return response, 200
 
     except Exception as e:
         import traceback
 
-        traceback.print_exc()
+        log_record["error"] = str(e)
+        log_record["traceback"] = traceback.format_exc()
+        return {
+            "error": "Prediction failed",
+            "message": str(e),
+        }, 500
+
+
+# ============================================================
+# API: Quality check only (live camera preview)
+# Expected JSON: {"image": "base64 image string"}
+# Decodes and resizes exactly as /predict does, then runs the checks only.
+# Send a downscaled preview frame: decoding dominates the time.
+# ============================================================
+@app.route("/quality", methods=["POST"])
+def quality_check():
+    data = request.get_json()
+    if not data or not data.get("image"):
+        return jsonify({"error": "No image provided"}), 400
+
+    try:
+        start = time.perf_counter()
+        # The same full decode and INTER_AREA resize /predict gates on, so the
+        # preview and /predict agree on every photo.
+        with metrics.stage("decode"):
+            img = decode_image(data["image"])
+        with metrics.stage("thumbnail"):
+            thumb = request_thumbnail(img)
+        with metrics.stage("quality"):
+            quality = assess_quality(thumb)
+        quality["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return jsonify(quality), 200
+
+    except Exception as e:
+        return jsonify({"error": "Quality check failed", "message": str(e)}), 500
+
+
+# ============================================================
+# API: Predict every plate in a multi-plate photo
+# Same request body as /predict. Plates are found in one pass over a
+# downscaled frame, cropped from the decoded photo, standardized and
+# scored together with one predict_proba call.
+# ============================================================
+@app.route("/predict-plates", methods=["POST"])
+def predict_plates():
+    log_record = {"endpoint": "/predict-plates", "model_version": MODEL_VERSION}
+
+    with collect_stages() as stages:
+        payload, status = run_plate_predictions(log_record)
+
+    log_record["status"] = status
+    log_record["timings_ms"] = stage_timings(stages)
+    request_log.log(log_record)
+
+    return jsonify(payload), status
+
+
+def run_plate_predictions(log_record: dict) -> tuple[dict, int]:
+    try:
+        if model is None or feature_columns is None:
+            return {
+                "error": "Model not loaded",
+                "message": "Please check server logs and model path.",
+            }, 500
+
+        data = request.get_json()
+        if not data or not data.get("image"):
+            return {"error": "No image provided"}, 400
+
+        agar = data.get("agar", "Blood")
+        colony_age = data.get("colony_age", "48")
+        time_hr = parse_time_hours(colony_age)
+        log_record["metadata"] = {"agar": agar, "colony_age": colony_age, "time_hours": time_hr}
+
+        with metrics.stage("decode"):
+            img = decode_image(data["image"])
+            image_bgr = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+        with metrics.stage("detect_plates"):
+            plates = detect_plates(image_bgr)
+
+        rows, boxes = [], []
+        standardize = standardize_image_native if NATIVE_RESOLUTION else standardize_image
+        for plate in plates:
+            crop, box = crop_plate(image_bgr, plate)
+            with metrics.stage("standardize"):
+                _, img_gray, mask = standardize(crop)
+            rows.append(image_features(img_gray, mask))
+            boxes.append(box)
+
+        X = features_frame(rows, agar, time_hr)
+        probabilities = get_bpseudomallei_probabilities(X)
+        if drift_monitor is not None:
+            for row in rows:
+                drift_monitor.update(row, agar)
+        threshold = threshold_for(agar, time_hr)
+
+        results = []
+        for i, ((x, y, radius), box, prob_bpseudo) in enumerate(zip(plates, boxes, probabilities), start=1):
+            prob_bpseudo = float(prob_bpseudo)
+            is_bpseudo = prob_bpseudo >= threshold
+            description = describe_result(prob_bpseudo, is_bpseudo)
+            results.append(
+                {
+                    "plate": i,
+                    "location": {"center_x": x, "center_y": y, "radius": radius, "box": list(box)},
+                    "result": description["result"],
+                    "confidence": description["confidence"],
+                    "probability_bpseudomallei": round(prob_bpseudo, 4),
+                    "is_bpseudo": bool(is_bpseudo),
+                }
+            )
+
+        log_record.update(
+            {
+                "plates": len(results),
+                "probabilities": [r["probability_bpseudomallei"] for r in results],
+                "threshold": threshold,
+            }
+        )
+        return {
+            "plates": results,
+            "plate_count": len(results),
+            "image_size": list(img.size),
+            "threshold": threshold,
+            "metadata": {
+                "agar": agar,
+                "colony_age": colony_age,
+                "time_hours": time_hr,
+                "characteristics": data.get("characteristics", []),
+            },
+        }, 200
+
+    except Exception as e:
+        import traceback
+
+        log_record["error"] = str(e)
+        log_record["traceback"] = traceback.format_exc()
+        return {
+            "error": "Prediction failed",
+            "message": str(e),
+        }, 500
+
+
+# ============================================================
+# API: Similar cases
+# Same request body as /predict, plus optional:
+#   k          -> number of cases to return (default 5, max 50)
+#   same_agar  -> only cases on the same agar (default true)
+# ============================================================
+@app.route("/similar", methods=["POST"])
+def similar():
+    if similar_index is None:
+        return jsonify({"error": "Similar-case index not built", "message": "Run python -m src.similar_index build"}), 503
+
+    data = request.get_json()
+    if not data or not data.get("image"):
+        return jsonify({"error": "No image provided"}), 400
+
+    try:
+        k = max(1, min(int(data.get("k", 5)), SIMILAR_MAX_K))
+        agar = data.get("agar", "Blood")
+        time_hr = parse_time_hours(data.get("colony_age", "48"))
+
+        with metrics.stage("decode"):
+            img = decode_image(data["image"])
+        X = extract_features(img, agar, time_hr)
+
+        with metrics.stage("similar_search"):
+            start = time.perf_counter()
+            query = similar_index.vectorize(X)
+            hits = similar_index.search(query, k, agar=agar if data.get("same_agar", True) else None)
+            search_ms = (time.perf_counter() - start) * 1000
+
         return jsonify(
             {
-                "error": "Prediction failed",
-                "message": str(e),
+                "cases": [{**similar_index.case(row), "distance": round(distance, 4)} for row, distance in hits],
+                "indexed_cases": similar_index.count,
+                "search_ms": round(search_ms, 3),
             }
-        ), 500
+        ), 200
+
+    except Exception as e:
+        return jsonify({"error": "Similar-case search failed", "message": str(e)}), 500
+
+
+# ============================================================
+# API: Feature drift
+# PSI of each feature's recent distribution (decayed, per agar and
+# overall) against the training feature table. ?top=N limits the
+# per-stratum list of most-drifted features (default 5).
+# ============================================================
+@app.route("/drift", methods=["GET"])
+def drift():
+    if drift_monitor is None:
+        return jsonify({"error": "Drift reference not built", "message": "Run python -m src.drift build"}), 503
+    top = max(1, min(int(request.args.get("top", 5)), len(drift_monitor.columns)))
+    return jsonify(drift_monitor.report(top=top)), 200
+
+
+# ============================================================
+# API: Shadow models
+# Agreement of each SHADOW_MODELS candidate with the live model on the
+# /predict traffic since startup (also in reports/shadow/shadow_stats.json).
+# ============================================================
+@app.route("/shadow", methods=["GET"])
+def shadow_stats():
+    if not shadow.enabled:
+        return jsonify({"error": "No shadow models", "message": "Set SHADOW_MODELS to candidate model paths"}), 404
+    return jsonify(shadow.stats()), 200
 
 
 # ============================================================
@@ -313,6 +859,12 @@ if __name__ == "__main__":
 
     print(f"\n[INFO] Starting ML API server on port {port}")
     print(f"[INFO] Health check : http://localhost:{port}/health")
-    print(f"[INFO] Predict      : http://localhost:{port}/predict\n")
+    print(f"[INFO] Predict      : http://localhost:{port}/predict")
+    print(f"[INFO] Plates       : http://localhost:{port}/predict-plates")
+    print(f"[INFO] Quality      : http://localhost:{port}/quality")
+    print(f"[INFO] Similar      : http://localhost:{port}/similar")
+    print(f"[INFO] Drift        : http://localhost:{port}/drift")
+    print(f"[INFO] Shadow       : http://localhost:{port}/shadow")
+    print(f"[INFO] Metrics      : http://localhost:{port}/metrics\n")
 
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
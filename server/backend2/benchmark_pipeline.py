@@ -0,0 +1,256 @@
+"""
+Benchmark: every /predict stage, per input resolution and colony density
+
+Generates procedural plates (src.synthetic: dish, agar gradient, colonies,
+streaks) at each resolution x density, so no patient images are needed.
+Each plate is JPEG-encoded and base64-wrapped the way a client sends it,
+and every stage is then timed on the inputs /predict would pass to it:
+
+    decode_image                  -> base64 JPEG to PIL image
+    standardize_image             -> full-size BGR to 256x256 gray + mask
+    detect_plate_mask             -> the 256x256 thumbnail
+    normalize_gray                -> thumbnail + mask (CLAHE)
+    extract_*_features            -> roberts, sobel, texture, colony
+    extract_tiled_features        -> native-resolution ROI (--native only: seconds per call at 12 MP)
+    get_bpseudomallei_probability -> one model row
+
+For each stage: median and p95 wall time, and peak allocation of one extra
+call under tracemalloc. That counts Python and NumPy buffers, including
+arrays OpenCV returns, but not OpenCV's internal scratch memory.
+
+--save writes the results as a JSON baseline. --compare reads one and flags
+every stage whose median grew by more than --threshold (and by at least
+--min-delta-ms, so sub-0.1 ms jitter is not a regression); the exit
+status is then 1. A stage that looks regressed is first re-timed up to
+--retries times and keeps its best median: on a shared VM, back-to-back
+runs of unchanged code differ by 30-60%, and most of that is a slow
+stretch rather than a slow stage. Compare on the same machine: the
+baseline records the environment, and a mismatch is printed as a warning.
+
+Usage:
+    python benchmark_pipeline.py                                  # print only
+    python benchmark_pipeline.py --save                           # -> reports/benchmark_baseline.json
+    python benchmark_pipeline.py --compare --threshold 0.2        # against that baseline
+    python benchmark_pipeline.py --sizes 1600x1200 --densities dense --stages standardize_image
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Bound before app instruments the module attributes: time the functions, not the metrics wrappers.
+from src.colony_features import extract_colony_features
+from src.config import FEATURE_IMAGE_SIZE, REPORTS_DIR
+from src.preprocessing import detect_plate_mask, normalize_gray, standardize_image, standardize_image_native
+from src.roberts_features import extract_roberts_features, extract_sobel_features
+from src.synthetic import DENSITIES, SIZES, synthetic_plate
+from src.texture_features import extract_texture_features
+from src.tiled_features import extract_tiled_features
+
+os.environ.setdefault("SIMILAR_APPEND", "0")
+import app  # noqa: E402  (decode_image and the served model)
+
+STAGES = (
+    "decode_image",
+    "standardize_image",
+    "detect_plate_mask",
+    "normalize_gray",
+    "extract_roberts_features",
+    "extract_sobel_features",
+    "extract_texture_features",
+    "extract_colony_features",
+    "extract_tiled_features",
+    "get_bpseudomallei_probability",
+)
+DEFAULT_BASELINE = REPORTS_DIR / "benchmark_baseline.json"
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def time_calls(fn, iterations, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(samples), "p95_ms": percentile(samples, 0.95)}
+
+
+def peak_allocation_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def stage_calls(size, density, seed, native):
+    """Stage name -> zero-argument call on this plate's inputs, built as /predict builds them."""
+    image = synthetic_plate(seed, size, density)
+    jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    payload = base64.b64encode(jpeg).decode("ascii")
+    bgr = cv2.cvtColor(np.asarray(app.decode_image(payload)), cv2.COLOR_RGB2BGR)
+    resized = cv2.resize(bgr, tuple(FEATURE_IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+    mask = detect_plate_mask(resized)
+    gray = normalize_gray(resized, mask)
+    features = {}
+    for extract in (extract_roberts_features, extract_texture_features, extract_colony_features):
+        features.update(extract(gray, mask))
+    X = app.features_frame([features], "Ashdown", 48)
+
+    calls = {
+        "decode_image": lambda: app.decode_image(payload),
+        "standardize_image": lambda: standardize_image(bgr, tuple(FEATURE_IMAGE_SIZE)),
+        "detect_plate_mask": lambda: detect_plate_mask(resized),
+        "normalize_gray": lambda: normalize_gray(resized, mask),
+        "extract_roberts_features": lambda: extract_roberts_features(gray, mask),
+        "extract_sobel_features": lambda: extract_sobel_features(gray, mask),
+        "extract_texture_features": lambda: extract_texture_features(gray, mask),
+        "extract_colony_features": lambda: extract_colony_features(gray, mask),
+        "get_bpseudomallei_probability": lambda: app.get_bpseudomallei_probability(X),
+    }
+    if native:
+        _, native_gray, native_mask = standardize_image_native(bgr)
+        calls["extract_tiled_features"] = lambda: extract_tiled_features(native_gray, native_mask)
+    return calls
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cv2_threads": cv2.getNumThreads(),
+    }
+
+
+def baseline_timing(baseline, case, stage):
+    return (baseline or {}).get("results", {}).get(case, {}).get(stage)
+
+
+def is_regression(before, current, threshold, min_delta_ms):
+    grown = current["median_ms"] - before["median_ms"]
+    return grown > threshold * before["median_ms"] and grown >= min_delta_ms
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """(case, stage, baseline median, current median, change, regressed) for stages present in both."""
+    rows, regressions = [], []
+    for case, stages in results.items():
+        for stage, current in stages.items():
+            before = baseline_timing(baseline, case, stage)
+            if before is None:
+                continue
+            change = current["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+            regressed = is_regression(before, current, threshold, min_delta_ms)
+            rows.append((case, stage, before["median_ms"], current["median_ms"], change, regressed))
+            if regressed:
+                regressions.append(f"{case} {stage}")
+    return rows, regressions
+
+
+def parse_size(value):
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=list(SIZES), metavar="WxH")
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="subset of stages (default: all)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--native", action="store_true", help="also time extract_tiled_features on the native ROI")
+    parser.add_argument("--save", nargs="?", const=str(DEFAULT_BASELINE), metavar="PATH",
+                        help=f"write the results as a baseline (default path: {DEFAULT_BASELINE})")
+    parser.add_argument("--compare", nargs="?", const=str(DEFAULT_BASELINE), metavar="PATH",
+                        help="compare against a saved baseline; exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative growth of the median")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="ignore growth smaller than this")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="re-time a stage that looks regressed up to this many times, keeping the best median")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != environment():
+            print(f"[WARN] Baseline environment differs: {baseline.get('environment')} vs {environment()}")
+
+    stages = args.stages or [s for s in STAGES if s != "extract_tiled_features" or args.native]
+    results = {}
+    print(f"{'case':22s} {'stage':32s} {'median ms':>10s} {'p95 ms':>9s} {'peak KB':>9s}")
+    for i, size in enumerate(args.sizes):
+        for j, density in enumerate(args.densities):
+            case = f"{size[0]}x{size[1]}/{density}"
+            calls = stage_calls(size, density, args.seed + i * len(args.densities) + j,
+                                "extract_tiled_features" in stages)
+            results[case] = {}
+            for stage in stages:
+                if stage not in calls:
+                    continue
+                timing = time_calls(calls[stage], args.iterations)
+                before = baseline_timing(baseline, case, stage)
+                for _ in range(args.retries if before else 0):
+                    if not is_regression(before, timing, args.threshold, args.min_delta_ms):
+                        break
+                    timing = min(timing, time_calls(calls[stage], args.iterations), key=lambda t: t["median_ms"])
+                timing["peak_kb"] = peak_allocation_kb(calls[stage])
+                results[case][stage] = {k: round(v, 4) for k, v in timing.items()}
+                print(f"{case:22s} {stage:32s} {timing['median_ms']:10.3f} {timing['p95_ms']:9.3f} "
+                      f"{timing['peak_kb']:9.1f}")
+
+    if args.save:
+        output = Path(args.save)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp = output.with_name(output.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "environment": environment(),
+                "iterations": args.iterations,
+                "results": results,
+            }, f, indent=2)
+        tmp.replace(output)
+        print(f"\n[INFO] Baseline written: {output}")
+
+    if baseline is None:
+        return 0
+    rows, regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    print(f"\nAgainst {args.compare} ({baseline.get('created_at')}), threshold +{args.threshold:.0%}:")
+    print(f"{'case':22s} {'stage':32s} {'baseline':>10s} {'now':>9s} {'change':>8s}")
+    for case, stage, before, now, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{case:22s} {stage:32s} {before:10.3f} {now:9.3f} {change:+8.1%}{flag}")
+    if regressions:
+        print(f"[ERROR] {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print(f"[INFO] No regressions in {len(rows)} stage timings")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
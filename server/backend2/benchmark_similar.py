@@ -0,0 +1,116 @@
+"""
+Benchmark: /similar nearest-neighbour search
+
+Builds a SimilarCaseIndex of synthetic plate feature vectors at each size,
+then measures:
+
+    open     -> SimilarCaseIndex.open() (mmap + meta.json)
+    search   -> top-k query latency (median / p99), all agars and same-agar
+    recall   -> overlap of the top-k with exact brute-force results
+    append   -> one online append
+
+The vectors are drawn from a mixture of Gaussians, which is closer to real
+feature tables than uniform noise (plates cluster by species and agar).
+
+Usage:
+    python benchmark_similar.py                          # 1e5 and 1e6 plates
+    python benchmark_similar.py --sizes 100000 --nprobe 4 16
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.similar_index import CASE_DTYPE, SimilarCaseIndex, similarity_columns, write_index
+
+AGARS = (b"Ashdown", b"Blood", b"Macconkey")
+
+
+def synthetic_cases(n, dim, clusters=400, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1.0, (clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    vectors = centers[assignment] + rng.normal(0, 0.35, (n, dim)).astype(np.float32)
+    cases = np.zeros(n, dtype=CASE_DTYPE)
+    cases["case_id"] = [f"{i:032x}".encode() for i in range(n)]
+    cases["agar"] = np.array(AGARS)[assignment % len(AGARS)]
+    cases["time_hr"] = rng.choice([24, 48, 72], n)
+    cases["probability"] = np.nan
+    cases["label"] = -1
+    return vectors, cases, rng.normal(0, 1.0, (200, dim)).astype(np.float32) + centers[rng.integers(0, clusters, 200)]
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def bench_size(n, dim, k, nprobes, root):
+    vectors, cases, queries = synthetic_cases(n, dim)
+    start = time.perf_counter()
+    write_index(root, vectors, cases, similarity_columns(), np.zeros(dim), np.ones(dim))
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SimilarCaseIndex.open(root)
+    open_ms = (time.perf_counter() - start) * 1000
+    stored = np.asarray(index._vectors)
+
+    exact = []
+    for q in queries:
+        d = ((stored - q) ** 2).sum(axis=1)
+        exact.append(set(np.argpartition(d, k - 1)[:k].tolist()))
+
+    start = time.perf_counter()
+    for q in queries[:20]:
+        ((stored - q) ** 2).sum(axis=1).argpartition(k - 1)
+    brute_ms = (time.perf_counter() - start) / 20 * 1000
+
+    print(f"\n{n:,} plates x {dim} features: build {build_s:.1f}s ({index.meta['nlist']} lists), "
+          f"open {open_ms:.2f} ms, brute force {brute_ms:.2f} ms/query")
+    print(f"  {'nprobe':>6} {'median ms':>10} {'p99 ms':>8} {'same-agar ms':>13} {f'recall@{k}':>10}")
+    for nprobe in nprobes:
+        for q in queries[:5]:
+            index.search(q, k, nprobe=nprobe)
+        samples, agar_samples, hits = [], [], 0
+        for q, truth in zip(queries, exact):
+            t0 = time.perf_counter()
+            result = index.search(q, k, nprobe=nprobe)
+            t1 = time.perf_counter()
+            index.search(q, k, agar="Blood", nprobe=nprobe)
+            t2 = time.perf_counter()
+            samples.append((t1 - t0) * 1000)
+            agar_samples.append((t2 - t1) * 1000)
+            hits += len(truth & {row for row, _ in result})
+        print(f"  {nprobe:>6} {statistics.median(samples):>10.3f} {percentile(samples, 0.99):>8.3f} "
+              f"{statistics.median(agar_samples):>13.3f} {hits / (k * len(queries)):>10.3f}")
+
+    start = time.perf_counter()
+    for q in queries[:100]:
+        index.append(q, "Blood", 48, 0.5)
+    print(f"  append: {(time.perf_counter() - start) / 100 * 1000:.3f} ms/case")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /similar nearest-neighbour index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    dim = len(similarity_columns())
+    for n in args.sizes:
+        root = Path(tempfile.mkdtemp(prefix="bpa-similar-bench-"))
+        try:
+            bench_size(n, dim, args.k, args.nprobe, root)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
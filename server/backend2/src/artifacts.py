@@ -0,0 +1,52 @@
+"""Capture hook for intermediate images (masks, edge maps, binaries).
+
+Feature code calls capture(name, array) at the points worth looking at
+when a plate is misclassified. Outside a capturing() block that is one
+ContextVar lookup and nothing else. Inside one, the array is stored by
+reference in the block's dict: nothing is copied or encoded on the request
+path. common.debug_artifacts writes those dicts to disk on a background thread.
+
+    with capturing() as arrays:
+        features = extract_image_features(gray, mask)
+    writer.submit(arrays, meta)
+
+The sink is a ContextVar, so steps that common.concurrency.StepGraph runs on
+helper threads capture into the same dict.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+_sink: ContextVar[dict | None] = ContextVar("artifact_sink", default=None)
+
+
+def capture(name: str, array: np.ndarray) -> None:
+    """Keep a reference to array under name if a capturing() block is active."""
+    sink = _sink.get()
+    if sink is not None:
+        sink[name] = array
+
+
+@contextmanager
+def capturing(enabled: bool = True):
+    """Collect capture() calls made in this context; yields the name -> array dict (empty when disabled)."""
+    arrays = {}
+    if not enabled:
+        yield arrays
+        return
+    token = _sink.set(arrays)
+    try:
+        yield arrays
+    finally:
+        _sink.reset(token)
+
+
+@contextmanager
+def not_capturing():
+    """Suspend an enclosing capturing() block, e.g. for re-runs of the feature code on other views."""
+    token = _sink.set(None)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
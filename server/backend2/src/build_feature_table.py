@@ -0,0 +1,236 @@
+"""Build the training feature table from RAW_DIR.
+
+Walks RAW_DIR with a process pool, runs standardize_image and every feature
+extractor on each image, and streams rows to the output CSV as they finish.
+The output CSV doubles as the checkpoint: rerunning the same command skips
+images that already have a row, so an interrupted run resumes where it
+stopped. Failed images are listed in <output>.errors.csv and retried on the
+next run.
+
+Split the work across machines with --shard-index/--shard-count (images are
+assigned by a stable hash of their path), then combine the shard outputs:
+
+    python -m src.build_feature_table --workers 16
+    python -m src.build_feature_table --shard-index 0 --shard-count 4   # on machine 0
+    python -m src.build_feature_table merge reports/feature_table.shard-*-of-4.csv
+
+--native-resolution keeps each plate at camera resolution
+(standardize_image_native) and extracts Roberts/texture/colony features tile by
+tile (src.tiled_features). Use it with a model trained on such a table. Such
+tables have no sobel columns: sobel is never served, and a full-resolution
+pass would cost about as much as the whole tiled extraction.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import zlib
+from multiprocessing import Pool
+from pathlib import Path
+
+import cv2
+import pandas as pd
+
+from src.config import FEATURE_IMAGE_SIZE, FEATURE_TABLE_CSV, IMAGE_EXTENSIONS, METADATA_CSV, RAW_DIR
+from src.features import SERVED_EXTRACTORS, extract_image_features, feature_names
+from src.preprocessing import read_image, standardize_image, standardize_image_native
+from src.tiled_features import extract_tiled_features
+
+KEY_COLUMN = "image_path"
+METADATA_KEY_CANDIDATES = ("image_path", "filepath", "path", "filename", "image")
+
+
+def list_images(raw_dir: Path) -> list[str]:
+    """Image paths relative to raw_dir (POSIX separators), sorted."""
+    return sorted(
+        path.relative_to(raw_dir).as_posix()
+        for path in raw_dir.rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def shard_of(rel_path: str, shard_count: int) -> int:
+    """Stable shard assignment, independent of listing order or machine."""
+    return zlib.crc32(rel_path.encode("utf-8")) % shard_count
+
+
+def shard_output_path(output: Path, shard_index: int, shard_count: int) -> Path:
+    if shard_count == 1:
+        return output
+    return output.with_name(f"{output.stem}.shard-{shard_index}-of-{shard_count}{output.suffix}")
+
+
+def load_metadata(metadata_csv: Path) -> tuple[dict, list[str]]:
+    """Metadata rows keyed by image path (and by file name as a fallback)."""
+    if not metadata_csv.exists():
+        return {}, []
+    df = pd.read_csv(metadata_csv)
+    key = next((c for c in METADATA_KEY_CANDIDATES if c in df.columns), None)
+    if key is None:
+        print(f"[WARN] {metadata_csv} has none of {METADATA_KEY_CANDIDATES}; metadata not joined")
+        return {}, []
+    columns = [c for c in df.columns if c != key]
+    lookup = {}
+    for record in df.to_dict("records"):
+        path = Path(str(record.pop(key)))
+        lookup[path.as_posix()] = record
+        lookup.setdefault(path.name, record)
+    return lookup, columns
+
+
+def repair_partial_row(path: Path) -> None:
+    """Drop a trailing half-written row left by a killed run."""
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def completed_images(path: Path) -> set[str]:
+    if not path.exists() or path.stat().st_size == 0:
+        return set()
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row[KEY_COLUMN] for row in csv.DictReader(f) if row.get(KEY_COLUMN)}
+
+
+def _init_worker() -> None:
+    # One OpenCV thread per process; the pool provides the parallelism.
+    cv2.setNumThreads(1)
+
+
+def _process_image(task: tuple[str, str, tuple[int, int] | None, int]) -> tuple[str, dict | None, str | None]:
+    raw_dir, rel_path, size, tile_workers = task
+    try:
+        image = read_image(Path(raw_dir) / rel_path)
+        if size is None:
+            _, gray, mask = standardize_image_native(image)
+            return rel_path, extract_tiled_features(gray, mask, workers=tile_workers), None
+        _, gray, mask = standardize_image(image, size)
+        return rel_path, extract_image_features(gray, mask), None
+    except Exception as e:
+        return rel_path, None, f"{type(e).__name__}: {e}"
+
+
+def build(args: argparse.Namespace) -> int:
+    raw_dir = Path(args.raw_dir)
+    output = shard_output_path(Path(args.output), args.shard_index, args.shard_count)
+    errors_path = output.with_name(output.name + ".errors.csv")
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    images = [p for p in list_images(raw_dir) if shard_of(p, args.shard_count) == args.shard_index]
+    repair_partial_row(output)
+    done = completed_images(output)
+    todo = [p for p in images if p not in done]
+
+    metadata, metadata_columns = load_metadata(Path(args.metadata_csv))
+    extractors = SERVED_EXTRACTORS if args.native_resolution else None
+    columns = [KEY_COLUMN, *metadata_columns, *feature_names(extractors)]
+
+    print(f"[INFO] Shard {args.shard_index + 1}/{args.shard_count}: {len(images)} images, "
+          f"{len(done)} already done, {len(todo)} to process with {args.workers} workers")
+    print(f"[INFO] Output: {output}")
+    if not todo:
+        return 0
+
+    write_header = not output.exists() or output.stat().st_size == 0
+    if not write_header:
+        with open(output, newline="", encoding="utf-8") as f:
+            existing = next(csv.reader(f))
+        if existing != columns:
+            sys.exit(f"[ERROR] {output} has different columns; use a new --output or delete it to rebuild")
+
+    failures = 0
+    start = time.perf_counter()
+    size = None if args.native_resolution else tuple(FEATURE_IMAGE_SIZE)
+    tasks = ((str(raw_dir), rel_path, size, args.tile_workers) for rel_path in todo)
+
+    with open(output, "a", newline="", encoding="utf-8") as out, \
+            open(errors_path, "w", newline="", encoding="utf-8") as err, \
+            Pool(args.workers, initializer=_init_worker) as pool:
+        writer = csv.DictWriter(out, fieldnames=columns, restval=0, extrasaction="ignore")
+        error_writer = csv.writer(err)
+        error_writer.writerow([KEY_COLUMN, "error"])
+        if write_header:
+            writer.writeheader()
+
+        for i, (rel_path, features, error) in enumerate(
+            pool.imap_unordered(_process_image, tasks, chunksize=args.chunksize), start=1
+        ):
+            if error is not None:
+                failures += 1
+                error_writer.writerow([rel_path, error])
+                err.flush()
+            else:
+                meta = metadata.get(rel_path) or metadata.get(Path(rel_path).name) or {}
+                writer.writerow({KEY_COLUMN: rel_path, **meta, **features})
+                out.flush()
+
+            if i % args.progress_every == 0 or i == len(todo):
+                rate = i / (time.perf_counter() - start)
+                eta = (len(todo) - i) / rate if rate else 0
+                print(f"[PROGRESS] {i}/{len(todo)} ({rate:.1f} img/s, ETA {eta / 60:.1f} min, {failures} failed)")
+
+    if failures:
+        print(f"[WARN] {failures} images failed; see {errors_path} (they are retried on the next run)")
+    else:
+        errors_path.unlink(missing_ok=True)
+    return 1 if failures else 0
+
+
+def merge(args: argparse.Namespace) -> int:
+    frames = [pd.read_csv(path) for path in args.shards]
+    merged = pd.concat(frames, ignore_index=True)
+    before = len(merged)
+    merged = merged.drop_duplicates(subset=KEY_COLUMN, keep="last").sort_values(KEY_COLUMN)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    merged.to_csv(output, index=False)
+    print(f"[INFO] Merged {len(args.shards)} shards: {len(merged)} rows "
+          f"({before - len(merged)} duplicates dropped) -> {output}")
+    return 0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["merge"]:
+        parser = argparse.ArgumentParser(prog="build_feature_table merge",
+                                         description="Combine shard outputs into one feature table.")
+        parser.add_argument("shards", nargs="+")
+        parser.add_argument("--output", default=str(FEATURE_TABLE_CSV))
+        args = parser.parse_args(argv[1:])
+        args.command = "merge"
+        return args
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw-dir", default=str(RAW_DIR))
+    parser.add_argument("--metadata-csv", default=str(METADATA_CSV))
+    parser.add_argument("--output", default=str(FEATURE_TABLE_CSV))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=4)
+    parser.add_argument("--shard-index", type=int, default=0)
+    parser.add_argument("--shard-count", type=int, default=1)
+    parser.add_argument("--progress-every", type=int, default=100)
+    parser.add_argument("--native-resolution", action="store_true",
+                        help="extract from the full-resolution plate ROI instead of the 256x256 resize")
+    parser.add_argument("--tile-workers", type=int, default=1,
+                        help="threads per worker process for --native-resolution tiles")
+    args = parser.parse_args(argv)
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be in [0, --shard-count)")
+    args.command = "build"
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    return merge(args) if args.command == "merge" else build(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
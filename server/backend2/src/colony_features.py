@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from src.artifacts import capture
+
 
 def extract_colony_features(gray: np.ndarray, mask: np.ndarray) -> dict:
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -12,6 +14,7 @@ def extract_colony_features(gray: np.ndarray, mask: np.ndarray) -> dict:
     thresh_value = np.percentile(masked_values, 82)
     binary = ((blurred >= thresh_value) & (mask > 0)).astype(np.uint8) * 255
     binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    capture("colony_binary", binary)
 
     contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     areas = []
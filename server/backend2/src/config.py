@@ -8,12 +8,23 @@ SPLIT_DIR = DATA_DIR / "splits"
 METADATA_DIR = PROJECT_ROOT / "metadata"
 REPORTS_DIR = PROJECT_ROOT / "reports"
 MODELS_DIR = PROJECT_ROOT / "models"
+PROFILES_DIR = REPORTS_DIR / "profiles"
+DEBUG_ARTIFACTS_DIR = REPORTS_DIR / "debug_artifacts"
+SHADOW_DIR = REPORTS_DIR / "shadow"
 
 METADATA_CSV = METADATA_DIR / "dataset_metadata.csv"
 FEATURE_TABLE_CSV = REPORTS_DIR / "feature_table.csv"
+FEATURE_STORE_DIR = PROCESSED_DIR / "feature_store"
+PHASH_INDEX_CSV = PROCESSED_DIR / "phash_index.csv"
+SIMILAR_INDEX_DIR = PROCESSED_DIR / "similar_index"
 TRAIN_CSV = SPLIT_DIR / "train.csv"
 TEST_CSV = SPLIT_DIR / "test.csv"
 MODEL_PATH = MODELS_DIR / "bpseudomallei_model.pkl"
+THRESHOLD_TABLE_PATH = MODELS_DIR / "threshold_table.json"
+DRIFT_REFERENCE_PATH = MODELS_DIR / "drift_reference.json"
+
+LABEL_COLUMN = "label"
+POSITIVE_LABEL = 1
 
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp"}
 RANDOM_STATE = 42
@@ -21,6 +32,15 @@ TEST_SIZE = 0.20
 CV_FOLDS = 5
 
 FEATURE_IMAGE_SIZE = (256, 256)
+# Image-quality gate (src.quality), measured on the FEATURE_IMAGE_SIZE thumbnail.
+QUALITY_MIN_FOCUS = 40.0           # Laplacian variance inside the plate
+QUALITY_MAX_CLIPPED = 0.10         # fraction of plate pixels at <= 5 or >= 250
+QUALITY_BRIGHTNESS_RANGE = (30, 225)  # mean plate gray level
+QUALITY_MAX_GLARE = 0.02           # largest specular blob / plate area
+QUALITY_MAX_OFFSET = 0.15          # plate centre distance from image centre / image side
+QUALITY_MIN_PLATE_RADIUS = 0.25    # plate radius / image side
+# Native-resolution mode (src.tiled_features): tile edge in pixels.
+TILE_SIZE = 1024
 
 DEFAULT_DECISION_THRESHOLD = 0.50
 DECISION_THRESHOLD = 0.35
\ No newline at end of file
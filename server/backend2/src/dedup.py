@@ -0,0 +1,280 @@
+"""Near-duplicate plate detection and a leakage-free train/test split.
+
+Each image gets a 64-bit perceptual hash: the sign pattern of low DCT
+frequencies of the standardized gray image, cropped to the plate. Two
+photos of the same plate land within a few bits of each other.
+
+The index splits the hash into four 16-bit bands, with one hash table per
+band. A query probes its band value plus every variant with up to two bits
+flipped: 137 buckets per table, out of 65,536. By pigeonhole, any hash
+within 11 bits of the query differs from it in at most two bits of some
+band, so it is always found. Only the candidates in probed buckets are
+compared bit-by-bit.
+
+The index is persisted as PHASH_INDEX_CSV (image_path, sha256, phash).
+`update` hashes only images whose content is new, using the standardized
+image cache when it has them.
+
+    python -m src.dedup update
+    python -m src.dedup clusters               # list near-duplicate groups
+    python -m src.dedup check                  # clusters that straddle TRAIN_CSV/TEST_CSV
+    python -m src.dedup split                  # write TRAIN_CSV/TEST_CSV keeping clusters together
+"""
+import argparse
+import os
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from src.build_feature_table import KEY_COLUMN, _init_worker, list_images, load_metadata
+from src.config import (
+    FEATURE_IMAGE_SIZE, LABEL_COLUMN, METADATA_CSV, PHASH_INDEX_CSV, POSITIVE_LABEL, PROCESSED_DIR,
+    RANDOM_STATE, RAW_DIR, TEST_CSV, TEST_SIZE, TRAIN_CSV,
+)
+from src.feature_store import HASH_COLUMN, refresh_hash_index
+from src.preprocessing import read_image, standardize_image
+
+PHASH_COLUMN = "phash"
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+PROBE_RADIUS = 2
+MAX_GUARANTEED_DISTANCE = BANDS * (PROBE_RADIUS + 1) - 1
+DEFAULT_MAX_DISTANCE = 10
+
+# Band values differing from the query band in at most PROBE_RADIUS bits.
+PROBE_MASKS = tuple(m for m in range(1 << BAND_BITS) if m.bit_count() <= PROBE_RADIUS)
+
+
+def perceptual_hash(gray: np.ndarray, mask: np.ndarray) -> int:
+    """64-bit DCT hash of the plate region of a standardized gray image."""
+    inside = mask > 0
+    plate = gray.astype(np.float32)
+    if inside.any():
+        # Flatten the background so the hash encodes plate content, not the dish outline.
+        plate[~inside] = plate[inside].mean()
+        x, y, w, h = cv2.boundingRect(mask)
+        plate = plate[y:y + h, x:x + w]
+    small = cv2.resize(plate, (64, 64), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[1:9, 1:9].flatten()  # skip the DC row/column (overall brightness)
+    bits = low > np.median(low)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateIndex:
+    """Banded multi-probe LSH over 64-bit perceptual hashes; supports incremental add()."""
+
+    def __init__(self):
+        self.keys: list[str] = []
+        self.hashes: list[int] = []
+        self._tables: list[dict[int, list[int]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def _bands(value: int) -> list[int]:
+        return [(value >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+    def add(self, key: str, value: int) -> int:
+        item = len(self.keys)
+        self.keys.append(key)
+        self.hashes.append(value)
+        for table, band in zip(self._tables, self._bands(value)):
+            table.setdefault(band, []).append(item)
+        return item
+
+    def query(self, value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> list[tuple[int, int]]:
+        """(item, distance) for every indexed hash within max_distance bits (complete up to 11 bits)."""
+        if max_distance > MAX_GUARANTEED_DISTANCE:
+            raise ValueError(f"max_distance above {MAX_GUARANTEED_DISTANCE} may miss matches with {BANDS} bands")
+        candidates = set()
+        for table, band in zip(self._tables, self._bands(value)):
+            for flip in PROBE_MASKS:
+                bucket = table.get(band ^ flip)
+                if bucket:
+                    candidates.update(bucket)
+        matches = [(item, hamming(value, self.hashes[item])) for item in candidates]
+        return sorted((m for m in matches if m[1] <= max_distance), key=lambda m: m[1])
+
+    def clusters(self, max_distance: int = DEFAULT_MAX_DISTANCE) -> list[list[int]]:
+        """Connected components of the near-duplicate graph (singletons included)."""
+        parent = list(range(len(self.keys)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for item, value in enumerate(self.hashes):
+            for other, _ in self.query(value, max_distance):
+                a, b = find(item), find(other)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+        groups = {}
+        for item in range(len(self.keys)):
+            groups.setdefault(find(item), []).append(item)
+        return list(groups.values())
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "NearDuplicateIndex":
+        index = cls()
+        for key, value in zip(frame[KEY_COLUMN], frame[PHASH_COLUMN]):
+            index.add(key, int(value, 16))
+        return index
+
+
+def load_phash_frame(path: Path = PHASH_INDEX_CSV) -> pd.DataFrame:
+    if not Path(path).exists():
+        return pd.DataFrame(columns=[KEY_COLUMN, HASH_COLUMN, PHASH_COLUMN])
+    return pd.read_csv(path, dtype=str)
+
+
+def _hash_image(task: tuple[str, str, tuple[int, int]]) -> tuple[str, str | None]:
+    path, digest, size = task
+    try:
+        _, gray, mask = standardize_image(read_image(path), size)
+        return digest, f"{perceptual_hash(gray, mask):016x}"
+    except Exception as e:
+        print(f"[WARN] {path}: {type(e).__name__}: {e}")
+        return digest, None
+
+
+def update(raw_dir: Path, output: Path, workers: int) -> pd.DataFrame:
+    images = list_images(raw_dir)
+    content = refresh_hash_index(output.with_name(f"{output.stem}.hashes.csv"), raw_dir, images)
+    previous = load_phash_frame(output)
+    known = dict(zip(previous[HASH_COLUMN], previous[PHASH_COLUMN]))
+
+    todo = content[~content[HASH_COLUMN].isin(known)].drop_duplicates(HASH_COLUMN)
+    cached = 0
+    if len(todo):
+        try:
+            from src.image_cache import StandardizedImageCache
+
+            cache = StandardizedImageCache.open(PROCESSED_DIR, FEATURE_IMAGE_SIZE)
+            cached_hashes = set(cache.index[HASH_COLUMN])
+            for digest in todo[HASH_COLUMN]:
+                if digest in cached_hashes:
+                    gray, mask = cache.array[cache.row(sha256=digest)]
+                    known[digest] = f"{perceptual_hash(gray, mask):016x}"
+                    cached += 1
+            todo = todo[~todo[HASH_COLUMN].isin(known)]
+        except FileNotFoundError:
+            pass
+
+    print(f"[INFO] {len(images)} images: {len(images) - len(todo) - cached} already hashed, "
+          f"{cached} from image cache, {len(todo)} to standardize")
+    if len(todo):
+        tasks = [(str(raw_dir / p), d, tuple(FEATURE_IMAGE_SIZE)) for p, d in zip(todo[KEY_COLUMN], todo[HASH_COLUMN])]
+        with Pool(workers, initializer=_init_worker) as pool:
+            for digest, phash in pool.imap_unordered(_hash_image, tasks, chunksize=8):
+                if phash is not None:
+                    known[digest] = phash
+
+    frame = content[[KEY_COLUMN, HASH_COLUMN]].copy()
+    frame[PHASH_COLUMN] = frame[HASH_COLUMN].map(known)
+    frame = frame.dropna(subset=[PHASH_COLUMN])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_csv(output, index=False)
+    return frame
+
+
+def cluster_labels(frame: pd.DataFrame, max_distance: int) -> np.ndarray:
+    """Cluster id per row of frame."""
+    index = NearDuplicateIndex.from_frame(frame)
+    labels = np.empty(len(frame), dtype=np.int64)
+    for cluster_id, members in enumerate(index.clusters(max_distance)):
+        labels[members] = cluster_id
+    return labels
+
+
+def grouped_split(frame: pd.DataFrame, groups: np.ndarray, metadata_csv: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Boolean train/test masks with every cluster on one side; stratified by label when labels exist."""
+    from sklearn.model_selection import GroupShuffleSplit, StratifiedGroupKFold
+
+    metadata, columns = load_metadata(metadata_csv)
+    positions = np.arange(len(frame))
+    if LABEL_COLUMN in columns:
+        labels = [(metadata.get(p) or metadata.get(Path(p).name) or {}).get(LABEL_COLUMN) for p in frame[KEY_COLUMN]]
+        y = np.array([str(v) == str(POSITIVE_LABEL) for v in labels], dtype=int)
+        folds = StratifiedGroupKFold(n_splits=max(2, round(1 / TEST_SIZE)), shuffle=True, random_state=RANDOM_STATE)
+        train_idx, test_idx = next(folds.split(positions, y, groups))
+    else:
+        splitter = GroupShuffleSplit(n_splits=1, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+        train_idx, test_idx = next(splitter.split(positions, groups=groups))
+    train = np.zeros(len(frame), dtype=bool)
+    train[train_idx] = True
+    return train, ~train
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=str(PHASH_INDEX_CSV))
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Hamming bits (of {HASH_BITS}) for two images to count as near-duplicates")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_update = sub.add_parser("update", help="hash new images in RAW_DIR into the index")
+    p_update.add_argument("--raw-dir", default=str(RAW_DIR))
+    p_update.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    sub.add_parser("clusters", help="print near-duplicate groups")
+    for name, help_text in (("check", "report clusters that straddle the saved split"),
+                            ("split", "write a cluster-aware train/test split")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--train-csv", default=str(TRAIN_CSV))
+        p.add_argument("--test-csv", default=str(TEST_CSV))
+        p.add_argument("--metadata-csv", default=str(METADATA_CSV))
+    args = parser.parse_args(argv)
+
+    index_path = Path(args.index)
+    if args.command == "update":
+        frame = update(Path(args.raw_dir), index_path, args.workers)
+        print(f"[INFO] Index: {index_path} ({len(frame)} images)")
+        return 0
+
+    frame = load_phash_frame(index_path).reset_index(drop=True)
+    if frame.empty:
+        sys.exit(f"[ERROR] No perceptual-hash index at {index_path}; run `python -m src.dedup update` first")
+    groups = cluster_labels(frame, args.max_distance)
+    sizes = np.bincount(groups)
+    print(f"[INFO] {len(frame)} images in {len(sizes)} clusters; "
+          f"{int((sizes > 1).sum())} clusters with near-duplicates ({int(sizes[sizes > 1].sum())} images)")
+
+    if args.command == "clusters":
+        for cluster_id in np.flatnonzero(sizes > 1):
+            print(f"cluster {cluster_id}: " + ", ".join(frame[KEY_COLUMN][groups == cluster_id]))
+        return 0
+
+    if args.command == "check":
+        train = set(pd.read_csv(args.train_csv)[KEY_COLUMN])
+        test = set(pd.read_csv(args.test_csv)[KEY_COLUMN])
+        leaks = 0
+        for cluster_id in np.flatnonzero(sizes > 1):
+            members = set(frame[KEY_COLUMN][groups == cluster_id])
+            if members & train and members & test:
+                leaks += 1
+                print(f"[LEAK] train: {sorted(members & train)}  test: {sorted(members & test)}")
+        print(f"[INFO] {leaks} near-duplicate clusters straddle the split")
+        return 1 if leaks else 0
+
+    train, test = grouped_split(frame, groups, Path(args.metadata_csv))
+    for path, mask in ((args.train_csv, train), (args.test_csv, test)):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        frame.loc[mask, [KEY_COLUMN]].to_csv(path, index=False)
+    print(f"[INFO] Split written: {train.sum()} train / {test.sum()} test -> {args.train_csv}, {args.test_csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
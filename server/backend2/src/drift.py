@@ -0,0 +1,244 @@
+"""Streaming feature-drift monitor.
+
+The reference (built from the training feature table) stores, for every
+monitored feature and every agar with enough rows (plus "all"), the
+feature's quantile edges: DRIFT_BINS equal-frequency bins. It also stores
+the share of reference rows in each bin.
+
+At serving time, every feature vector goes into a fixed-size sketch per
+stratum: one row of bin counts per feature. An update is a vectorized
+comparison against the edges plus one scatter-add: about 30 microseconds
+warm, and 100-150 right after a request's feature extraction has evicted
+the caches. The cost does not grow with traffic. The memory is fixed at
+strata x features x bins floats. Counts decay with a half-life of DRIFT_HALF_LIFE requests, so the
+sketch follows recent traffic.
+
+Drift per feature is the population stability index (PSI) between the
+reference and live bin shares. Rule of thumb: below 0.1 is stable, 0.1 to
+0.25 is moderate, and above 0.25 the feature has shifted. Approximate live
+quantiles are read off the same counts.
+
+    python -m src.drift build                  # from FEATURE_TABLE_CSV -> DRIFT_REFERENCE_PATH
+    python -m src.drift build --feature-table reports/feature_table_native.csv
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import DRIFT_REFERENCE_PATH, FEATURE_TABLE_CSV
+from src.features import feature_names
+
+DRIFT_BINS = 10
+DRIFT_HALF_LIFE = 1000
+MIN_STRATUM_ROWS = 50
+MIN_SEEN = 200
+PSI_MODERATE = 0.1
+PSI_SHIFTED = 0.25
+ALL = "all"
+
+# Served features only: sobel is not computed by /predict.
+MONITORED_EXTRACTORS = ("roberts", "texture", "colony")
+
+
+def _edges_and_shares(values: np.ndarray, bins: int) -> tuple[np.ndarray, np.ndarray]:
+    """(features x bins-1) quantile edges and the reference share of rows in each bin."""
+    edges = np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1], axis=0).T
+    index = (values[:, :, None] >= edges[None, :, :]).sum(axis=2)
+    counts = np.stack([np.bincount(index[:, j], minlength=bins) for j in range(values.shape[1])])
+    return edges, counts / len(values)
+
+
+def build_reference(table: pd.DataFrame, columns: list[str] | None = None, bins: int = DRIFT_BINS,
+                    min_rows: int = MIN_STRATUM_ROWS) -> dict:
+    columns = columns or [c for c in feature_names(MONITORED_EXTRACTORS) if c in table.columns]
+    strata = {ALL: table}
+    if "agar" in table:
+        for agar, group in table.groupby("agar"):
+            if len(group) >= min_rows:
+                strata[str(agar)] = group
+    reference = {"columns": columns, "bins": bins, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "strata": {}}
+    for name, group in strata.items():
+        values = group[columns].astype(float).fillna(0).to_numpy()
+        edges, shares = _edges_and_shares(values, bins)
+        reference["strata"][name] = {
+            "rows": len(group),
+            "edges": edges.round(6).tolist(),
+            "shares": shares.round(6).tolist(),
+            "median": np.median(values, axis=0).round(6).tolist(),
+        }
+    return reference
+
+
+def psi(reference: np.ndarray, live: np.ndarray, eps: float = 1e-4) -> np.ndarray:
+    """Row-wise population stability index of bin shares."""
+    reference = np.clip(reference, eps, None)
+    live = np.clip(live, eps, None)
+    return ((live - reference) * np.log(live / reference)).sum(axis=-1)
+
+
+def binned_quantile(edges: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Approximate quantile per row of counts, interpolating linearly inside the bins between edges.
+
+    The outer bins are open-ended; values falling there are reported at the outermost edge.
+    """
+    rows = np.arange(len(counts))
+    cumulative = np.cumsum(counts, axis=1)
+    target = q * cumulative[:, -1]
+    index = np.minimum((cumulative < target[:, None]).sum(axis=1), counts.shape[1] - 1)
+    padded = np.concatenate([edges[:, :1], edges, edges[:, -1:]], axis=1)
+    lower, upper = padded[rows, index], padded[rows, index + 1]
+    before = cumulative[rows, index] - counts[rows, index]
+    inside = counts[rows, index]
+    frac = np.divide(target - before, inside, out=np.full(len(rows), 0.5), where=inside > 0)
+    return lower + np.clip(frac, 0, 1) * (upper - lower)
+
+
+def _status(score: float) -> str:
+    return "shifted" if score > PSI_SHIFTED else "moderate" if score > PSI_MODERATE else "stable"
+
+
+class DriftMonitor:
+    """Decayed bin counts for every (stratum, feature) of a reference, in one flat array.
+
+    Decay is applied forward: each update adds a weight that grows by
+    2 ** (1 / half_life), and the counts are divided by the current weight
+    when read. An update is therefore one comparison and one scatter-add,
+    with nothing proportional to the number of strata or bins.
+    """
+
+    def __init__(self, reference: dict, half_life: int = DRIFT_HALF_LIFE):
+        self.reference = reference
+        self.columns = list(reference["columns"])
+        self.half_life = half_life
+        self.strata = list(reference["strata"])
+        n_features, self.bins = len(self.columns), int(reference["bins"])
+        self._edges = np.array([reference["strata"][s]["edges"] for s in self.strata], dtype=np.float64)
+        self._shares = np.array([reference["strata"][s]["shares"] for s in self.strata], dtype=np.float64)
+        self._rows = [max(int(reference["strata"][s]["rows"]), 1) for s in self.strata]
+        self._medians = np.array([reference["strata"][s]["median"] for s in self.strata], dtype=np.float64)
+        self._counts = np.zeros(len(self.strata) * n_features * self.bins)
+        self._seen = np.zeros(len(self.strata), dtype=np.int64)
+        self._weight = 1.0
+        self._growth = 2.0 ** (1.0 / half_life)
+        # Per agar: the strata it updates ("all" and its own), their stacked edges and flat count offsets.
+        self._routes = {}
+        for name in self.strata:
+            rows = [0] if name == ALL else [0, self.strata.index(name)]
+            offsets = np.concatenate([(r * n_features + np.arange(n_features)) * self.bins for r in rows])
+            self._routes[name] = (np.array(rows), np.concatenate(self._edges[rows]), offsets)
+        self._lock = threading.Lock()
+        self._update_ns = 0
+        self._updates = 0
+
+    @classmethod
+    def load(cls, path: str | Path = DRIFT_REFERENCE_PATH, half_life: int = DRIFT_HALF_LIFE) -> "DriftMonitor | None":
+        """Monitor for the reference at path, or None if none has been built."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), half_life)
+
+    def update(self, features: dict, agar: str) -> None:
+        """Add one feature dict (column -> value; missing counts as 0) to the "all" and agar sketches."""
+        start = time.perf_counter_ns()
+        rows, edges, offsets = self._routes.get(agar) or self._routes[ALL]
+        try:
+            x = np.fromiter(map(features.get, self.columns), dtype=np.float64, count=len(self.columns))
+        except TypeError:  # a missing column (degenerate mask)
+            x = np.fromiter((features.get(c) or 0.0 for c in self.columns), dtype=np.float64, count=len(self.columns))
+        x[np.isnan(x)] = 0.0  # as in training (fillna(0))
+        if len(rows) > 1:
+            x = np.concatenate((x, x))
+        positions = offsets + (x[:, None] >= edges).sum(axis=1)
+        with self._lock:
+            self._counts[positions] += self._weight
+            self._seen[rows] += 1
+            self._weight *= self._growth
+            if self._weight > 1e200:
+                self._counts /= self._weight
+                self._weight = 1.0
+            self._update_ns += time.perf_counter_ns() - start
+            self._updates += 1
+
+    def report(self, top: int = 5, min_seen: int = MIN_SEEN) -> dict:
+        """PSI per feature for each stratum that has seen at least min_seen requests.
+
+        Live shares get half a count per bin (Jeffreys smoothing) so an empty
+        bin does not dominate the score. Even without drift, sampling noise
+        gives PSI of about (bins - 1) * (1/n_live + 1/n_reference). That is
+        reported as noise_floor.
+        """
+        with self._lock:
+            counts = self._counts.reshape(len(self.strata), len(self.columns), self.bins) / self._weight
+            seen = self._seen.copy()
+        strata = {}
+        for s, name in enumerate(self.strata):
+            effective_n = float(counts[s, 0].sum())
+            entry = {"requests": int(seen[s]), "effective_n": round(effective_n, 1)}
+            if seen[s] < min_seen:
+                entry["status"] = "warming_up"
+                strata[name] = entry
+                continue
+            smoothed = counts[s] + 0.5
+            shares = smoothed / smoothed.sum(axis=1, keepdims=True)
+            scores = psi(self._shares[s], shares)
+            live_median = binned_quantile(self._edges[s], counts[s], 0.5)
+            order = np.argsort(-scores)
+            entry.update({
+                "status": _status(float(scores.max())),
+                "max_psi": round(float(scores.max()), 4),
+                "noise_floor": round((self.bins - 1) * (1 / max(effective_n, 1.0) + 1 / self._rows[s]), 4),
+                "top": [
+                    {
+                        "feature": self.columns[i],
+                        "psi": round(float(scores[i]), 4),
+                        "status": _status(float(scores[i])),
+                        "reference_median": round(float(self._medians[s, i]), 4),
+                        "live_median": round(float(live_median[i]), 4),
+                    }
+                    for i in order[:top]
+                ],
+                "psi": {c: round(float(v), 4) for c, v in zip(self.columns, scores)},
+            })
+            strata[name] = entry
+        return {
+            "reference_created_at": self.reference.get("created_at"),
+            "half_life_requests": self.half_life,
+            "update_us": round(self._update_ns / max(self._updates, 1) / 1000, 2),
+            "strata": strata,
+        }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="build the reference sketches from a feature table")
+    p_build.add_argument("--feature-table", default=str(FEATURE_TABLE_CSV))
+    p_build.add_argument("--output", default=str(DRIFT_REFERENCE_PATH))
+    p_build.add_argument("--bins", type=int, default=DRIFT_BINS)
+    p_build.add_argument("--min-stratum-rows", type=int, default=MIN_STRATUM_ROWS)
+    args = parser.parse_args(argv)
+
+    table = pd.read_csv(args.feature_table)
+    reference = build_reference(table, bins=args.bins, min_rows=args.min_stratum_rows)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(reference, f)
+    tmp.replace(output)
+    strata = ", ".join(f"{name} ({s['rows']})" for name, s in reference["strata"].items())
+    print(f"[INFO] Reference for {len(reference['columns'])} features, {args.bins} bins: {strata}")
+    print(f"[INFO] Written: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
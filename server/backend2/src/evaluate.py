@@ -0,0 +1,170 @@
+"""Evaluate held-out predictions and pick decision thresholds per stratum.
+
+Scores the TEST_CSV rows of the feature table with the model bundle (or
+reads saved predictions). It then sweeps every distinct threshold overall,
+per agar, per time_hr and per agar x time_hr.
+
+The compact report shows, for each stratum: size, AUC, the metrics at the
+current threshold, and the metrics at the recommended threshold. The
+recommended threshold has the best cost-weighted utility among thresholds
+reaching --min-sensitivity.
+
+Strata with at least --min-stratum-size rows and both classes go into the
+threshold table. /predict loads that table from THRESHOLD_TABLE_PATH:
+
+    python -m src.evaluate
+    python -m src.evaluate --predictions reports/test_predictions.csv --cost-fn 10
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.build_feature_table import KEY_COLUMN
+from src.config import (
+    DECISION_THRESHOLD, FEATURE_TABLE_CSV, LABEL_COLUMN, MODEL_PATH, POSITIVE_LABEL, REPORTS_DIR,
+    TEST_CSV, THRESHOLD_TABLE_PATH,
+)
+from src.train import binary_labels
+from src.thresholds import COST_FN, COST_FP, index_at, recommend_index, row, sweep_auc, threshold_sweep
+
+PROB_COLUMN = "probability"
+STRATA = (("agar",), ("time_hr",), ("agar", "time_hr"))
+
+
+def score_test_split(model_path: Path, feature_table: Path, test_csv: Path) -> pd.DataFrame:
+    bundle = joblib.load(model_path)
+    df = pd.read_csv(feature_table)
+    if test_csv.exists():
+        df = df[df[KEY_COLUMN].isin(set(pd.read_csv(test_csv)[KEY_COLUMN]))]
+    else:
+        print(f"[WARN] {test_csv} not found; scoring the whole feature table")
+    X = df.reindex(columns=bundle["feature_columns"], fill_value=0)
+    pipeline = bundle["pipeline"]
+    class_index = list(pipeline.classes_).index(1)
+    out = df[[c for c in (KEY_COLUMN, "agar", "time_hr", LABEL_COLUMN) if c in df.columns]].copy()
+    out[PROB_COLUMN] = pipeline.predict_proba(X)[:, class_index]
+    return out.reset_index(drop=True)
+
+
+def evaluate_group(y: np.ndarray, prob: np.ndarray, args: argparse.Namespace) -> dict:
+    sweep = threshold_sweep(y, prob, cost_fn=args.cost_fn, cost_fp=args.cost_fp)
+    best = recommend_index(sweep, args.min_sensitivity)
+    return {
+        "n": int(len(y)),
+        "positives": int(y.sum()),
+        "auc": None if (auc := sweep_auc(sweep)) is None else round(auc, 4),
+        "current": row(sweep, index_at(sweep, args.current_threshold)),
+        "recommended": row(sweep, best),
+        "_threshold": float(min(sweep["threshold"][best], 1.0)),
+    }
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def usable(result: dict, min_size: int) -> bool:
+    return result["n"] >= min_size and 0 < result["positives"] < result["n"]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predictions", help="CSV with agar, time_hr, label and probability columns")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--feature-table", default=str(FEATURE_TABLE_CSV))
+    parser.add_argument("--test-csv", default=str(TEST_CSV))
+    parser.add_argument("--save-predictions", help="write the scored test split here")
+    parser.add_argument("--current-threshold", type=float, default=None,
+                        help="threshold to compare against (default: the bundle's, else DECISION_THRESHOLD)")
+    parser.add_argument("--min-sensitivity", type=float, default=0.95)
+    parser.add_argument("--cost-fn", type=float, default=COST_FN)
+    parser.add_argument("--cost-fp", type=float, default=COST_FP)
+    parser.add_argument("--min-stratum-size", type=int, default=30)
+    parser.add_argument("--report", default=str(REPORTS_DIR / "threshold_report.json"))
+    parser.add_argument("--table", default=str(THRESHOLD_TABLE_PATH))
+    args = parser.parse_args(argv)
+
+    if args.predictions:
+        preds = pd.read_csv(args.predictions)
+    else:
+        preds = score_test_split(Path(args.model), Path(args.feature_table), Path(args.test_csv))
+        if args.save_predictions:
+            preds.to_csv(args.save_predictions, index=False)
+    if args.current_threshold is None:
+        bundle_threshold = None
+        if not args.predictions and Path(args.model).exists():
+            bundle_threshold = joblib.load(args.model).get("threshold")
+        args.current_threshold = float(bundle_threshold if bundle_threshold is not None else DECISION_THRESHOLD)
+
+    y = binary_labels(preds[LABEL_COLUMN], POSITIVE_LABEL)
+    prob = preds[PROB_COLUMN].to_numpy(dtype=np.float64)
+
+    start = time.perf_counter()
+    overall = evaluate_group(y, prob, args)
+    strata = {}
+    for columns in STRATA:
+        if not all(c in preds.columns for c in columns):
+            continue
+        for key, index in preds.groupby(list(columns), sort=True).indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            name = ",".join(f"{c}={v}" for c, v in zip(columns, key))
+            strata[name] = {"by": dict(zip(columns, map(str, key))), **evaluate_group(y[index], prob[index], args)}
+    elapsed = time.perf_counter() - start
+
+    table = {
+        "default": overall["_threshold"],
+        "by_agar": {},
+        "by_agar_time": {},
+        "min_sensitivity": args.min_sensitivity,
+        "cost_fn": args.cost_fn,
+        "cost_fp": args.cost_fp,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for result in strata.values():
+        by = result["by"]
+        if not usable(result, args.min_stratum_size) or "agar" not in by:
+            continue
+        if "time_hr" in by:
+            time_key = str(int(float(by["time_hr"]))) if float(by["time_hr"]).is_integer() else by["time_hr"]
+            table["by_agar_time"].setdefault(by["agar"], {})[time_key] = result["_threshold"]
+        else:
+            table["by_agar"][by["agar"]] = result["_threshold"]
+
+    for result in [overall, *strata.values()]:
+        result.pop("_threshold")
+    report = {
+        "rows": len(preds),
+        "current_threshold": args.current_threshold,
+        "min_sensitivity": args.min_sensitivity,
+        "cost_fn": args.cost_fn,
+        "cost_fp": args.cost_fp,
+        "overall": overall,
+        "strata": strata,
+    }
+
+    for path, payload in ((args.report, report), (args.table, table)):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+    print(f"[INFO] {len(preds)} predictions, {len(strata)} strata swept in {elapsed * 1000:.1f} ms")
+    print(f"{'stratum':<28}{'n':>7}{'auc':>8}{'cur sens':>10}{'cur spec':>10}{'rec thr':>9}{'rec sens':>10}{'rec spec':>10}")
+    for name, result in [("overall", overall), *strata.items()]:
+        cur, rec = result["current"], result["recommended"]
+        print(f"{name:<28}{result['n']:>7}{_fmt(result['auc']):>8}{_fmt(cur['sensitivity']):>10}"
+              f"{_fmt(cur['specificity']):>10}{_fmt(rec['threshold']):>9}{_fmt(rec['sensitivity']):>10}"
+              f"{_fmt(rec['specificity']):>10}")
+    print(f"[INFO] Report: {args.report}")
+    print(f"[INFO] Threshold table: {args.table} ({len(table['by_agar'])} agar, "
+          f"{sum(map(len, table['by_agar_time'].values()))} agar x time entries)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
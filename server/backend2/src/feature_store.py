@@ -0,0 +1,292 @@
+"""Columnar feature store keyed by image content hash and extractor version.
+
+Layout under FEATURE_STORE_DIR:
+
+    images.csv                      image_path, size, mtime_ns, sha256
+    <extractor>@<version>/
+        seg-<id>/keys.npy           content hashes of the rows in this segment
+        seg-<id>/<column>.npy       one float64 array per feature column
+
+Each extractor has its own partition, named by its EXTRACTOR_VERSIONS tag.
+Bumping a version starts an empty partition, so `update` recomputes that
+extractor only; untouched extractors and unchanged images are never rerun.
+Segments are written to a temporary directory and renamed into place, so an
+interrupted update keeps every segment it finished.
+
+Columns are separate .npy files opened with mmap, so readers load only the
+columns they ask for:
+
+    store = FeatureStore()
+    df = store.table(columns=["gray_mean", "roberts_edge_density"])
+
+    python -m src.feature_store update --workers 16
+    python -m src.feature_store export            # FEATURE_TABLE_CSV layout
+    python -m src.feature_store compact
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.build_feature_table import KEY_COLUMN, _init_worker, list_images, load_metadata
+from src.config import FEATURE_IMAGE_SIZE, FEATURE_STORE_DIR, FEATURE_TABLE_CSV, METADATA_CSV, RAW_DIR
+from src.features import EXTRACTOR_VERSIONS, FEATURE_EXTRACTORS, feature_names
+from src.preprocessing import read_image, standardize_image
+
+HASH_COLUMN = "sha256"
+INDEX_FIELDS = (KEY_COLUMN, "size", "mtime_ns", HASH_COLUMN)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def refresh_hash_index(index_path: Path, raw_dir: Path, images: list[str]) -> pd.DataFrame:
+    """Content hash per image, saved to index_path; files whose size and mtime are unchanged are not re-hashed."""
+    previous = {}
+    if index_path.exists():
+        old_index = pd.read_csv(index_path, dtype={KEY_COLUMN: str, HASH_COLUMN: str})
+        previous = {row[KEY_COLUMN]: row for row in old_index.to_dict("records")}
+    rows = []
+    for rel_path in images:
+        stat = (raw_dir / rel_path).stat()
+        old = previous.get(rel_path)
+        if old is not None and int(old["size"]) == stat.st_size and int(old["mtime_ns"]) == stat.st_mtime_ns:
+            digest = old[HASH_COLUMN]
+        else:
+            digest = file_sha256(raw_dir / rel_path)
+        rows.append({KEY_COLUMN: rel_path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, HASH_COLUMN: digest})
+
+    index = pd.DataFrame(rows, columns=INDEX_FIELDS)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_path.with_suffix(".csv.tmp")
+    index.to_csv(tmp, index=False)
+    os.replace(tmp, index_path)
+    return index
+
+
+class FeatureStore:
+    def __init__(self, root: str | Path = FEATURE_STORE_DIR):
+        self.root = Path(root)
+        self.index_path = self.root / "images.csv"
+
+    # ---- image index --------------------------------------------------
+    def load_index(self) -> pd.DataFrame:
+        if not self.index_path.exists():
+            return pd.DataFrame(columns=INDEX_FIELDS)
+        return pd.read_csv(self.index_path, dtype={KEY_COLUMN: str, HASH_COLUMN: str})
+
+    def refresh_index(self, raw_dir: Path, images: list[str]) -> pd.DataFrame:
+        return refresh_hash_index(self.index_path, raw_dir, images)
+
+    # ---- partitions ---------------------------------------------------
+    def partition_dir(self, extractor: str) -> Path:
+        return self.root / f"{extractor}@{EXTRACTOR_VERSIONS[extractor]}"
+
+    def segments(self, extractor: str) -> list[Path]:
+        partition = self.partition_dir(extractor)
+        if not partition.exists():
+            return []
+        return sorted(p for p in partition.iterdir() if p.is_dir() and p.name.startswith("seg-"))
+
+    def stored_hashes(self, extractor: str) -> set[str]:
+        hashes = set()
+        for segment in self.segments(extractor):
+            hashes.update(np.load(segment / "keys.npy").astype(str))
+        return hashes
+
+    def write_segment(self, extractor: str, keys: list[str], rows: list[dict]) -> Path:
+        columns = list(feature_names((extractor,)))
+        partition = self.partition_dir(extractor)
+        partition.mkdir(parents=True, exist_ok=True)
+        name = f"seg-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        tmp = partition / f".{name}"
+        tmp.mkdir()
+        np.save(tmp / "keys.npy", np.array(keys, dtype="S64"))
+        for column in columns:
+            np.save(tmp / f"{column}.npy", np.array([row.get(column, 0.0) for row in rows], dtype=np.float64))
+        with open(tmp / "columns.json", "w", encoding="utf-8") as f:
+            json.dump({"extractor": extractor, "version": EXTRACTOR_VERSIONS[extractor], "columns": columns}, f)
+        final = partition / name
+        os.replace(tmp, final)
+        return final
+
+    # ---- reading ------------------------------------------------------
+    def read(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Feature columns indexed by content hash; only the requested columns are loaded."""
+        wanted = list(columns) if columns is not None else list(feature_names())
+        owner = {column: name for name in FEATURE_EXTRACTORS for column in feature_names((name,))}
+        unknown = [c for c in wanted if c not in owner]
+        if unknown:
+            raise KeyError(f"Unknown feature columns: {unknown}")
+
+        frames = []
+        for extractor in FEATURE_EXTRACTORS:
+            extractor_columns = [c for c in wanted if owner[c] == extractor]
+            if not extractor_columns:
+                continue
+            parts = []
+            for segment in self.segments(extractor):
+                keys = np.load(segment / "keys.npy").astype(str)
+                data = {c: np.load(segment / f"{c}.npy", mmap_mode="r") for c in extractor_columns}
+                parts.append(pd.DataFrame(data, index=pd.Index(keys, name=HASH_COLUMN)))
+            if not parts:
+                frame = pd.DataFrame(columns=extractor_columns, index=pd.Index([], name=HASH_COLUMN), dtype=np.float64)
+            else:
+                frame = pd.concat(parts)
+                frame = frame[~frame.index.duplicated(keep="last")]
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(index=pd.Index([], name=HASH_COLUMN))
+        # Inner join: an image is only usable once every requested extractor has a row for it.
+        return pd.concat(frames, axis=1, join="inner")[wanted]
+
+    def table(self, columns: list[str] | None = None, metadata_csv: str | Path | None = METADATA_CSV) -> pd.DataFrame:
+        """Indexed images with metadata and the requested feature columns (FEATURE_TABLE_CSV layout)."""
+        index = self.load_index()[[KEY_COLUMN, HASH_COLUMN]]
+        features = self.read(columns)
+        table = index.merge(features, left_on=HASH_COLUMN, right_index=True, how="inner")
+
+        metadata, metadata_columns = load_metadata(Path(metadata_csv)) if metadata_csv else ({}, [])
+        if metadata_columns:
+            meta_rows = [metadata.get(p) or metadata.get(Path(p).name) or {} for p in table[KEY_COLUMN]]
+            meta = pd.DataFrame(meta_rows, columns=metadata_columns, index=table.index)
+            table = pd.concat([table[[KEY_COLUMN]], meta, table.drop(columns=[KEY_COLUMN])], axis=1)
+
+        return table.drop(columns=[HASH_COLUMN]).sort_values(KEY_COLUMN).reset_index(drop=True)
+
+    # ---- maintenance --------------------------------------------------
+    def compact(self) -> None:
+        """Merge each partition into one segment and delete partitions of old extractor versions."""
+        current = {self.partition_dir(name).name for name in FEATURE_EXTRACTORS}
+        for path in self.root.iterdir() if self.root.exists() else []:
+            if path.is_dir() and "@" in path.name and path.name not in current:
+                print(f"[INFO] Removing stale partition {path.name}")
+                shutil.rmtree(path)
+
+        for extractor in FEATURE_EXTRACTORS:
+            segments = self.segments(extractor)
+            if len(segments) <= 1:
+                continue
+            frame = self.read(list(feature_names((extractor,))))
+            self.write_segment(extractor, list(frame.index), frame.to_dict("records"))
+            for segment in segments:
+                shutil.rmtree(segment)
+            print(f"[INFO] {extractor}: {len(segments)} segments -> 1 ({len(frame)} rows)")
+
+
+def _compute(task: tuple[str, str, tuple[str, ...], tuple[int, int]]) -> tuple[str, dict | None, str | None]:
+    path, digest, extractors, size = task
+    try:
+        _, gray, mask = standardize_image(read_image(path), size)
+        return digest, {name: FEATURE_EXTRACTORS[name](gray, mask) for name in extractors}, None
+    except Exception as e:
+        return digest, None, f"{type(e).__name__}: {e}"
+
+
+def update(store: FeatureStore, raw_dir: Path, workers: int, segment_size: int, progress_every: int = 100) -> int:
+    images = list_images(raw_dir)
+    index = store.refresh_index(raw_dir, images)
+    path_of = dict(zip(index[HASH_COLUMN], index[KEY_COLUMN]))  # identical files are computed once
+
+    stale = {}
+    for extractor in FEATURE_EXTRACTORS:
+        missing = set(path_of) - store.stored_hashes(extractor)
+        print(f"[INFO] {extractor}@{EXTRACTOR_VERSIONS[extractor]}: {len(path_of) - len(missing)} stored, {len(missing)} stale")
+        for digest in missing:
+            stale.setdefault(digest, []).append(extractor)
+    if not stale:
+        return 0
+
+    tasks = (
+        (str(raw_dir / path_of[digest]), digest, tuple(names), tuple(FEATURE_IMAGE_SIZE))
+        for digest, names in sorted(stale.items())
+    )
+    buffers = {name: ([], []) for name in FEATURE_EXTRACTORS}
+    errors = []
+    start = time.perf_counter()
+
+    def flush(name):
+        keys, rows = buffers[name]
+        if keys:
+            store.write_segment(name, keys, rows)
+            buffers[name] = ([], [])
+
+    with Pool(workers, initializer=_init_worker) as pool:
+        for i, (digest, results, error) in enumerate(pool.imap_unordered(_compute, tasks, chunksize=4), start=1):
+            if error is not None:
+                errors.append((path_of[digest], error))
+            else:
+                for name, features in results.items():
+                    buffers[name][0].append(digest)
+                    buffers[name][1].append(features)
+                    if len(buffers[name][0]) >= segment_size:
+                        flush(name)
+            if i % progress_every == 0 or i == len(stale):
+                rate = i / (time.perf_counter() - start)
+                print(f"[PROGRESS] {i}/{len(stale)} ({rate:.1f} img/s, {len(errors)} failed)")
+
+    for name in FEATURE_EXTRACTORS:
+        flush(name)
+
+    errors_path = store.root / "errors.csv"
+    if errors:
+        with open(errors_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([KEY_COLUMN, "error"])
+            writer.writerows(errors)
+        print(f"[WARN] {len(errors)} images failed; see {errors_path}")
+        return 1
+    errors_path.unlink(missing_ok=True)
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=str(FEATURE_STORE_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_update = sub.add_parser("update", help="hash RAW_DIR and compute stale (image, extractor) pairs")
+    p_update.add_argument("--raw-dir", default=str(RAW_DIR))
+    p_update.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p_update.add_argument("--segment-size", type=int, default=1000)
+    p_update.add_argument("--progress-every", type=int, default=100)
+
+    p_export = sub.add_parser("export", help="write the store in the FEATURE_TABLE_CSV layout")
+    p_export.add_argument("--metadata-csv", default=str(METADATA_CSV))
+    p_export.add_argument("--output", default=str(FEATURE_TABLE_CSV))
+
+    sub.add_parser("compact", help="merge segments and drop old extractor versions")
+
+    args = parser.parse_args(argv)
+    store = FeatureStore(args.store)
+
+    if args.command == "update":
+        return update(store, Path(args.raw_dir), args.workers, args.segment_size, args.progress_every)
+    if args.command == "export":
+        table = store.table(metadata_csv=args.metadata_csv)
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        table.to_csv(args.output, index=False)
+        print(f"[INFO] Exported {len(table)} rows x {table.shape[1]} columns -> {args.output}")
+        return 0
+    store.compact()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from src.colony_features import extract_colony_features
+from src.roberts_features import extract_roberts_features, extract_sobel_features
+from src.texture_features import extract_texture_features
+
+# Extractors used to build the training feature table, in column order.
+# Each takes the standardized gray image and plate mask and returns a dict.
+FEATURE_EXTRACTORS = {
+    "roberts": extract_roberts_features,
+    "sobel": extract_sobel_features,
+    "texture": extract_texture_features,
+    "colony": extract_colony_features,
+}
+
+# The extractors /predict runs (FEATURE_STEPS / extract_tiled_features in app.py).
+# Models are trained on these only: sobel is in the table but never served.
+SERVED_EXTRACTORS = ("roberts", "texture", "colony")
+
+# Bump an extractor's version whenever its output changes; the feature store
+# then recomputes that extractor (and only that one) for every image.
+EXTRACTOR_VERSIONS = {
+    "roberts": "1",
+    "sobel": "1",
+    "texture": "1",
+    "colony": "1",
+}
+
+
+def extract_image_features(gray: np.ndarray, mask: np.ndarray, extractors: dict | None = None) -> dict:
+    """Run the feature extractors on one standardized image and merge their dicts in order."""
+    features = {}
+    for extractor in (extractors or FEATURE_EXTRACTORS).values():
+        features.update(extractor(gray, mask))
+    return features
+
+
+def _synthetic_plate(size: int = 256) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    gray = rng.integers(60, 200, (size, size), dtype=np.uint8)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(mask, (size // 2, size // 2), int(size * 0.42), 255, -1)
+    return gray, mask
+
+
+@lru_cache(maxsize=None)
+def feature_names(extractor_names: tuple[str, ...] | None = None) -> tuple[str, ...]:
+    """Column names produced by the extractors, in output order.
+
+    Extractors return empty dicts for degenerate masks, so the schema is
+    taken from a synthetic plate rather than from whichever image comes first.
+    """
+    names = extractor_names or tuple(FEATURE_EXTRACTORS)
+    gray, mask = _synthetic_plate()
+    columns = []
+    for name in names:
+        columns.extend(FEATURE_EXTRACTORS[name](gray, mask))
+    return tuple(columns)
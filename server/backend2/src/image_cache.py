@@ -0,0 +1,174 @@
+"""Memory-mapped cache of standardized images.
+
+standardize_image (resize + detect_plate_mask + CLAHE) is deterministic,
+so its output is computed once per image and kept in a single uint8 .npy
+file under PROCESSED_DIR:
+
+    standardized_256x256.npy        shape (N, 2, 256, 256): [:, 0] gray, [:, 1] mask
+    standardized_256x256.csv        row, image_path, size, mtime_ns, sha256
+
+Rebuilding reuses rows whose image content hash is unchanged and only
+decodes new or modified images. Reading opens the array with mmap, so
+iterating yields views into the page cache and no decode happens:
+
+    cache = StandardizedImageCache.open()
+    for image_path, gray, mask in cache:
+        features = extract_texture_features(gray, mask)
+
+    python -m src.image_cache build --workers 16
+    python -m src.image_cache info
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.build_feature_table import KEY_COLUMN, _init_worker, list_images
+from src.config import FEATURE_IMAGE_SIZE, PROCESSED_DIR, RAW_DIR
+from src.feature_store import HASH_COLUMN, refresh_hash_index
+from src.preprocessing import read_image, standardize_image
+
+GRAY, MASK = 0, 1
+
+
+def cache_paths(cache_dir: Path, size: tuple[int, int]) -> tuple[Path, Path]:
+    stem = f"standardized_{size[0]}x{size[1]}"
+    return cache_dir / f"{stem}.npy", cache_dir / f"{stem}.csv"
+
+
+class StandardizedImageCache:
+    def __init__(self, array: np.ndarray, index: pd.DataFrame):
+        self.array = array
+        self.index = index
+        self._row_by_path = dict(zip(index[KEY_COLUMN], index["row"]))
+        self._row_by_hash = dict(zip(index[HASH_COLUMN], index["row"]))
+
+    @classmethod
+    def open(cls, cache_dir: str | Path = PROCESSED_DIR, size: tuple[int, int] = FEATURE_IMAGE_SIZE):
+        array_path, index_path = cache_paths(Path(cache_dir), tuple(size))
+        if not array_path.exists():
+            raise FileNotFoundError(f"No image cache at {array_path}; run `python -m src.image_cache build`")
+        array = np.load(array_path, mmap_mode="r")
+        index = pd.read_csv(index_path, dtype={KEY_COLUMN: str, HASH_COLUMN: str})
+        return cls(array, index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.array[:, GRAY]
+
+    @property
+    def mask(self) -> np.ndarray:
+        return self.array[:, MASK]
+
+    def row(self, image_path: str | None = None, sha256: str | None = None) -> int:
+        return self._row_by_path[image_path] if image_path is not None else self._row_by_hash[sha256]
+
+    def get(self, image_path: str) -> tuple[np.ndarray, np.ndarray]:
+        """(gray, mask) views for one image."""
+        plane = self.array[self.row(image_path)]
+        return plane[GRAY], plane[MASK]
+
+    def __iter__(self):
+        for image_path, row in zip(self.index[KEY_COLUMN], self.index["row"]):
+            plane = self.array[row]
+            yield image_path, plane[GRAY], plane[MASK]
+
+
+def _standardize(task: tuple[str, str, tuple[int, int]]) -> tuple[str, np.ndarray | None, str | None]:
+    path, digest, size = task
+    try:
+        _, gray, mask = standardize_image(read_image(path), size)
+        return digest, np.stack([gray, mask]), None
+    except Exception as e:
+        return digest, None, f"{type(e).__name__}: {e}"
+
+
+def build(raw_dir: Path, cache_dir: Path, size: tuple[int, int], workers: int, progress_every: int = 100) -> int:
+    array_path, index_path = cache_paths(cache_dir, size)
+    images = list_images(raw_dir)
+    hashes = refresh_hash_index(cache_dir / f"{index_path.stem}.hashes.csv", raw_dir, images)
+
+    previous = None
+    if array_path.exists() and index_path.exists():
+        previous = StandardizedImageCache.open(cache_dir, size)
+
+    unique = hashes.drop_duplicates(HASH_COLUMN)
+    reused = [d for d in unique[HASH_COLUMN] if previous is not None and d in previous._row_by_hash]
+    todo = unique[~unique[HASH_COLUMN].isin(set(reused))]
+    print(f"[INFO] {len(images)} images, {len(unique)} unique; {len(reused)} cached, {len(todo)} to standardize")
+
+    width, height = size
+    tmp_path = array_path.with_name(f".{array_path.name}.tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(len(unique), 2, height, width))
+    row_of = {}
+    for digest in reused:
+        row_of[digest] = len(row_of)
+        out[row_of[digest]] = previous.array[previous.row(sha256=digest)]
+
+    failed = []
+    start = time.perf_counter()
+    tasks = ((str(raw_dir / p), d, tuple(size)) for p, d in zip(todo[KEY_COLUMN], todo[HASH_COLUMN]))
+    with Pool(workers, initializer=_init_worker) as pool:
+        for i, (digest, planes, error) in enumerate(pool.imap_unordered(_standardize, tasks, chunksize=4), start=1):
+            if error is not None:
+                failed.append(digest)
+                print(f"[WARN] {digest[:12]}: {error}")
+            else:
+                row_of[digest] = len(row_of)
+                out[row_of[digest]] = planes
+            if i % progress_every == 0 or i == len(todo):
+                print(f"[PROGRESS] {i}/{len(todo)} ({i / (time.perf_counter() - start):.1f} img/s)")
+
+    out.flush()
+    del out
+    if failed:
+        # Trim the rows reserved for images that could not be read.
+        trim_path = array_path.with_name(f".{array_path.name}.trim")
+        full = np.load(tmp_path, mmap_mode="r")
+        with open(trim_path, "wb") as f:
+            np.save(f, full[: len(row_of)])
+        del full
+        os.replace(trim_path, tmp_path)
+
+    index = hashes[hashes[HASH_COLUMN].isin(row_of)].copy()
+    index.insert(0, "row", index[HASH_COLUMN].map(row_of))
+    if previous is not None:
+        del previous
+    os.replace(tmp_path, array_path)
+    index.to_csv(index_path, index=False)
+    size_gb = array_path.stat().st_size / 1e9
+    print(f"[INFO] Cache: {array_path} ({len(row_of)} rows, {size_gb:.2f} GB)")
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", default=str(PROCESSED_DIR))
+    parser.add_argument("--size", type=int, nargs=2, default=list(FEATURE_IMAGE_SIZE), metavar=("W", "H"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="standardize new or changed images in RAW_DIR into the cache")
+    p_build.add_argument("--raw-dir", default=str(RAW_DIR))
+    p_build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p_build.add_argument("--progress-every", type=int, default=100)
+    sub.add_parser("info", help="print cache size and row count")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        return build(Path(args.raw_dir), Path(args.cache_dir), tuple(args.size), args.workers, args.progress_every)
+
+    cache = StandardizedImageCache.open(args.cache_dir, tuple(args.size))
+    print(f"[INFO] {len(cache)} images, array {cache.array.shape} {cache.array.dtype}, "
+          f"{cache.array.nbytes / 1e9:.2f} GB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Parity check: a (faster) feature pipeline against the frozen reference.
+
+Runs src.reference and a candidate pipeline on the same plates. The
+plates are real images from RAW_DIR plus procedural ones from
+src.synthetic. The report gives, per feature, the max absolute and
+relative error and how many plates exceed the tolerance. It also scores
+both feature sets with the model and lists every plate whose is_bpseudo
+decision flips. The exit status is 1 when any feature is over budget or
+there are more than --max-flips flips. So this can gate a merge.
+
+The candidate is the live src modules by default. --candidate names a
+module that defines any of standardize_image, extract_roberts_features,
+extract_texture_features and extract_colony_features (same signatures);
+the stages it does not define come from the live modules.
+
+    python -m src.parity                                   # live code vs reference
+    python -m src.parity --candidate src.fast_roberts --real 0 --synthetic 200
+    python -m src.parity --rtol 1e-5 --tolerance local_std_std=1e-4
+"""
+import argparse
+import importlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src import colony_features, preprocessing, reference, roberts_features, texture_features
+from src.build_feature_table import list_images, load_metadata
+from src.config import DECISION_THRESHOLD, METADATA_CSV, MODEL_PATH, RAW_DIR, REPORTS_DIR, THRESHOLD_TABLE_PATH
+from src.synthetic import synthetic_corpus
+from src.thresholds import load_threshold_table, lookup_threshold
+
+STAGES = {
+    "standardize_image": preprocessing,
+    "extract_roberts_features": roberts_features,
+    "extract_texture_features": texture_features,
+    "extract_colony_features": colony_features,
+}
+REFERENCE_STAGES = {name: getattr(reference, name) for name in STAGES}
+DEFAULT_AGAR = "Blood"
+DEFAULT_TIME_HR = 48
+
+
+def load_candidate(module_name: str | None) -> tuple[dict, list[str]]:
+    """Stage name -> function, with the live implementation for stages the module doesn't define."""
+    stages = {name: getattr(module, name) for name, module in STAGES.items()}
+    overridden = []
+    if module_name:
+        module = importlib.import_module(module_name)
+        for name in STAGES:
+            if hasattr(module, name):
+                stages[name] = getattr(module, name)
+                overridden.append(name)
+        if not overridden:
+            raise SystemExit(f"[ERROR] {module_name} defines none of {list(STAGES)}")
+    return stages, overridden
+
+
+def run_pipeline(stages: dict, image_bgr: np.ndarray) -> tuple[dict, np.ndarray, np.ndarray]:
+    _, gray, mask = stages["standardize_image"](image_bgr)
+    features = {}
+    for name in ("extract_roberts_features", "extract_texture_features", "extract_colony_features"):
+        features.update(stages[name](gray, mask))
+    return features, gray, mask
+
+
+def iter_corpus(raw_dir: Path, real: int, synthetic: int, metadata_csv: Path):
+    """(name, BGR image, agar, time_hr) for up to `real` images from raw_dir and `synthetic` generated plates."""
+    if real and raw_dir.exists():
+        metadata, _ = load_metadata(metadata_csv)
+        paths = list_images(raw_dir)
+        step = max(1, len(paths) // real)
+        for rel_path in paths[::step][:real]:
+            meta = metadata.get(rel_path) or metadata.get(Path(rel_path).name) or {}
+            try:
+                image = preprocessing.read_image(raw_dir / rel_path)
+            except FileNotFoundError:
+                continue
+            yield rel_path, image, meta.get("agar", DEFAULT_AGAR), meta.get("time_hr", DEFAULT_TIME_HR)
+    for name, image, meta in synthetic_corpus(synthetic):
+        yield name, image, meta["agar"], meta["time_hr"]
+
+
+class FeatureErrors:
+    """Running max absolute / relative error per feature, and plates over tolerance."""
+
+    def __init__(self, rtol: float, atol: float, overrides: dict[str, float]):
+        self.rtol, self.atol, self.overrides = rtol, atol, overrides
+        self.features = {}
+
+    def add(self, name: str, ref: dict, cand: dict) -> None:
+        for feature, expected in ref.items():
+            entry = self.features.setdefault(
+                feature, {"max_abs": 0.0, "max_rel": 0.0, "over": 0, "missing": 0, "worst": None})
+            if feature not in cand:
+                entry["over"] += 1
+                entry["missing"] += 1
+                entry["worst"] = entry["worst"] or name
+                continue
+            value, expected = float(cand[feature]), float(expected)
+            if value == expected or (np.isnan(value) and np.isnan(expected)):
+                error = relative = 0.0
+            else:
+                # NaN/inf on one side only: NaN compares False with any tolerance, so count it as infinite.
+                error = abs(value - expected)
+                if np.isfinite(error):
+                    relative = error / abs(expected) if expected else 1.0
+                else:
+                    error = relative = np.inf
+            if error > entry["max_abs"]:
+                entry["max_abs"], entry["worst"] = error, name
+            entry["max_rel"] = max(entry["max_rel"], relative)
+            if error == np.inf or error > self.atol + self.overrides.get(feature, self.rtol) * abs(expected):
+                entry["over"] += 1
+
+    def failing(self) -> list[str]:
+        return [feature for feature, entry in self.features.items() if entry["over"]]
+
+
+def decisions(rows: list[dict], agars: list, times: list, model_path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """(probabilities, thresholds) of the feature rows, as /predict computes them."""
+    bundle = joblib.load(model_path)
+    pipeline, columns = bundle["pipeline"], bundle["feature_columns"]
+    X = pd.DataFrame(rows)
+    X["agar"], X["time_hr"] = agars, times
+    probabilities = pipeline.predict_proba(X.reindex(columns=columns, fill_value=0))[:, list(pipeline.classes_).index(1)]
+    table = load_threshold_table(THRESHOLD_TABLE_PATH)
+    default = float(bundle.get("threshold", DECISION_THRESHOLD))
+    thresholds = np.array([lookup_threshold(table, a, t, default) for a, t in zip(agars, times)])
+    return probabilities, thresholds
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidate", help="module overriding some pipeline stages (default: the live src modules)")
+    parser.add_argument("--raw-dir", default=str(RAW_DIR))
+    parser.add_argument("--metadata-csv", default=str(METADATA_CSV))
+    parser.add_argument("--real", type=int, default=200, help="real plates to sample from --raw-dir (0 = none)")
+    parser.add_argument("--synthetic", type=int, default=48, help="synthetic plates (0 = none)")
+    parser.add_argument("--rtol", type=float, default=1e-6, help="relative tolerance per feature")
+    parser.add_argument("--atol", type=float, default=1e-9, help="absolute tolerance per feature")
+    parser.add_argument("--tolerance", action="append", default=[], metavar="FEATURE=RTOL",
+                        help="per-feature relative tolerance (repeatable)")
+    parser.add_argument("--max-flips", type=int, default=0, help="allowed is_bpseudo decision flips")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--output", default=str(REPORTS_DIR / "parity_report.json"))
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.tolerance:
+        feature, _, value = item.partition("=")
+        overrides[feature] = float(value)
+
+    stages, overridden = load_candidate(args.candidate)
+    print(f"[INFO] Candidate: {args.candidate or 'live src modules'}" + (f" (overrides {', '.join(overridden)})" if overridden else ""))
+
+    errors = FeatureErrors(args.rtol, args.atol, overrides)
+    names, agars, times, ref_rows, cand_rows, failures = [], [], [], [], [], []
+    standardize = {"gray_differs": 0, "max_gray_diff": 0, "mask_differs": 0}
+    ref_seconds = cand_seconds = 0.0
+    for name, image, agar, time_hr in iter_corpus(Path(args.raw_dir), args.real, args.synthetic, Path(args.metadata_csv)):
+        start = time.perf_counter()
+        ref, ref_gray, ref_mask = run_pipeline(REFERENCE_STAGES, image)
+        middle = time.perf_counter()
+        try:
+            cand, cand_gray, cand_mask = run_pipeline(stages, image)
+        except Exception as e:
+            failures.append({"image": name, "error": f"{type(e).__name__}: {e}"})
+            continue
+        ref_seconds += middle - start
+        cand_seconds += time.perf_counter() - middle
+
+        if cand_gray.shape != ref_gray.shape or not np.array_equal(cand_gray, ref_gray):
+            standardize["gray_differs"] += 1
+            if cand_gray.shape == ref_gray.shape:
+                diff = int(np.abs(cand_gray.astype(np.int16) - ref_gray).max())
+                standardize["max_gray_diff"] = max(standardize["max_gray_diff"], diff)
+        if cand_mask.shape != ref_mask.shape or not np.array_equal(cand_mask > 0, ref_mask > 0):
+            standardize["mask_differs"] += 1
+
+        errors.add(name, ref, cand)
+        names.append(name)
+        agars.append(agar)
+        times.append(time_hr)
+        ref_rows.append(ref)
+        cand_rows.append(cand)
+
+    if not names:
+        print("[ERROR] No plates to compare")
+        return 1
+
+    ref_prob, thresholds = decisions(ref_rows, agars, times, Path(args.model))
+    cand_prob, _ = decisions(cand_rows, agars, times, Path(args.model))
+    flips = [
+        {"image": n, "reference_probability": round(float(r), 4), "candidate_probability": round(float(c), 4),
+         "threshold": float(t)}
+        for n, r, c, t in zip(names, ref_prob, cand_prob, thresholds) if (r >= t) != (c >= t)
+    ]
+
+    failing = errors.failing()
+    passed = not failing and not failures and len(flips) <= args.max_flips
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "candidate": args.candidate or "src",
+        "overridden": overridden,
+        "plates": len(names),
+        "passed": passed,
+        "budget": {"rtol": args.rtol, "atol": args.atol, "tolerance": overrides, "max_flips": args.max_flips},
+        "failing_features": failing,
+        "candidate_errors": failures,
+        "decision_flips": flips,
+        "max_probability_diff": round(float(np.abs(cand_prob - ref_prob).max()), 6),
+        "standardize": standardize,
+        "seconds": {"reference": round(ref_seconds, 3), "candidate": round(cand_seconds, 3)},
+        "features": errors.features,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    tmp.replace(output)
+
+    differing = sorted(((f, e) for f, e in errors.features.items() if e["max_abs"] > 0 or e["missing"]),
+                       key=lambda fe: (-fe[1]["missing"], -fe[1]["max_rel"]))
+    print(f"[INFO] {len(names)} plates; reference {ref_seconds:.2f}s, candidate {cand_seconds:.2f}s")
+    print(f"[INFO] standardize: gray differs on {standardize['gray_differs']} (max {standardize['max_gray_diff']}), "
+          f"mask on {standardize['mask_differs']}")
+    if differing:
+        print(f"{'feature':32s} {'max_abs':>12s} {'max_rel':>12s} {'over':>5s}  worst plate")
+        for feature, e in differing[:20]:
+            missing = f"  (missing on {e['missing']})" if e["missing"] else ""
+            print(f"{feature:32s} {e['max_abs']:12.4g} {e['max_rel']:12.4g} {e['over']:5d}  {e['worst']}{missing}")
+    else:
+        print("[INFO] All features bit-identical")
+    print(f"[INFO] Max probability difference {report['max_probability_diff']}; decision flips: {len(flips)}")
+    for flip in flips[:10]:
+        print(f"[WARN] Flip: {flip}")
+    for failure in failures[:10]:
+        print(f"[WARN] Candidate failed: {failure}")
+    print(f"[{'INFO' if passed else 'ERROR'}] Parity {'passed' if passed else 'FAILED'}"
+          + (f": over budget {failing}" if failing else "") + f"; report: {output}")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
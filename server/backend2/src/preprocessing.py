@@ -5,6 +5,8 @@ import cv2
 # pyrefly: ignore [missing-import]
 import numpy as np
 
+from src.artifacts import capture
+
 
 def read_image(image_path: str | Path) -> np.ndarray:
     image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
@@ -13,11 +15,11 @@ def read_image(image_path: str | Path) -> np.ndarray:
     return image
 
 
-def detect_plate_mask(image_bgr: np.ndarray) -> np.ndarray:
-    """Fast approximate petri-dish mask.
+def find_plate_circle(image_bgr: np.ndarray) -> tuple[int, int, int] | None:
+    """Center and radius of the petri dish, or None when no dish stands out from the background.
 
-    Uses border/background separation and falls back to a centered circle.
-    This is intentionally faster and more robust than running HoughCircles on every image.
+    Uses border/background separation. This is intentionally faster and more
+    robust than running HoughCircles on every image.
     """
     gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
     h, w = gray.shape
@@ -28,22 +30,88 @@ def detect_plate_mask(image_bgr: np.ndarray) -> np.ndarray:
     th = cv2.morphologyEx(th, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
 
     contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    mask = np.zeros_like(gray, dtype=np.uint8)
     if contours:
         largest = max(contours, key=cv2.contourArea)
         area = cv2.contourArea(largest)
         if area > 0.20 * h * w:
             (x, y), radius = cv2.minEnclosingCircle(largest)
             radius = int(radius * 0.88)  # exclude dish rim and writing near edge
-            cv2.circle(mask, (int(x), int(y)), max(1, radius), 255, -1)
-            return mask
+            return int(x), int(y), max(1, radius)
+    return None
+
+
+def detect_plate_circle(image_bgr: np.ndarray) -> tuple[int, int, int]:
+    """Center and radius of the petri dish, as drawn by detect_plate_mask (falls back to a centered circle)."""
+    circle = find_plate_circle(image_bgr)
+    if circle is not None:
+        return circle
+    h, w = image_bgr.shape[:2]
+    return w // 2, h // 2, int(min(h, w) * 0.42)
+
 
-    # Fallback: centered circle.
-    radius = int(min(h, w) * 0.42)
-    cv2.circle(mask, (w // 2, h // 2), radius, 255, -1)
+def detect_plate_mask(image_bgr: np.ndarray) -> np.ndarray:
+    """Fast approximate petri-dish mask (filled circle from detect_plate_circle)."""
+    x, y, radius = detect_plate_circle(image_bgr)
+    mask = np.zeros(image_bgr.shape[:2], dtype=np.uint8)
+    cv2.circle(mask, (x, y), radius, 255, -1)
     return mask
 
 
+def detect_plates(image_bgr: np.ndarray, max_plates: int = 6, detect_side: int = 512,
+                  min_area_fraction: float = 0.02) -> list[tuple[int, int, int]]:
+    """Every petri dish in a (possibly multi-plate) photo as (x, y, radius) in image pixels.
+
+    One pass over a downscaled copy: the same Otsu background separation as
+    detect_plate_circle, keeping each roughly round blob instead of only the
+    largest. Plates are returned in reading order: top-to-bottom rows, then
+    left-to-right. A plate joins the current row when its centre is within
+    the smallest radius of the row's first centre. Falls back to
+    detect_plate_circle when no dish is found.
+    """
+    h, w = image_bgr.shape[:2]
+    scale = min(1.0, detect_side / max(h, w))
+    small = cv2.resize(image_bgr, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA) \
+        if scale < 1.0 else image_bgr
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (7, 7), 0)
+    _, th = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    th = cv2.morphologyEx(th, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+
+    contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = min_area_fraction * th.shape[0] * th.shape[1]
+    circles = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < min_area:
+            continue
+        (x, y), radius = cv2.minEnclosingCircle(contour)
+        if area < 0.6 * np.pi * radius * radius:
+            continue  # not a dish: bench edge, two touching plates, glare
+        circles.append((area, x, y, radius))
+    circles = sorted(circles, reverse=True)[:max_plates]
+    if not circles:
+        return [detect_plate_circle(image_bgr)]
+
+    plates = [(int(round((x + 0.5) / scale - 0.5)), int(round((y + 0.5) / scale - 0.5)), int(round(radius / scale)))
+              for _, x, y, radius in circles]
+    row_height = min(r for _, _, r in plates)
+    rows = []
+    for plate in sorted(plates, key=lambda p: p[1]):
+        if not rows or plate[1] - rows[-1][0][1] > row_height:
+            rows.append([])
+        rows[-1].append(plate)
+    return [plate for row in rows for plate in sorted(row, key=lambda p: p[0])]
+
+
+def crop_plate(image: np.ndarray, plate: tuple[int, int, int], margin: float = 0.08) -> tuple[np.ndarray, tuple[int, int, int, int]]:
+    """View of the square around one detected dish (plus margin) and its (x0, y0, x1, y1) box."""
+    h, w = image.shape[:2]
+    x, y, radius = plate
+    half = int(radius * (1 + margin))
+    x0, y0, x1, y1 = max(0, x - half), max(0, y - half), min(w, x + half + 1), min(h, y + half + 1)
+    return image[y0:y1, x0:x1], (x0, y0, x1, y1)
+
+
 def normalize_gray(image_bgr: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
     gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
     if mask is not None:
@@ -56,12 +124,78 @@ def standardize_image(image_bgr: np.ndarray, size: Tuple[int, int] = (256, 256))
     resized = cv2.resize(image_bgr, size, interpolation=cv2.INTER_AREA)
     mask = detect_plate_mask(resized)
     gray = normalize_gray(resized, mask)
+    capture("mask", mask)
+    capture("gray", gray)
     return resized, gray, mask
 
 
+def standardize_image_native(image_bgr: np.ndarray, detect_size: Tuple[int, int] = (256, 256)) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """High-resolution variant of standardize_image: the plate ROI at the photo's native scale.
+
+    The plate is found on the same detect_size resize standardize_image uses, and
+    that circle is drawn back at full resolution (an ellipse when the photo is not
+    square, i.e. the same region). Returns the cropped BGR ROI, its CLAHE gray
+    image and mask. Use src.tiled_features to extract features from it.
+    """
+    h, w = image_bgr.shape[:2]
+    x, y, radius = detect_plate_circle(cv2.resize(image_bgr, detect_size, interpolation=cv2.INTER_AREA))
+    sx, sy = w / detect_size[0], h / detect_size[1]
+    cx, cy = (x + 0.5) * sx - 0.5, (y + 0.5) * sy - 0.5
+    ax, ay = (radius + 0.5) * sx, (radius + 0.5) * sy
+
+    x0, x1 = max(0, int(np.floor(cx - ax))), min(w, int(np.ceil(cx + ax)) + 1)
+    y0, y1 = max(0, int(np.floor(cy - ay))), min(h, int(np.ceil(cy + ay)) + 1)
+    roi = image_bgr[y0:y1, x0:x1]
+    mask = np.zeros(roi.shape[:2], dtype=np.uint8)
+    cv2.ellipse(mask, (int(round(cx - x0)), int(round(cy - y0))), (int(round(ax)), int(round(ay))), 0, 0, 360, 255, -1)
+    gray = normalize_gray(roi, mask)
+    capture("mask", mask)
+    capture("gray", gray)
+    return roi, gray, mask
+
+
+# Test-time augmentation: the 8 symmetries of the square, ordered so that
+# any first N views are as different from each other as possible.
+TTA_TRANSFORMS = (
+    ("identity", 0, False),
+    ("rot180", 2, False),
+    ("flip", 0, True),
+    ("flip_rot180", 2, True),
+    ("rot90", 1, False),
+    ("rot270", 3, False),
+    ("flip_rot90", 1, True),
+    ("flip_rot270", 3, True),
+)
+
+
+def augmented_views(gray: np.ndarray, mask: np.ndarray, views: int = len(TTA_TRANSFORMS)) -> list[tuple[str, np.ndarray, np.ndarray]]:
+    """(name, gray, mask) for the first `views` TTA_TRANSFORMS of an already standardized image.
+
+    A plate has no natural orientation, so every view is a plausible photo of
+    it. The views are array rotations and mirrors, so plate detection and
+    CLAHE are not repeated.
+    """
+    out = []
+    for name, quarter_turns, mirror in TTA_TRANSFORMS[:views]:
+        g, m = (np.fliplr(gray), np.fliplr(mask)) if mirror else (gray, mask)
+        out.append((name, np.ascontiguousarray(np.rot90(g, quarter_turns)), np.ascontiguousarray(np.rot90(m, quarter_turns))))
+    return out
+
+
 def preprocess_image_for_features(img) -> tuple[np.ndarray, np.ndarray]:
     """Helper for Flask app: converts PIL Image to BGR and returns standardized gray & mask."""
-    # Convert PIL Image to BGR numpy array
-    image_bgr = cv2.cvtColor(np.array(img.convert('RGB')), cv2.COLOR_RGB2BGR)
+    return preprocess_rgb_array_for_features(np.array(img.convert('RGB')))
+
+
+def preprocess_rgb_array_for_features(image_rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Same as preprocess_image_for_features for an already decoded RGB uint8 array."""
+    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
     _, gray, mask = standardize_image(image_bgr)
     return gray, mask
+
+
+def preprocess_rgb_array_native(image_rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """preprocess_rgb_array_for_features with the native-resolution plate ROI."""
+    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    _, gray, mask = standardize_image_native(image_bgr)
+    return gray, mask
@@ -0,0 +1,110 @@
+"""Image-quality gate: reject unusable plate photos before feature extraction.
+
+All checks run on the small thumbnail that standardize_image already makes
+(FEATURE_IMAGE_SIZE, 256x256), so the gate costs 2-3 ms:
+
+    plate     a dish found by the same background separation as
+              detect_plate_mask (find_plate_circle), reasonably large,
+              centred and not cut off by the frame
+    focus     variance of the Laplacian inside the plate
+    exposure  mean plate brightness and the fraction of plate pixels
+              clipped to black or white
+    glare     largest bright, colourless (specular) blob on the plate
+
+assess_quality() returns the measurements plus, for each failed check, a
+reason the user can act on. Thresholds are the QUALITY_* values in src.config.
+"""
+import cv2
+import numpy as np
+
+from src.config import (
+    FEATURE_IMAGE_SIZE, QUALITY_BRIGHTNESS_RANGE, QUALITY_MAX_CLIPPED, QUALITY_MAX_GLARE, QUALITY_MAX_OFFSET,
+    QUALITY_MIN_FOCUS, QUALITY_MIN_PLATE_RADIUS,
+)
+from src.preprocessing import find_plate_circle
+
+REASONS = {
+    "no_plate": "No petri dish found. Put the plate on a plain, light background and fill most of the frame with it.",
+    "plate_small": "The plate is too small in the frame. Move the camera closer.",
+    "plate_off_centre": "The plate is off-centre or cut off. Centre the whole plate in the frame.",
+    "blurry": "The photo is blurry. Hold the camera steady and tap the plate to focus.",
+    "overexposed": "The photo is too bright. Avoid direct light or lower the exposure.",
+    "underexposed": "The photo is too dark. Add light or raise the exposure.",
+    "glare": "Glare on the plate. Tilt the plate or move the light to remove reflections.",
+}
+
+
+def thumbnail(image_bgr: np.ndarray, size: tuple[int, int] = FEATURE_IMAGE_SIZE) -> np.ndarray:
+    if image_bgr.shape[1::-1] == tuple(size):
+        return image_bgr
+    return cv2.resize(image_bgr, tuple(size), interpolation=cv2.INTER_AREA)
+
+
+def assess_quality(image_bgr: np.ndarray) -> dict:
+    """Quality measurements and rejection reasons for a plate photo (any size; best: the 256x256 thumbnail)."""
+    thumb = thumbnail(image_bgr)
+    h, w = thumb.shape[:2]
+    side = min(h, w)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+
+    failed = []
+    circle = find_plate_circle(thumb)
+    if circle is None:
+        failed.append("no_plate")
+        x, y, radius = w // 2, h // 2, int(side * 0.42)  # judge the rest on the fallback circle
+    else:
+        x, y, radius = circle
+    mask = np.zeros((h, w), np.uint8)
+    cv2.circle(mask, (x, y), radius, 255, -1)
+    inside = mask > 0
+    plate_area = max(1, int(np.count_nonzero(inside)))
+
+    offset = float(np.hypot(x - w / 2, y - h / 2) / side)
+    # detect_plate_circle shrinks the dish radius by 0.88; undo that to test the rim against the frame.
+    rim = radius / 0.88
+    cut_off = x - rim < -0.02 * w or y - rim < -0.02 * h or x + rim > 1.02 * w or y + rim > 1.02 * h
+    if circle is not None:
+        if radius / side < QUALITY_MIN_PLATE_RADIUS:
+            failed.append("plate_small")
+        if offset > QUALITY_MAX_OFFSET or cut_off:
+            failed.append("plate_off_centre")
+
+    focus = float(cv2.Laplacian(gray, cv2.CV_64F)[inside].var())
+    if focus < QUALITY_MIN_FOCUS:
+        failed.append("blurry")
+
+    values = gray[inside]
+    brightness = float(values.mean())
+    clipped_high = float(np.count_nonzero(values >= 250) / plate_area)
+    clipped_low = float(np.count_nonzero(values <= 5) / plate_area)
+    darkest, brightest = QUALITY_BRIGHTNESS_RANGE
+    if clipped_high > QUALITY_MAX_CLIPPED or brightness > brightest:
+        failed.append("overexposed")
+    if clipped_low > QUALITY_MAX_CLIPPED or brightness < darkest:
+        failed.append("underexposed")
+
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+    specular = ((hsv[..., 2] >= 245) & (hsv[..., 1] <= 40) & inside).astype(np.uint8)
+    glare = 0.0
+    count, _, stats, _ = cv2.connectedComponentsWithStats(specular, connectivity=8)
+    if count > 1:
+        glare = float(stats[1:, cv2.CC_STAT_AREA].max() / plate_area)
+    if glare > QUALITY_MAX_GLARE and "overexposed" not in failed:
+        failed.append("glare")
+    if circle is None:
+        failed = ["no_plate"]  # the other checks were judging background, not a plate
+
+    return {
+        "ok": not failed,
+        "reasons": [{"check": check, "message": REASONS[check]} for check in failed],
+        "measurements": {
+            "plate_found": circle is not None,
+            "plate_radius": round(radius / side, 3),
+            "plate_offset": round(offset, 3),
+            "focus": round(focus, 1),
+            "brightness": round(brightness, 1),
+            "clipped_high": round(clipped_high, 4),
+            "clipped_low": round(clipped_low, 4),
+            "glare": round(glare, 4),
+        },
+    }
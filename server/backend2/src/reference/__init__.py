@@ -0,0 +1,29 @@
+"""Frozen reference copy of the serving feature pipeline.
+
+These modules are verbatim copies of src/preprocessing.py,
+src/roberts_features.py, src/texture_features.py and src/colony_features.py
+as they were when the shipped model's feature table was built, before any
+later refactor of those files (git: the baseline commit, ad429bd). Only
+standardize_image and the roberts, texture and colony extractors are used;
+src.parity checks any faster implementation against them.
+
+Do not optimize or "fix" anything here. If the features are meant to
+change, retrain the model and then refresh these copies in the same commit.
+"""
+from src.reference.colony_features import extract_colony_features
+from src.reference.preprocessing import standardize_image
+from src.reference.roberts_features import extract_roberts_features
+from src.reference.texture_features import extract_texture_features
+
+REFERENCE_EXTRACTORS = {
+    "roberts": extract_roberts_features,
+    "texture": extract_texture_features,
+    "colony": extract_colony_features,
+}
+
+
+def extract_image_features(gray, mask) -> dict:
+    features = {}
+    for extractor in REFERENCE_EXTRACTORS.values():
+        features.update(extractor(gray, mask))
+    return features
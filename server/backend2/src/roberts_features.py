@@ -3,6 +3,8 @@ import cv2
 import numpy as np
 from skimage.filters import roberts, sobel
 
+from src.artifacts import capture
+
 
 def roberts_edge_map(gray: np.ndarray, mask: np.ndarray) -> np.ndarray:
     gray_float = gray.astype(np.float32) / 255.0
@@ -27,6 +29,8 @@ def cleaned_edge_binary(edge: np.ndarray, mask: np.ndarray) -> np.ndarray:
 def extract_roberts_features(gray: np.ndarray, mask: np.ndarray, debug_path: str | Path | None = None) -> dict:
     edge = roberts_edge_map(gray, mask)
     binary = cleaned_edge_binary(edge, mask)
+    capture("roberts_edge", edge)
+    capture("roberts_binary", binary)
     plate_area = max(1, int(np.count_nonzero(mask)))
 
     masked_edge = edge[mask > 0]
@@ -0,0 +1,339 @@
+"""Nearest-neighbour index over standardized plate feature vectors.
+
+Everything is a flat file, so opening the index is a few mmaps and no
+parsing happens:
+
+    meta.json       columns, mean/scale, IVF size, number of IVF-ordered rows
+    vectors.f32     float32 (N, d) standardized vectors
+    cases.rec       one fixed-width record per row (case id, agar, time_hr, ...)
+    centroids.npy   IVF centroids (absent for small indexes)
+    offsets.npy     start row of each IVF list (nlist + 1)
+
+Rows up to `ivf_rows` are stored grouped by IVF list, so one list is one
+contiguous slice. A query compares against its `nprobe` nearest lists plus
+the tail of rows appended since the last build. append() writes one
+vector and one record to the end of both files, so several server
+processes (gunicorn workers) can append without the two files getting out
+of step. The row count is read from the file sizes before each search, so
+rows appended by other processes are searched too. `reindex` folds the
+tail back into the lists.
+
+Appends, builds and reindexes all hold an exclusive flock on `.lock`
+(which, unlike the data files, is never replaced), so no append is lost
+to a concurrent rebuild. A rebuild replaces vectors.f32; an open index
+notices the new inode at its next search and reloads meta.json and the
+IVF lists, so running servers keep working across a nightly reindex.
+
+    python -m src.similar_index build            # from FEATURE_TABLE_CSV
+    python -m src.similar_index reindex          # after many online appends
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from src.build_feature_table import KEY_COLUMN
+from src.config import FEATURE_TABLE_CSV, LABEL_COLUMN, POSITIVE_LABEL, RANDOM_STATE, SIMILAR_INDEX_DIR
+from src.features import feature_names
+
+# The extractors /predict runs; vectors from the dataset and from live requests must match.
+SIMILARITY_EXTRACTORS = ("roberts", "texture", "colony")
+
+CASE_DTYPE = np.dtype([
+    ("case_id", "S32"),
+    ("image_path", "S96"),
+    ("agar", "S16"),
+    ("time_hr", "<f4"),
+    ("probability", "<f4"),  # NaN for dataset rows
+    ("label", "i1"),         # -1 when unknown
+    ("ts", "<f8"),
+])
+
+IVF_MIN_ROWS = 20_000
+DEFAULT_NPROBE = 8
+LOCK_FILE = ".lock"
+
+
+def similarity_columns() -> list[str]:
+    return list(feature_names(SIMILARITY_EXTRACTORS))
+
+
+def fixed_bytes(text, size: int) -> bytes:
+    """UTF-8 of text cut to a fixed-width field without splitting a character."""
+    return str(text).encode()[:size].decode("utf-8", "ignore").encode()
+
+
+@contextmanager
+def index_lock(root: Path, exclusive: bool = True):
+    """flock on root/.lock: exclusive to change the files, shared to read a consistent state."""
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield  # closing the file releases the lock
+
+
+class SimilarCaseIndex:
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._vectors_path = self.root / "vectors.f32"
+        self._cases_path = self.root / "cases.rec"
+        self._inode = None
+        self._vectors = None
+        self._cases = None
+        self._mapped = -1
+        self._refresh()
+
+    @classmethod
+    def open(cls, root: str | Path = SIMILAR_INDEX_DIR) -> "SimilarCaseIndex | None":
+        """The index at root, or None if none has been built."""
+        if not (Path(root) / "meta.json").exists():
+            return None
+        return cls(root)
+
+    def _stored_rows(self) -> int:
+        """Complete (vector, record) pairs on disk, including other processes' appends."""
+        vectors = self._vectors_path.stat().st_size // (4 * self.dim)
+        cases = self._cases_path.stat().st_size // CASE_DTYPE.itemsize
+        return min(vectors, cases)
+
+    def _load_meta(self) -> None:
+        """Columns, standardization and IVF lists of the current build."""
+        with open(self.root / "meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.columns = self.meta["columns"]
+        self.dim = len(self.columns)
+        self.mean = np.asarray(self.meta["mean"], dtype=np.float32)
+        self.scale = np.asarray(self.meta["scale"], dtype=np.float32)
+        self.ivf_rows = int(self.meta["ivf_rows"])
+        centroids = self.root / "centroids.npy"
+        self.centroids = np.load(centroids) if centroids.exists() else None
+        self.offsets = np.load(self.root / "offsets.npy") if self.centroids is not None else None
+
+    def _stale(self) -> bool:
+        """True when a rebuild replaced the files or appends grew them since the last mapping."""
+        return os.stat(self._vectors_path).st_ino != self._inode or self._stored_rows() != self._mapped
+
+    def _refresh(self) -> None:
+        """Reload meta after a rebuild and remap the files, with no append or rebuild in progress."""
+        with index_lock(self.root, exclusive=False):
+            inode = os.stat(self._vectors_path).st_ino
+            if inode != self._inode:
+                self._load_meta()
+                self._inode = inode
+            self.count = self._stored_rows()
+            self._remap()
+
+    def _remap(self) -> None:
+        """(Re)map the files; called when appends have grown them past the current mapping."""
+        count = self.count
+        if count == 0:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            self._cases = np.empty(0, dtype=CASE_DTYPE)
+        else:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+            self._cases = np.memmap(self._cases_path, dtype=CASE_DTYPE, mode="r", shape=(count,))
+        self._mapped = count
+
+    # ---- vectors ------------------------------------------------------
+    def vectorize(self, features) -> np.ndarray:
+        """Standardized float32 vector from a feature dict / Series / one-row DataFrame."""
+        if isinstance(features, pd.DataFrame):
+            features = features.iloc[0]
+        raw = np.array([float(features.get(c, 0.0) or 0.0) for c in self.columns], dtype=np.float32)
+        return (raw - self.mean) / self.scale
+
+    def append(self, vector: np.ndarray, agar: str, time_hr, probability: float | None = None,
+               image_path: str = "", label: int = -1) -> str:
+        """Add one case (online); returns its case id. Visible to searches immediately."""
+        case_id = uuid.uuid4().hex
+        record = np.zeros(1, dtype=CASE_DTYPE)
+        record[0] = (case_id, fixed_bytes(image_path, 96), fixed_bytes(agar, 16), float(time_hr),
+                     np.nan if probability is None else probability, label, time.time())
+        # Files are opened under the lock, so a concurrent rebuild cannot leave this write in a replaced inode.
+        with self._lock, index_lock(self.root), \
+                open(self._vectors_path, "ab") as vectors, open(self._cases_path, "ab") as cases:
+            # A writer that died between the two writes leaves one file a row ahead: drop that row.
+            rows = self._stored_rows()
+            vectors.truncate(rows * 4 * self.dim)
+            cases.truncate(rows * CASE_DTYPE.itemsize)
+            vectors.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+            cases.write(record.tobytes())
+        return case_id
+
+    # ---- search -------------------------------------------------------
+    def _ranges(self, query: np.ndarray, nprobe: int) -> list[tuple[int, int]]:
+        ranges = []
+        if self.centroids is not None:
+            distances = ((self.centroids - query) ** 2).sum(axis=1)
+            nprobe = min(nprobe, len(self.centroids))
+            for lst in np.argpartition(distances, nprobe - 1)[:nprobe]:
+                ranges.append((int(self.offsets[lst]), int(self.offsets[lst + 1])))
+        else:
+            ranges.append((0, self.ivf_rows))
+        ranges.append((self.ivf_rows, self.count))
+        return ranges
+
+    def search(self, query: np.ndarray, k: int = 5, agar: str | None = None,
+               nprobe: int = DEFAULT_NPROBE) -> list[tuple[int, float]]:
+        """(row, euclidean distance) of the k nearest stored cases, optionally of the same agar."""
+        with self._lock:
+            if self._stale():
+                self._refresh()
+            vectors, cases, ranges = self._vectors, self._cases, self._ranges(query, nprobe)
+        agar_code = fixed_bytes(agar, 16) if agar is not None else None
+
+        rows, dists = [], []
+        for start, stop in ranges:
+            stop = min(stop, len(vectors))
+            if stop <= start:
+                continue
+            d = ((vectors[start:stop] - query) ** 2).sum(axis=1)
+            index = np.arange(start, stop)
+            if agar_code is not None:
+                keep = cases["agar"][start:stop] == agar_code
+                d, index = d[keep], index[keep]
+            rows.append(index)
+            dists.append(d)
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        dists = np.concatenate(dists)
+        if len(dists) > k:
+            top = np.argpartition(dists, k - 1)[:k]
+            rows, dists = rows[top], dists[top]
+        order = np.argsort(dists)
+        return [(int(rows[i]), float(np.sqrt(dists[i]))) for i in order]
+
+    def case(self, row: int) -> dict:
+        record = self._cases[row]
+        probability = float(record["probability"])
+        return {
+            "case_id": record["case_id"].decode(),
+            "image_path": record["image_path"].decode(errors="replace") or None,
+            "agar": record["agar"].decode(errors="replace"),
+            "time_hr": float(record["time_hr"]),
+            "probability": None if np.isnan(probability) else round(probability, 4),
+            "label": None if record["label"] < 0 else int(record["label"]),
+            "ts": float(record["ts"]),
+        }
+
+
+def write_index(root: Path, vectors: np.ndarray, cases: np.ndarray, columns: list[str],
+                mean: np.ndarray, scale: np.ndarray, nlist: int | None = None) -> None:
+    """Write a fresh index (vectors already standardized), grouping rows by IVF list when large enough."""
+    root.mkdir(parents=True, exist_ok=True)
+    n = len(vectors)
+    if nlist is None:
+        nlist = int(np.sqrt(n)) if n >= IVF_MIN_ROWS else 0
+
+    for stale in ("centroids.npy", "offsets.npy"):
+        (root / stale).unlink(missing_ok=True)
+    if nlist:
+        from sklearn.cluster import MiniBatchKMeans
+
+        rng = np.random.default_rng(RANDOM_STATE)
+        sample = vectors[rng.choice(n, size=min(n, 100_000), replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=8192, n_init=1, random_state=RANDOM_STATE)
+        kmeans.fit(sample)
+        assignment = np.concatenate([kmeans.predict(vectors[i:i + 200_000]) for i in range(0, n, 200_000)])
+        order = np.argsort(assignment, kind="stable")
+        vectors, cases = vectors[order], cases[order]
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        np.save(root / "centroids.npy", kmeans.cluster_centers_.astype(np.float32))
+        np.save(root / "offsets.npy", offsets)
+
+    for name, array in (("vectors.f32", np.ascontiguousarray(vectors, dtype=np.float32)),
+                        ("cases.rec", np.ascontiguousarray(cases, dtype=CASE_DTYPE))):
+        tmp = root / f".{name}.tmp"
+        array.tofile(tmp)
+        os.replace(tmp, root / name)
+    meta = {
+        "columns": columns,
+        "mean": [float(v) for v in mean],
+        "scale": [float(v) for v in scale],
+        "nlist": nlist,
+        "ivf_rows": n,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(root / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def build_from_table(table: pd.DataFrame, root: Path) -> int:
+    columns = similarity_columns()
+    raw = table.reindex(columns=columns, fill_value=0).fillna(0).to_numpy(dtype=np.float32)
+    mean = raw.mean(axis=0)
+    scale = raw.std(axis=0)
+    scale[scale == 0] = 1.0
+
+    cases = np.zeros(len(table), dtype=CASE_DTYPE)
+    cases["case_id"] = [uuid.uuid4().hex.encode() for _ in range(len(table))]
+    if KEY_COLUMN in table:
+        cases["image_path"] = [fixed_bytes(p, 96) for p in table[KEY_COLUMN]]
+    if "agar" in table:
+        cases["agar"] = [fixed_bytes(a, 16) for a in table["agar"]]
+    cases["time_hr"] = table["time_hr"].to_numpy(dtype=np.float32) if "time_hr" in table else np.nan
+    cases["probability"] = np.nan
+    if LABEL_COLUMN in table:
+        labels = table[LABEL_COLUMN]
+        cases["label"] = np.where(labels.isna(), -1, (labels.astype(str) == str(POSITIVE_LABEL)).astype(int))
+    else:
+        cases["label"] = -1
+    cases["ts"] = time.time()
+
+    with index_lock(root):
+        write_index(root, (raw - mean) / scale, cases, columns, mean, scale)
+    return len(table)
+
+
+def reindex(root: Path) -> int:
+    """Regroup every stored row, holding the append lock from the read to the last replace."""
+    with index_lock(root):
+        meta = json.loads((root / "meta.json").read_text(encoding="utf-8"))
+        dim = len(meta["columns"])
+        vectors = np.fromfile(root / "vectors.f32", dtype=np.float32)
+        vectors = vectors[:len(vectors) // dim * dim].reshape(-1, dim)
+        cases = np.fromfile(root / "cases.rec", dtype=CASE_DTYPE)
+        rows = min(len(vectors), len(cases))
+        write_index(root, vectors[:rows], cases[:rows], meta["columns"],
+                    np.asarray(meta["mean"], dtype=np.float32), np.asarray(meta["scale"], dtype=np.float32))
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=str(SIMILAR_INDEX_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="build a fresh index from the feature table")
+    p_build.add_argument("--feature-table", default=str(FEATURE_TABLE_CSV))
+    sub.add_parser("reindex", help="regroup all rows (including online appends) into IVF lists")
+    args = parser.parse_args(argv)
+
+    root = Path(args.index_dir)
+    start = time.perf_counter()
+    if args.command == "build":
+        n = build_from_table(pd.read_csv(args.feature_table), root)
+    else:
+        n = reindex(root)
+    meta = json.loads((root / "meta.json").read_text(encoding="utf-8"))
+    print(f"[INFO] Indexed {n} cases ({meta['nlist']} IVF lists) in {time.perf_counter() - start:.1f}s -> {root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Procedural agar-plate photos, for parity checks, benchmarks and load tests without patient data.
+
+Each image is a light bench with an illumination gradient, and a petri dish
+with a rim. The agar is tinted by agar type and shaded by a linear light
+gradient plus vignetting. On top are colonies (count set by density, sizes
+log-normal, some with a wrinkled ring) and, optionally, quadrant streaks of
+confluent growth. Larger photos are drawn at DRAW_SIDE and upscaled, like a
+soft phone image, and then get per-pixel sensor noise. Images are
+deterministic for a given seed and parameters.
+
+    python -m src.synthetic --count 24 --output data/synthetic
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+DENSITIES = {"sparse": 15, "medium": 60, "dense": 250}
+AGAR_COLOURS = {  # BGR
+    "Ashdown": (125, 70, 135),
+    "Blood": (45, 40, 150),
+    "MacConkey": (140, 120, 205),
+}
+COLONY_COLOURS = ((205, 215, 225), (170, 140, 185), (150, 200, 225))
+SIZES = ((640, 480), (1600, 1200), (4032, 3024))
+DRAW_SIDE = 2048
+
+
+def synthetic_plate(seed: int = 0, size: tuple[int, int] = (1600, 1200), density: str = "medium",
+                    agar: str = "Ashdown", streaks: bool = True) -> np.ndarray:
+    """BGR uint8 photo of one synthetic plate; size is (width, height)."""
+    rng = np.random.default_rng(seed)
+    out_w, out_h = size
+    # Draw at up to DRAW_SIDE px and upscale; only the sensor noise is per output pixel.
+    scale = min(1.0, DRAW_SIDE / max(out_w, out_h))
+    w, h = max(1, round(out_w * scale)), max(1, round(out_h * scale))
+    side = min(w, h)
+    xx = np.arange(w, dtype=np.float32)[None, :]
+    yy = np.arange(h, dtype=np.float32)[:, None]
+    uniform = lambda low, high: float(rng.uniform(low, high))
+
+    # Bench: bright, with a gentle diagonal light falloff.
+    bench = 232 + 36 * (uniform(-0.08, 0.08) * (xx / w - 0.5) + uniform(-0.08, 0.08) * (yy / h - 0.5))
+
+    # Dish and agar.
+    cx = w / 2 + uniform(-0.04, 0.04) * side
+    cy = h / 2 + uniform(-0.04, 0.04) * side
+    radius = uniform(0.42, 0.46) * side
+    dist = np.hypot(xx - cx, yy - cy) / radius
+    inside = dist <= 1.0
+    light = 1.0 + uniform(-0.12, 0.12) * (xx - cx) / radius + uniform(-0.12, 0.12) * (yy - cy) / radius
+    light = light * (1.0 - 0.18 * np.minimum(dist, 1) ** 2)
+    colour = np.array(AGAR_COLOURS.get(agar, AGAR_COLOURS["Ashdown"]), np.float32) * uniform(0.92, 1.08)
+    rim = (dist > 0.965)[..., None]
+    agar_pixels = light[..., None] * colour
+    image = np.where(inside[..., None], np.where(rim, agar_pixels * 0.6 + 80, agar_pixels), bench[..., None])
+
+    # Growth layer: colonies and streaks, drawn then blended with soft edges.
+    layer = np.zeros((h, w, 3), np.float32)
+    alpha = np.zeros((h, w), np.float32)
+    agar_radius = 0.93 * radius
+    colony_colour = np.array(COLONY_COLOURS[rng.integers(len(COLONY_COLOURS))], np.float32)
+
+    def draw_colony(x, y, r):
+        c = tuple(float(v) for v in colony_colour * rng.uniform(0.85, 1.1))
+        axes = (max(1, int(r)), max(1, int(r * rng.uniform(0.75, 1.0))))
+        angle = float(rng.uniform(0, 180))
+        centre = (int(x), int(y))
+        cv2.ellipse(layer, centre, axes, angle, 0, 360, c, -1, cv2.LINE_AA)
+        cv2.ellipse(alpha, centre, axes, angle, 0, 360, 0.9, -1, cv2.LINE_AA)
+        if r > 4 and rng.random() < 0.4:  # wrinkled ring
+            ring = (max(1, int(axes[0] * 0.6)), max(1, int(axes[1] * 0.6)))
+            cv2.ellipse(layer, centre, ring, angle, 0, 360, tuple(v * 0.7 for v in c), max(1, int(r * 0.12)), cv2.LINE_AA)
+
+    for _ in range(DENSITIES[density]):
+        rr = agar_radius * np.sqrt(rng.random())
+        theta = rng.uniform(0, 2 * np.pi)
+        r = float(np.clip(rng.lognormal(np.log(0.018 * radius), 0.45), 1.5, 0.08 * radius))
+        draw_colony(cx + rr * np.cos(theta), cy + rr * np.sin(theta), r)
+
+    if streaks:
+        thickness = max(1, int(0.012 * radius))
+        for quadrant in range(3):
+            start = rng.uniform(0, 2 * np.pi) + quadrant * 2 * np.pi / 3
+            points = []
+            for k in range(12):
+                theta = start + (k % 2) * 0.5 + k * 0.04
+                rr = agar_radius * (0.25 + 0.6 * k / 12)
+                points.append((cx + rr * np.cos(theta), cy + rr * np.sin(theta)))
+            pts = np.array(points, np.int32).reshape(-1, 1, 2)
+            cv2.polylines(layer, [pts], False, tuple(float(v) for v in colony_colour * 0.95), thickness, cv2.LINE_AA)
+            cv2.polylines(alpha, [pts], False, 0.7, thickness, cv2.LINE_AA)
+            for x, y in points[::2]:
+                draw_colony(x, y, rng.uniform(1.0, 2.5) * thickness)
+
+    alpha *= dist <= 0.95
+    k = max(3, (side // 400) * 2 + 1)
+    alpha = cv2.GaussianBlur(alpha, (k, k), 0)[..., None]
+    image = image * (1 - alpha) + layer * light[..., None] * alpha
+
+    if (w, h) != (out_w, out_h):
+        image = cv2.resize(image, (out_w, out_h), interpolation=cv2.INTER_LINEAR)
+    noise = np.empty(image.shape, np.float32)
+    cv2.setRNGSeed(seed)
+    cv2.randn(noise, 0.0, 2.5)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_corpus(count: int, sizes=SIZES, densities=tuple(DENSITIES), agars=tuple(AGAR_COLOURS),
+                     seed: int = 0) -> Iterator[tuple[str, np.ndarray, dict]]:
+    """(name, BGR image, {"agar", "time_hr", "size", "density"}) cycling through sizes x densities x agars."""
+    for i in range(count):
+        size = tuple(sizes[i % len(sizes)])
+        density = densities[(i // len(sizes)) % len(densities)]
+        agar = agars[(i // (len(sizes) * len(densities))) % len(agars)]
+        image = synthetic_plate(seed + i, size, density, agar, streaks=i % 2 == 0)
+        name = f"synthetic/{i:04d}_{size[0]}x{size[1]}_{density}_{agar}"
+        yield name, image, {"agar": agar, "time_hr": 48, "size": size, "density": density}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--output", required=True, help="directory for the JPEGs and metadata.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", action="append", help="WIDTHxHEIGHT (repeatable; default: 640x480, 1600x1200, 4032x3024)")
+    args = parser.parse_args(argv)
+
+    sizes = [tuple(int(v) for v in s.lower().split("x")) for s in args.size] if args.size else SIZES
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    rows = ["filename,agar,time_hr"]
+    for name, image, meta in synthetic_corpus(args.count, sizes=sizes, seed=args.seed):
+        filename = Path(name).name + ".jpg"
+        cv2.imwrite(str(output / filename), image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        rows.append(f"{filename},{meta['agar']},{meta['time_hr']}")
+    (output / "metadata.csv").write_text("\n".join(rows) + "\n", encoding="utf-8")
+    print(f"[INFO] Wrote {args.count} synthetic plates to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
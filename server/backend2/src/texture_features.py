@@ -30,11 +30,6 @@ def extract_texture_features(gray: np.ndarray, mask: np.ndarray) -> dict:
     local_std = np.sqrt(np.maximum(mean_sq - mean * mean, 0))
     local_values = local_std[mask > 0]
 
-    # Downsample for fast GLCM.
-    small_gray = cv2.resize(masked, (96, 96), interpolation=cv2.INTER_AREA)
-    quantized = np.clip((small_gray / 32).astype(np.uint8), 0, 7)
-    glcm = graycomatrix(quantized, distances=[1], angles=[0], levels=8, symmetric=True, normed=True)
-
     return {
         "gray_mean": float(np.mean(values)),
         "gray_std": float(np.std(values)),
@@ -43,6 +38,16 @@ def extract_texture_features(gray: np.ndarray, mask: np.ndarray) -> dict:
         "laplacian_variance": float(np.var(lap_values)),
         "local_std_mean": float(np.mean(local_values)),
         "local_std_std": float(np.std(local_values)),
+        **glcm_features(masked),
+    }
+
+
+def glcm_features(masked: np.ndarray) -> dict:
+    """GLCM statistics of the masked gray image, downsampled to 96x96 for speed."""
+    small_gray = cv2.resize(masked, (96, 96), interpolation=cv2.INTER_AREA)
+    quantized = np.clip((small_gray / 32).astype(np.uint8), 0, 7)
+    glcm = graycomatrix(quantized, distances=[1], angles=[0], levels=8, symmetric=True, normed=True)
+    return {
         "glcm_contrast": float(graycoprops(glcm, "contrast").mean()),
         "glcm_homogeneity": float(graycoprops(glcm, "homogeneity").mean()),
         "glcm_energy": float(graycoprops(glcm, "energy").mean()),
@@ -0,0 +1,136 @@
+"""Decision-threshold sweep and the per-stratum threshold table.
+
+threshold_sweep() sorts the probabilities once and gets the confusion
+counts at every distinct threshold from one cumulative sum. It costs
+O(n log n) for the whole curve, instead of one sklearn metrics call per
+candidate threshold.
+
+The threshold table is a small JSON file written by src.evaluate:
+
+    {"default": 0.35,
+     "by_agar": {"Blood": 0.31, ...},
+     "by_agar_time": {"Blood": {"24": 0.28, ...}, ...}}
+
+/predict uses the most specific entry for the request's agar and time_hr.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Missing a true B. pseudomallei costs more than an extra confirmatory test.
+COST_FN = 5.0
+COST_FP = 1.0
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.full_like(num, np.nan), where=den > 0)
+
+
+def threshold_sweep(y_true, prob, cost_fn: float = COST_FN, cost_fp: float = COST_FP) -> dict:
+    """
+    Confusion counts and rates for every distinct threshold (predict positive when prob >= threshold).
+
+    Returns arrays ordered from the highest threshold (nothing positive) to the lowest
+    (everything positive). Keys: threshold, tp, fp, tn, fn, sensitivity, specificity,
+    ppv, npv, utility. utility is -(cost_fn * fn + cost_fp * fp) / n.
+    """
+    y = np.asarray(y_true).astype(bool)
+    p = np.asarray(prob, dtype=np.float64)
+    order = np.argsort(-p, kind="mergesort")
+    p = p[order]
+    y = y[order]
+
+    tp = np.cumsum(y)
+    fp = np.cumsum(~y)
+    # Last index of each run of equal probabilities: ties are all in or all out.
+    last = np.r_[np.flatnonzero(p[1:] != p[:-1]), len(p) - 1] if len(p) else np.array([], dtype=int)
+
+    top = np.nextafter(p[0], np.inf) if len(p) else 1.0
+    thresholds = np.r_[top, p[last]]
+    tp = np.r_[0, tp[last]]
+    fp = np.r_[0, fp[last]]
+
+    positives = int(y.sum())
+    negatives = len(y) - positives
+    fn = positives - tp
+    tn = negatives - fp
+
+    return {
+        "threshold": thresholds,
+        "tp": tp,
+        "fp": fp,
+        "tn": tn,
+        "fn": fn,
+        "sensitivity": _ratio(tp, positives),
+        "specificity": _ratio(tn, negatives),
+        "ppv": _ratio(tp, tp + fp),
+        "npv": _ratio(tn, tn + fn),
+        "utility": -(cost_fn * fn + cost_fp * fp) / max(len(y), 1),
+    }
+
+
+def sweep_auc(sweep: dict) -> float | None:
+    """ROC AUC from the sweep (trapezoid over the same points sklearn's roc_curve uses)."""
+    if np.isnan(sweep["sensitivity"][0]) or np.isnan(sweep["specificity"][0]):
+        return None
+    fpr = 1.0 - sweep["specificity"]
+    tpr = sweep["sensitivity"]
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def recommend_index(sweep: dict, min_sensitivity: float | None = None) -> int:
+    """
+    Index of the best-utility threshold, restricted to thresholds reaching min_sensitivity
+    when any do. Ties go to the highest threshold.
+    """
+    candidates = np.arange(len(sweep["threshold"]))
+    if min_sensitivity is not None:
+        ok = candidates[np.nan_to_num(sweep["sensitivity"], nan=0.0) >= min_sensitivity]
+        if len(ok):
+            candidates = ok
+    utility = sweep["utility"][candidates]
+    return int(candidates[np.argmax(utility)])  # argmax returns the first, i.e. highest, threshold
+
+
+def index_at(sweep: dict, threshold: float) -> int:
+    """Sweep row equivalent to a fixed threshold (lowest listed threshold still >= it)."""
+    at_or_above = np.flatnonzero(sweep["threshold"] >= threshold)
+    return int(at_or_above[-1]) if len(at_or_above) else 0
+
+
+def row(sweep: dict, index: int) -> dict:
+    """One sweep row as plain JSON-friendly values."""
+    out = {}
+    for key, values in sweep.items():
+        value = values[index]
+        if key in ("tp", "fp", "tn", "fn"):
+            out[key] = int(value)
+        else:
+            out[key] = None if np.isnan(value) else round(float(value), 4)
+    out["threshold"] = round(min(float(sweep["threshold"][index]), 1.0), 4)
+    return out
+
+
+# ---- threshold table -----------------------------------------------------
+def load_threshold_table(path: str | Path) -> dict | None:
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def lookup_threshold(table: dict | None, agar: str, time_hr, default: float) -> float:
+    """Most specific threshold for (agar, time_hr): agar+time, then agar, then the table/global default."""
+    if not table:
+        return default
+    by_time = table.get("by_agar_time", {}).get(agar, {})
+    key = str(int(time_hr)) if isinstance(time_hr, (int, float)) and float(time_hr).is_integer() else str(time_hr)
+    if key in by_time:
+        return float(by_time[key])
+    if agar in table.get("by_agar", {}):
+        return float(table["by_agar"][agar])
+    return float(table.get("default", default))
@@ -0,0 +1,390 @@
+"""Roberts, texture and colony features on a native-resolution plate, tile by tile.
+
+At full camera resolution a plate ROI has 10-40 MP, and the reference
+extractors are single-threaded: np.percentile sorts every plate pixel and the
+filters run one after another. This module splits the ROI into a grid of
+tiles and processes them on a thread pool; OpenCV and numpy release the GIL,
+so the tiles really do run in parallel. The result is the same feature dict the
+reference extractors would give on the same gray image and mask:
+
+    pass 1 (per tile)  Roberts edge map, Gaussian blur, Laplacian and local std.
+                       It returns uint8 histograms and (n, mean, M2) moments.
+    merge              Percentiles come from the summed histograms, so the
+                       thresholds are the exact global ones.
+    pass 2 (per tile)  Thresholds and morphology produce the binary maps. It
+                       counts pixels per colony region and traces contours.
+    seams              Tile-local contour tracing splits every component that
+                       touches a shared tile edge. Those components are traced
+                       again, once each, from the assembled binary map.
+
+Each tile reads a HALO-pixel border beyond its core, wider than any filter
+chain here (Roberts + open + close, blur + open, 9x9 box). That makes every
+core pixel identical to the whole-image computation. Counts, histograms and
+percentiles match exactly. Means and variances differ only by float
+summation order: local_std_* by ~1e-7 relative, because the reference
+averages a float32 array.
+
+    from src.tiled_features import extract_tiled_features
+    features = extract_tiled_features(gray, mask)   # from standardize_image_native
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from src.artifacts import capture
+from src.colony_features import extract_colony_features
+from src.config import TILE_SIZE
+from src.roberts_features import extract_roberts_features, roberts_edge_map
+from src.texture_features import extract_texture_features, glcm_features
+
+TILED_EXTRACTORS = ("roberts", "texture", "colony")
+HALO = 8
+KERNEL = np.ones((3, 3), np.uint8)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool(workers: int | None) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                           thread_name_prefix="tiled-features")
+        return _executor
+
+
+@dataclass(frozen=True)
+class Tile:
+    y0: int
+    y1: int
+    x0: int
+    x1: int
+    hy0: int
+    hy1: int
+    hx0: int
+    hx1: int
+
+    @property
+    def core(self) -> tuple[slice, slice]:
+        return slice(self.y0, self.y1), slice(self.x0, self.x1)
+
+    @property
+    def halo(self) -> tuple[slice, slice]:
+        return slice(self.hy0, self.hy1), slice(self.hx0, self.hx1)
+
+    @property
+    def inner(self) -> tuple[slice, slice]:
+        """The core, relative to the halo crop."""
+        return slice(self.y0 - self.hy0, self.y1 - self.hy0), slice(self.x0 - self.hx0, self.x1 - self.hx0)
+
+
+def make_tiles(shape: tuple[int, int], tile_size: int = TILE_SIZE, halo: int = HALO) -> list[Tile]:
+    h, w = shape
+    tiles = []
+    for y0 in range(0, h, tile_size):
+        for x0 in range(0, w, tile_size):
+            y1, x1 = min(h, y0 + tile_size), min(w, x0 + tile_size)
+            tiles.append(Tile(y0, y1, x0, x1, max(0, y0 - halo), min(h, y1 + halo), max(0, x0 - halo), min(w, x1 + halo)))
+    return tiles
+
+
+# ---- exact merges ------------------------------------------------------------
+def _moments(values: np.ndarray) -> tuple[int, float, float]:
+    if values.size == 0:
+        return 0, 0.0, 0.0
+    values = values.astype(np.float64, copy=False)
+    mean = float(values.mean())
+    return values.size, mean, float(((values - mean) ** 2).sum())
+
+
+def _merge_moments(parts) -> tuple[int, float, float]:
+    """Chan et al. pairwise merge of (n, mean, M2); M2 / n is the population variance."""
+    n, mean, m2 = 0, 0.0, 0.0
+    for nb, mb, m2b in parts:
+        if nb == 0:
+            continue
+        total = n + nb
+        delta = mb - mean
+        mean += delta * nb / total
+        m2 += m2b + delta * delta * n * nb / total
+        n = total
+    return n, mean, m2
+
+
+def hist_percentile(hist: np.ndarray, q: float) -> float:
+    """np.percentile(values, q) (linear method) from the values' histogram."""
+    cumulative = np.cumsum(hist)
+    n = int(cumulative[-1])
+    index = (n - 1) * (q / 100)
+    lo = int(np.floor(index))
+    gamma = index - lo
+    a = float(np.searchsorted(cumulative, lo, side="right"))
+    b = float(np.searchsorted(cumulative, min(lo + 1, n - 1), side="right"))
+    diff = b - a
+    # Same two-sided lerp as numpy, so the result matches to the last bit.
+    return b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+
+
+def _hist_mean_std(hist: np.ndarray) -> tuple[float, float]:
+    levels = np.arange(len(hist), dtype=np.float64)
+    n = hist.sum()
+    mean = float((hist * levels).sum() / n)
+    return mean, float(np.sqrt((hist * (levels - mean) ** 2).sum() / n))
+
+
+# ---- pass 1: filters, histograms, moments --------------------------------------
+def _first_pass(tile: Tile, gray, mask, masked, edge_out, blurred_out, extractors) -> dict:
+    g, m = gray[tile.halo], mask[tile.halo]
+    inner = tile.inner
+    inside = m[inner] > 0
+    out = {}
+    if "roberts" in extractors:
+        edge = roberts_edge_map(g, m)[inner]
+        edge_out[tile.core] = edge
+        out["edge_hist"] = np.bincount(edge[inside], minlength=256)
+    if "colony" in extractors:
+        blurred = cv2.GaussianBlur(g, (5, 5), 0)[inner]
+        blurred_out[tile.core] = blurred
+        out["blur_hist"] = np.bincount(blurred[inside], minlength=256)
+    if "texture" in extractors:
+        out["gray_hist"] = np.bincount(g[inner][inside], minlength=256)
+        mg = masked[tile.halo]
+        out["lap"] = _moments(cv2.Laplacian(mg, cv2.CV_64F)[inner][inside])
+        gray_float = mg.astype(np.float32)
+        mean = cv2.blur(gray_float, (9, 9))
+        mean_sq = cv2.blur(gray_float * gray_float, (9, 9))
+        local_std = np.sqrt(np.maximum(mean_sq - mean * mean, 0))[inner]
+        out["local_std"] = _moments(local_std[inside])
+    return out
+
+
+# ---- pass 2: binaries, region counts, contours ---------------------------------
+def _roberts_measure(contour):
+    return cv2.arcLength(contour, closed=False) if cv2.contourArea(contour) >= 3 else None
+
+
+def _colony_measure(contour):
+    area = cv2.contourArea(contour)
+    if area < 4:
+        return None
+    peri = cv2.arcLength(contour, True)
+    return area, peri, 4 * np.pi * area / (peri * peri) if peri > 0 else 0
+
+
+def _touches(lo: int, hi: int, seams: list[int]) -> bool:
+    """Whether pixel span [lo, hi) includes a column/row next to a seam (seam - 1 or seam)."""
+    return any(lo <= s <= hi for s in seams)
+
+
+def _tile_contours(binary_core: np.ndarray, tile: Tile, shape, measure) -> tuple[list, list]:
+    """(measure, first point) for components inside the tile, and rects of those touching a shared edge."""
+    h, w = shape
+    contours, _ = cv2.findContours(np.ascontiguousarray(binary_core), cv2.RETR_EXTERNAL,
+                                   cv2.CHAIN_APPROX_SIMPLE, offset=(tile.x0, tile.y0))
+    local, seam_rects = [], []
+    for c in contours:
+        x, y, cw, ch = cv2.boundingRect(c)
+        if (tile.x0 > 0 and x == tile.x0) or (tile.x1 < w and x + cw == tile.x1) or \
+                (tile.y0 > 0 and y == tile.y0) or (tile.y1 < h and y + ch == tile.y1):
+            seam_rects.append((x, y, x + cw, y + ch))
+            continue
+        value = measure(c)
+        if value is not None:
+            local.append((value, (float(c[0, 0, 0]), float(c[0, 0, 1]))))
+    return local, seam_rects
+
+
+def _second_pass(tile: Tile, mask, edge, blurred, binaries, thresholds, regions, shape) -> dict:
+    m = mask[tile.halo]
+    inner = tile.inner
+    out = {}
+    if "roberts" in thresholds:
+        binary = (edge[tile.halo] >= thresholds["roberts"]).astype(np.uint8) * 255
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, KERNEL)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, KERNEL)
+        binary = cv2.bitwise_and(binary, binary, mask=m)[inner]
+        binaries["roberts"][tile.core] = binary
+        out["roberts_pixels"] = int(np.count_nonzero(binary))
+        out["roberts"] = _tile_contours(binary, tile, shape, _roberts_measure)
+    if "colony" in thresholds:
+        binary = ((blurred[tile.halo] >= thresholds["colony"]) & (m > 0)).astype(np.uint8) * 255
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, KERNEL)[inner]
+        binaries["colony"][tile.core] = binary
+        core_mask = m[inner] > 0
+        core_binary = binary > 0
+        counts = {}
+        for name, axis, start, end in regions:
+            lo, hi = (tile.x0, tile.x1) if axis == "x" else (tile.y0, tile.y1)
+            a, b = max(start, lo) - lo, min(end, hi) - lo
+            if a >= b:
+                counts[name] = (0, 0)
+                continue
+            cut = (slice(None), slice(a, b)) if axis == "x" else (slice(a, b), slice(None))
+            region_mask = core_mask[cut]
+            counts[name] = (int(np.count_nonzero(core_binary[cut] & region_mask)), int(np.count_nonzero(region_mask)))
+        out["regions"] = counts
+        out["colony"] = _tile_contours(binary, tile, shape, _colony_measure)
+    return out
+
+
+# ---- seams -----------------------------------------------------------------
+def _merge_rects(rects: list[tuple[int, int, int, int]]) -> list[tuple[int, int, int, int]]:
+    """Union touching/overlapping rects until the boxes are pairwise separate."""
+    boxes = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for box in boxes:
+            for i, other in enumerate(out):
+                if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                    out[i] = (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return boxes
+
+
+def _seam_components(binary: np.ndarray, rects, seams_x, seams_y, measure) -> tuple[list, list]:
+    """Measures of the components touching a seam, each traced once, plus their outlines."""
+    h, w = binary.shape
+    values, outlines = [], []
+    for x0, y0, x1, y1 in _merge_rects(rects):
+        x0, y0, x1, y1 = max(0, x0 - 1), max(0, y0 - 1), min(w, x1 + 1), min(h, y1 + 1)
+        contours, _ = cv2.findContours(np.ascontiguousarray(binary[y0:y1, x0:x1]), cv2.RETR_EXTERNAL,
+                                       cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+        for c in contours:
+            x, y, cw, ch = cv2.boundingRect(c)
+            if not (_touches(x, x + cw, seams_x) or _touches(y, y + ch, seams_y)):
+                continue  # lies in one tile; already counted there
+            outlines.append((c, (x, y, x + cw, y + ch)))
+            value = measure(c)
+            if value is not None:
+                values.append(value)
+    return values, outlines
+
+
+def _component_values(binary, tiles_out, key, seams_x, seams_y, measure) -> list:
+    local, rects = [], []
+    for out in tiles_out:
+        tile_local, tile_rects = out[key]
+        local.extend(tile_local)
+        rects.extend(tile_rects)
+    values, outlines = _seam_components(binary, rects, seams_x, seams_y, measure)
+    for value, (px, py) in local:
+        # A component inside the hole of a seam component is not external in the whole image.
+        nested = any(bx0 <= px < bx1 and by0 <= py < by1 and cv2.pointPolygonTest(c, (px, py), False) > 0
+                     for c, (bx0, by0, bx1, by1) in outlines)
+        if not nested:
+            values.append(value)
+    return values
+
+
+# ---- public entry point -----------------------------------------------------
+def extract_tiled_features(gray: np.ndarray, mask: np.ndarray, extractors: tuple[str, ...] = TILED_EXTRACTORS,
+                           tile_size: int = TILE_SIZE, workers: int | None = None) -> dict:
+    """
+    Roberts/texture/colony features of a (large) gray image, computed tile-parallel.
+
+    Same keys, in the same order, as running the reference extractors one after another.
+    workers sizes the shared thread pool on first use (default: one thread per CPU).
+    """
+    unknown = set(extractors) - set(TILED_EXTRACTORS)
+    if unknown:
+        raise ValueError(f"No tiled implementation for extractors: {sorted(unknown)}")
+    if not np.any(mask):
+        reference = {"roberts": extract_roberts_features, "texture": extract_texture_features,
+                     "colony": extract_colony_features}
+        return {k: v for name in extractors for k, v in reference[name](gray, mask).items()}
+
+    shape = gray.shape
+    h, w = shape
+    tiles = make_tiles(shape, tile_size)
+    seams_x = sorted({t.x0 for t in tiles if t.x0 > 0})
+    seams_y = sorted({t.y0 for t in tiles if t.y0 > 0})
+    pool = _pool(workers)
+
+    masked = np.where(mask == 0, 0, gray).astype(np.uint8) if "texture" in extractors else None
+    edge = np.empty(shape, np.uint8) if "roberts" in extractors else None
+    blurred = np.empty(shape, np.uint8) if "colony" in extractors else None
+    glcm = pool.submit(glcm_features, masked) if masked is not None else None
+    first = list(pool.map(lambda t: _first_pass(t, gray, mask, masked, edge, blurred, extractors), tiles))
+
+    thresholds = {}
+    if "roberts" in extractors:
+        edge_hist = sum(out["edge_hist"] for out in first)
+        thresholds["roberts"] = max(8, hist_percentile(edge_hist, 85))
+    if "colony" in extractors:
+        thresholds["colony"] = hist_percentile(sum(out["blur_hist"] for out in first), 82)
+
+    binaries = {name: np.empty(shape, np.uint8) for name in thresholds}
+    regions = [(f"density_x_region_{i + 1}", "x", s, e) for i, (s, e) in enumerate([(0, w//3), (w//3, 2*w//3), (2*w//3, w)])]
+    regions += [(f"density_y_region_{i + 1}", "y", s, e) for i, (s, e) in enumerate([(0, h//3), (h//3, 2*h//3), (2*h//3, h)])]
+    second = list(pool.map(lambda t: _second_pass(t, mask, edge, blurred, binaries, thresholds, regions, shape), tiles)) \
+        if thresholds else []
+
+    if edge is not None:
+        capture("roberts_edge", edge)
+    for name, binary in binaries.items():
+        capture(f"{name}_binary", binary)
+
+    plate_area = max(1, int(np.count_nonzero(mask)))
+    features = {}
+    for name in extractors:
+        if name == "roberts":
+            mean, std = _hist_mean_std(edge_hist)
+            lengths = _component_values(binaries["roberts"], second, "roberts", seams_x, seams_y, _roberts_measure)
+            features.update({
+                "roberts_edge_mean": mean,
+                "roberts_edge_std": std,
+                "roberts_edge_p90": hist_percentile(edge_hist, 90),
+                "roberts_edge_density": float(sum(out["roberts_pixels"] for out in second) / plate_area),
+                "roberts_component_count": int(len(lengths)),
+                "roberts_total_contour_length": float(np.sum(lengths)) if lengths else 0.0,
+                "roberts_mean_contour_length": float(np.mean(lengths)) if lengths else 0.0,
+            })
+        elif name == "texture":
+            gray_hist = sum(out["gray_hist"] for out in first)
+            mean, std = _hist_mean_std(gray_hist)
+            n, _, lap_m2 = _merge_moments(out["lap"] for out in first)
+            n_local, local_mean, local_m2 = _merge_moments(out["local_std"] for out in first)
+            features.update({
+                "gray_mean": mean,
+                "gray_std": std,
+                "gray_p25": hist_percentile(gray_hist, 25),
+                "gray_p75": hist_percentile(gray_hist, 75),
+                "laplacian_variance": float(lap_m2 / n),
+                "local_std_mean": float(local_mean),
+                "local_std_std": float(np.sqrt(local_m2 / n_local)),
+                **glcm.result(),
+            })
+        else:
+            measured = _component_values(binaries["colony"], second, "colony", seams_x, seams_y, _colony_measure)
+            areas = [a for a, _, _ in measured]
+            perimeters = [p for _, p, _ in measured]
+            circularities = [c for _, _, c in measured]
+            colony_area = float(np.sum(areas)) if areas else 0.0
+            region_features = {}
+            for region, *_ in regions:
+                hits = sum(out["regions"][region][0] for out in second)
+                denom = max(1, sum(out["regions"][region][1] for out in second))
+                region_features[region] = float(hits / denom)
+            features.update({
+                "colony_component_count": int(len(areas)),
+                "colony_area_fraction": float(colony_area / plate_area),
+                "colony_area_mean": float(np.mean(areas)) if areas else 0.0,
+                "colony_area_std": float(np.std(areas)) if areas else 0.0,
+                "colony_area_p90": float(np.percentile(areas, 90)) if areas else 0.0,
+                "colony_perimeter_mean": float(np.mean(perimeters)) if perimeters else 0.0,
+                "colony_circularity_mean": float(np.mean(circularities)) if circularities else 0.0,
+                "colony_circularity_std": float(np.std(circularities)) if circularities else 0.0,
+                **region_features,
+            })
+    return features
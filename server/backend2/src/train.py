@@ -0,0 +1,255 @@
+"""Train the B. pseudomallei classifier and write the model bundle.
+
+Reads the feature table (FEATURE_TABLE_CSV or the feature store), splits it
+into train/test (reusing TRAIN_CSV/TEST_CSV when they exist), and grid-
+searches the RandomForest with CV_FOLDS-fold cross-validation. Every
+(candidate, fold) fit runs in its own process, so the search scales with
+cores. The forest is single-threaded inside the search to avoid
+oversubscription.
+
+The fitted preprocessing (imputers, scaler, one-hot encoder) is cached
+between candidates with joblib.Memory, because it depends only on the fold
+and not on the forest parameters.
+
+The decision threshold is picked from out-of-fold probabilities of the
+best candidate: the best cost-weighted threshold that still reaches
+--min-sensitivity. The bundle keeps the keys app.py reads (pipeline,
+feature_columns) plus threshold, params and metrics. Only the served
+extractors' columns are used (SERVED_EXTRACTORS), so the model never sees a
+feature /predict would have to fill with 0.
+
+The bundle goes to reports/candidate_model.pkl; --replace-served writes
+MODEL_PATH, the model the server loads, instead:
+
+    python -m src.train --jobs 32
+    python -m src.train --quick          # small grid for a smoke run
+    python -m src.train --jobs 32 --replace-served
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, cross_val_predict, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from src.build_feature_table import KEY_COLUMN
+from src.config import (
+    CV_FOLDS, FEATURE_STORE_DIR, FEATURE_TABLE_CSV, LABEL_COLUMN, MODEL_PATH, POSITIVE_LABEL,
+    RANDOM_STATE, REPORTS_DIR, TEST_CSV, TEST_SIZE, TRAIN_CSV,
+)
+from src.features import SERVED_EXTRACTORS, feature_names
+from src.thresholds import recommend_index, threshold_sweep
+
+CATEGORICAL_COLUMNS = ["agar"]
+NUMERIC_METADATA_COLUMNS = ["time_hr"]
+CANDIDATE_MODEL_PATH = REPORTS_DIR / "candidate_model.pkl"
+
+PARAM_GRID = {
+    "model__n_estimators": [300, 500],
+    "model__min_samples_leaf": [1, 2, 4],
+    "model__max_features": ["sqrt", 0.3],
+}
+QUICK_PARAM_GRID = {
+    "model__n_estimators": [100],
+    "model__min_samples_leaf": [2],
+}
+
+
+def build_pipeline(numeric_columns, categorical_columns, memory=None, n_jobs=-1) -> Pipeline:
+    """Same structure as the deployed bundle: impute + scale / one-hot, then a balanced RandomForest."""
+    preprocessor = ColumnTransformer([
+        ("numeric", Pipeline([
+            ("imputer", SimpleImputer(strategy="median")),
+            ("scaler", StandardScaler()),
+        ]), numeric_columns),
+        ("categorical", Pipeline([
+            ("imputer", SimpleImputer(strategy="most_frequent")),
+            ("onehot", OneHotEncoder(handle_unknown="ignore")),
+        ]), categorical_columns),
+    ])
+    model = RandomForestClassifier(
+        n_estimators=500,
+        min_samples_leaf=2,
+        class_weight="balanced",
+        n_jobs=n_jobs,
+        random_state=RANDOM_STATE,
+    )
+    return Pipeline([("preprocessor", preprocessor), ("model", model)], memory=memory)
+
+
+def load_table(args: argparse.Namespace) -> pd.DataFrame:
+    if args.from_store:
+        from src.feature_store import FeatureStore
+
+        return FeatureStore(args.store_dir).table()
+    return pd.read_csv(args.feature_table)
+
+
+def binary_labels(values: pd.Series, positive) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(values):
+        return (values == positive).astype(int).to_numpy()
+    return (values.astype(str) == str(positive)).astype(int).to_numpy()
+
+
+def split_table(df: pd.DataFrame, y: np.ndarray, train_csv: Path, test_csv: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Boolean train/test masks; reuses the saved split so test images never leak into training."""
+    if train_csv.exists() and test_csv.exists():
+        train_paths = set(pd.read_csv(train_csv)[KEY_COLUMN])
+        test_paths = set(pd.read_csv(test_csv)[KEY_COLUMN])
+        print(f"[INFO] Using saved split {train_csv} / {test_csv}")
+        return df[KEY_COLUMN].isin(train_paths).to_numpy(), df[KEY_COLUMN].isin(test_paths).to_numpy()
+
+    train_idx, test_idx = train_test_split(
+        np.arange(len(df)), test_size=TEST_SIZE, stratify=y, random_state=RANDOM_STATE
+    )
+    train_csv.parent.mkdir(parents=True, exist_ok=True)
+    test_csv.parent.mkdir(parents=True, exist_ok=True)
+    df.iloc[train_idx][[KEY_COLUMN]].to_csv(train_csv, index=False)
+    df.iloc[test_idx][[KEY_COLUMN]].to_csv(test_csv, index=False)
+    print(f"[INFO] Saved new stratified split to {train_csv} / {test_csv}")
+    train = np.zeros(len(df), dtype=bool)
+    train[train_idx] = True
+    return train, ~train
+
+
+def select_threshold(y_true: np.ndarray, prob: np.ndarray, min_sensitivity: float) -> float:
+    """Best cost-weighted threshold among those reaching min_sensitivity (see src.thresholds)."""
+    sweep = threshold_sweep(y_true, prob)
+    return float(min(sweep["threshold"][recommend_index(sweep, min_sensitivity)], 1.0))
+
+
+def rates_at(y_true: np.ndarray, prob: np.ndarray, threshold: float) -> dict:
+    pred = prob >= threshold
+    tp = int(np.sum(pred & (y_true == 1)))
+    tn = int(np.sum(~pred & (y_true == 0)))
+    fp = int(np.sum(pred & (y_true == 0)))
+    fn = int(np.sum(~pred & (y_true == 1)))
+    return {
+        "sensitivity": tp / (tp + fn) if tp + fn else None,
+        "specificity": tn / (tn + fp) if tn + fp else None,
+        "tp": tp, "tn": tn, "fp": fp, "fn": fn,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feature-table", default=str(FEATURE_TABLE_CSV))
+    parser.add_argument("--from-store", action="store_true", help="read features from the feature store")
+    parser.add_argument("--store-dir", default=str(FEATURE_STORE_DIR))
+    parser.add_argument("--train-csv", default=str(TRAIN_CSV))
+    parser.add_argument("--test-csv", default=str(TEST_CSV))
+    parser.add_argument("--output", help=f"bundle path (default: {CANDIDATE_MODEL_PATH})")
+    parser.add_argument("--replace-served", action="store_true", help=f"write the served model, {MODEL_PATH}")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--folds", type=int, default=CV_FOLDS)
+    parser.add_argument("--min-sensitivity", type=float, default=0.95,
+                        help="out-of-fold sensitivity the chosen threshold must reach")
+    parser.add_argument("--quick", action="store_true", help="single-candidate grid")
+    parser.add_argument("--report", default=str(REPORTS_DIR / "training_report.json"))
+    args = parser.parse_args(argv)
+    if args.output and args.replace_served:
+        parser.error("--output and --replace-served are mutually exclusive")
+    output = Path(MODEL_PATH if args.replace_served else args.output or CANDIDATE_MODEL_PATH)
+
+    df = load_table(args)
+    if LABEL_COLUMN not in df.columns:
+        sys.exit(f"[ERROR] Feature table has no '{LABEL_COLUMN}' column; join it from METADATA_CSV")
+    df = df.dropna(subset=[LABEL_COLUMN]).reset_index(drop=True)
+
+    categorical = [c for c in CATEGORICAL_COLUMNS if c in df.columns]
+    numeric = [c for c in NUMERIC_METADATA_COLUMNS if c in df.columns] + [c for c in feature_names(SERVED_EXTRACTORS) if c in df.columns]
+    feature_columns = categorical + numeric
+    y = binary_labels(df[LABEL_COLUMN], POSITIVE_LABEL)
+    X = df[feature_columns]
+
+    train, test = split_table(df, y, Path(args.train_csv), Path(args.test_csv))
+    X_train, y_train = X[train], y[train]
+    print(f"[INFO] {len(df)} rows: {train.sum()} train ({y_train.sum()} positive), {test.sum()} test; "
+          f"{len(feature_columns)} feature columns")
+
+    cv = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=RANDOM_STATE)
+    grid = QUICK_PARAM_GRID if args.quick else PARAM_GRID
+    cache_dir = tempfile.mkdtemp(prefix="bpa-train-cache-")
+    try:
+        search = GridSearchCV(
+            build_pipeline(numeric, categorical, memory=cache_dir, n_jobs=1),
+            grid,
+            scoring="roc_auc",
+            cv=cv,
+            n_jobs=args.jobs,
+            refit=False,
+        )
+        start = time.perf_counter()
+        search.fit(X_train, y_train)
+        best = search.best_params_
+        print(f"[INFO] Grid search: {len(search.cv_results_['params'])} candidates x {args.folds} folds "
+              f"in {time.perf_counter() - start:.1f}s; best AUC {search.best_score_:.4f} with {best}")
+
+        oof_pipeline = build_pipeline(numeric, categorical, memory=cache_dir, n_jobs=1).set_params(**best)
+        oof_prob = cross_val_predict(oof_pipeline, X_train, y_train, cv=cv, n_jobs=args.jobs,
+                                     method="predict_proba")[:, 1]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    threshold = select_threshold(y_train, oof_prob, args.min_sensitivity)
+    print(f"[INFO] Threshold {threshold:.4f} (out-of-fold sensitivity >= {args.min_sensitivity})")
+
+    pipeline = build_pipeline(numeric, categorical, n_jobs=-1).set_params(**best)
+    pipeline.fit(X_train, y_train)
+
+    metrics = {
+        "cv_roc_auc": float(search.best_score_),
+        "oof": rates_at(y_train, oof_prob, threshold),
+    }
+    if test.any():
+        test_prob = pipeline.predict_proba(X[test])[:, 1]
+        y_test = y[test]
+        metrics["test"] = rates_at(y_test, test_prob, threshold)
+        if len(np.unique(y_test)) == 2:
+            metrics["test"]["roc_auc"] = float(roc_auc_score(y_test, test_prob))
+        print(f"[INFO] Test: {metrics['test']}")
+
+    bundle = {
+        "pipeline": pipeline,
+        "feature_columns": feature_columns,
+        "threshold": threshold,
+        "params": best,
+        "metrics": metrics,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(bundle, output)
+    print(f"[INFO] Model bundle written to {output}")
+
+    report = {
+        "params": best,
+        "threshold": threshold,
+        "metrics": metrics,
+        "cv_results": [
+            {"params": p, "mean_auc": float(m), "std_auc": float(s)}
+            for p, m, s in zip(search.cv_results_["params"], search.cv_results_["mean_test_score"],
+                               search.cv_results_["std_test_score"])
+        ],
+    }
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"[INFO] Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Shared infrastructure for the ML backends and the gateway."""
@@ -0,0 +1,147 @@
+"""
+Run a request's independent steps concurrently on a shared thread pool.
+
+    graph = StepGraph("features")
+    graph.add("roberts", extract_roberts_features, stage="roberts_features")
+    graph.add("texture", extract_texture_features, stage="texture_features")
+    graph.add("colony", extract_colony_features, stage="colony_features")
+    results = graph.run(img_gray, mask)   # {"roberts": {...}, "texture": {...}, "colony": {...}}
+
+Each step is called as fn(*args, *results_of_its_dependencies). A step starts as
+soon as its dependencies have finished. The calling thread runs one of the
+ready steps itself, so a graph of N independent steps needs N - 1 handoffs.
+Results always come back in declaration order, whatever order the steps finish in.
+
+This helps single-request latency when the heavy work in each step is
+OpenCV/NumPy code that releases the GIL. Under load it would only add thread
+handoffs, because the other requests already use the CPUs. So run() falls back
+to running the steps one after another on the calling thread when:
+    - more than `max_parallel_requests` requests are already inside run()
+    - the pool has one worker (one CPU), or
+    - the request is being profiled (cProfile only sees the calling thread).
+
+Helper threads run each step in a copy of the caller's contextvars context,
+and stage timings recorded inside steps still land in the request's
+collect_stages() block.
+
+Configuration (environment):
+    STEP_WORKERS                shared pool size (default: CPU count)
+    STEP_PARALLEL               0 always runs sequentially (default 1)
+    STEP_PARALLEL_MAX_REQUESTS  concurrent requests that may still fan out
+                                (default: CPU count // 3, at least 1)
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from common.metrics import REGISTRY, active_collectors, collect_into
+from common.profiling import profiler_active
+
+CPUS = os.cpu_count() or 1
+STEP_WORKERS = int(os.environ.get("STEP_WORKERS", CPUS))
+STEP_PARALLEL = os.environ.get("STEP_PARALLEL", "1") == "1"
+STEP_PARALLEL_MAX_REQUESTS = int(os.environ.get("STEP_PARALLEL_MAX_REQUESTS", max(1, CPUS // 3)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """Process-wide pool for request steps (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=STEP_WORKERS, thread_name_prefix="request-step")
+        return _pool
+
+
+class StepGraph:
+    def __init__(self, name, max_parallel_requests=None, registry=None):
+        self.name = name
+        self.max_parallel_requests = max_parallel_requests or STEP_PARALLEL_MAX_REQUESTS
+        self.registry = registry or REGISTRY
+        self.parallel_runs = 0
+        self.sequential_runs = 0
+        self._steps = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, after=(), stage=None):
+        """Declare a step; dependencies must already be declared (so declaration order is a valid order)."""
+        missing = [dep for dep in after if dep not in self._steps]
+        if missing:
+            raise ValueError(f"Step {name!r} depends on undeclared steps: {missing}")
+        if name in self._steps:
+            raise ValueError(f"Duplicate step {name!r}")
+        self._steps[name] = (fn, tuple(after), stage)
+        return self
+
+    @property
+    def active_requests(self):
+        return self._active
+
+    def _call(self, name, args, results):
+        fn, after, stage = self._steps[name]
+        call_args = (*args, *(results[dep] for dep in after))
+        if stage is None:
+            return fn(*call_args)
+        with self.registry.stage(stage):
+            return fn(*call_args)
+
+    def _call_in_helper(self, name, args, results, collectors):
+        with collect_into(collectors):
+            return self._call(name, args, results)
+
+    def _fan_out(self):
+        return (STEP_PARALLEL and STEP_WORKERS > 1 and len(self._steps) > 1
+                and self._active <= self.max_parallel_requests and not profiler_active())
+
+    def run(self, *args):
+        """Run every step on args; returns {step: result} in declaration order."""
+        with self._lock:
+            self._active += 1
+            parallel = self._fan_out()
+            if parallel:
+                self.parallel_runs += 1
+            else:
+                self.sequential_runs += 1
+        try:
+            results = {}
+            if not parallel:
+                for name in self._steps:
+                    results[name] = self._call(name, args, results)
+                return results
+            self._run_parallel(args, results)
+            return {name: results[name] for name in self._steps}
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _run_parallel(self, args, results):
+        pool = shared_pool()
+        collectors = active_collectors()
+        pending = list(self._steps)
+        running = {}
+        try:
+            while pending or running:
+                for future in [f for f in running if f.done()]:
+                    results[running.pop(future)] = future.result()
+                ready = [n for n in pending if all(dep in results for dep in self._steps[n][1])]
+                if not ready:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[running.pop(future)] = future.result()
+                    continue
+                for name in ready[1:]:
+                    context = contextvars.copy_context()
+                    running[pool.submit(context.run, self._call_in_helper, name, args, results, collectors)] = name
+                for name in ready:
+                    pending.remove(name)
+                results[ready[0]] = self._call(ready[0], args, results)
+        finally:
+            # On error, don't leave helpers writing into a finished request.
+            for future in running:
+                future.cancel()
+            wait(running)
@@ -0,0 +1,154 @@
+"""
+Background writer for per-request debug images.
+
+A sampled request collects its intermediate arrays (plate mask, CLAHE gray,
+edge maps, binaries) by reference, usually through src.artifacts.capturing().
+It then hands them to submit(). PNG encoding and disk writes happen on a
+daemon thread behind a bounded queue, so the request only pays for a
+put_nowait(). When the queue is full, or today's disk quota is used up, the
+set is dropped and counted.
+
+Layout: <root>/<YYYY-MM-DD>/<request id>/<name>.png plus meta.json (whatever
+the caller passed: endpoint, probability, agar...). The quota counts the
+bytes under today's directory, including what earlier processes wrote.
+
+Configuration (environment):
+    DEBUG_ARTIFACT_SAMPLE_RATE    fraction of requests captured (default 0 = off)
+    DEBUG_ARTIFACT_DIR            root directory (default: the service's choice)
+    DEBUG_ARTIFACT_MAX_MB_PER_DAY disk quota per calendar day (default 500)
+    DEBUG_ARTIFACT_QUEUE_SIZE     bounded queue length, in requests (default 32)
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from common.metrics import REGISTRY
+
+
+class DebugArtifactWriter:
+    def __init__(self, root, sample_rate=0.0, max_bytes_per_day=500 << 20, max_queue=32):
+        self.root = Path(root)
+        self.sample_rate = sample_rate
+        self.max_bytes_per_day = max_bytes_per_day
+        self.written = 0
+        self.dropped = 0
+        self.over_quota = 0
+        self._day = None
+        self._day_bytes = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        if sample_rate > 0:
+            self._thread = threading.Thread(target=self._run, name="debug-artifacts", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, default_root):
+        return cls(
+            os.environ.get("DEBUG_ARTIFACT_DIR", default_root),
+            sample_rate=float(os.environ.get("DEBUG_ARTIFACT_SAMPLE_RATE", "0")),
+            max_bytes_per_day=int(float(os.environ.get("DEBUG_ARTIFACT_MAX_MB_PER_DAY", "500")) * (1 << 20)),
+            max_queue=int(os.environ.get("DEBUG_ARTIFACT_QUEUE_SIZE", "32")),
+        )
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def sample(self):
+        """Whether this request should capture artifacts (sampling, and today's quota not yet used up)."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        return not (self._day == time.strftime("%Y-%m-%d") and self._day_bytes >= self.max_bytes_per_day)
+
+    def submit(self, arrays, meta=None, request_id=None):
+        """Queue arrays (name -> 2-D/3-D uint8 or bool array) for writing; never blocks. Returns the id or None."""
+        if not self.enabled or not arrays:
+            return None
+        request_id = request_id or uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((request_id, dict(arrays), dict(meta or {}), time.time()))
+            return request_id
+        except queue.Full:
+            self.dropped += 1
+            REGISTRY.count_error("debug_artifacts_dropped")
+            return None
+
+    # ---- writer thread --------------------------------------------------
+    def _roll_day(self, day):
+        if day == self._day:
+            return
+        self._day = day
+        day_dir = self.root / day
+        self._day_bytes = sum(f.stat().st_size for f in day_dir.rglob("*") if f.is_file()) if day_dir.exists() else 0
+
+    def _write(self, request_id, arrays, meta, ts):
+        day = time.strftime("%Y-%m-%d", time.localtime(ts))
+        self._roll_day(day)
+        if self._day_bytes >= self.max_bytes_per_day:
+            self.over_quota += 1
+            return
+        encoded = {}
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype == bool:
+                array = array.astype(np.uint8) * 255
+            elif array.dtype != np.uint8:
+                array = cv2.normalize(array, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+            ok, buf = cv2.imencode(".png", array)
+            if ok:
+                encoded[name] = buf
+        meta = {**meta, "request_id": request_id, "ts": ts, "arrays": {n: list(np.shape(a)) for n, a in arrays.items()}}
+        payload = json.dumps(meta, default=str).encode()
+        size = sum(len(buf) for buf in encoded.values()) + len(payload)
+        if self._day_bytes + size > self.max_bytes_per_day:
+            self.over_quota += 1
+            return
+
+        out = self.root / day / request_id
+        out.mkdir(parents=True, exist_ok=True)
+        for name, buf in encoded.items():
+            (out / f"{name}.png").write_bytes(buf.tobytes())
+        (out / "meta.json").write_bytes(payload)
+        self._day_bytes += size
+        self.written += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except OSError:
+                REGISTRY.count_error("debug_artifacts_write")
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "written": self.written,
+            "dropped": self.dropped,
+            "over_quota": self.over_quota,
+            "today_mb": round(self._day_bytes / (1 << 20), 2),
+            "quota_mb": round(self.max_bytes_per_day / (1 << 20), 2),
+        }
@@ -0,0 +1,332 @@
+"""
+Per-stage latency metrics in Prometheus text exposition format.
+
+Recording is a perf_counter_ns() pair, a bisect into fixed buckets and a
+short lock per observation; all formatting (and the RSS read) happens only
+when /metrics is scraped.
+
+    from common.metrics import REGISTRY, instrument_function, register_metrics_endpoint
+
+    with REGISTRY.stage("decode"):
+        img = decode_image(image_base64)
+
+    instrument_function(preprocessing, "detect_plate_mask")  # wraps module attribute
+    register_metrics_endpoint(app)                           # /metrics + request counters
+"""
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds. Covers sub-millisecond helpers up to multi-second CNN requests.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (one label set)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def process_rss_bytes():
+    """Resident set size of this process (None if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+
+        # ru_maxrss is peak RSS: kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+_collectors = threading.local()
+
+
+@contextmanager
+def collect_stages():
+    """
+    Additionally record wall and CPU time of every stage entered on this
+    thread inside the block (used for per-request logs and profiling).
+    Yields a dict stage -> {"wall_ms", "cpu_ms", "calls"}; blocks may nest.
+
+    CPU time is process CPU time, so it includes helper threads a stage
+    starts (e.g. RandomForest n_jobs) and any concurrent requests.
+    """
+    collector = {}
+    active = getattr(_collectors, "active", None)
+    if active is None:
+        active = _collectors.active = []
+    active.append(collector)
+    try:
+        yield collector
+    finally:
+        active.remove(collector)
+
+
+
+def active_collectors():
+    """The calling thread's open collect_stages() dicts, to hand to helper threads."""
+    return list(getattr(_collectors, "active", None) or ())
+
+
+@contextmanager
+def collect_into(collectors):
+    """Record stages entered on this (helper) thread into another thread's collectors."""
+    previous = getattr(_collectors, "active", None)
+    _collectors.active = list(collectors)
+    try:
+        yield
+    finally:
+        _collectors.active = previous
+
+class MetricsRegistry:
+    """Stage histograms plus request and error counters for one service."""
+
+    def __init__(self, service, namespace="bpa"):
+        self.service = service
+        self.namespace = namespace
+        self._stages = {}
+        self._requests = {}
+        self._request_latency = {}
+        self._errors = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def _get(self, table, key, factory):
+        metric = table.get(key)
+        if metric is None:
+            with self._lock:
+                metric = table.setdefault(key, factory())
+        return metric
+
+    # ---- recording ----------------------------------------------------
+    def observe_stage(self, name, seconds):
+        self._get(self._stages, name, Histogram).observe(seconds)
+
+    def count_error(self, where):
+        self._get(self._errors, where, Counter).inc()
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self._get(self._requests, (endpoint, method, str(status)), Counter).inc()
+        self._get(self._request_latency, endpoint, Histogram).observe(seconds)
+        if status >= 500:
+            self.count_error(f"request:{endpoint}")
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @property
+    def in_flight(self):
+        """HTTP requests currently being handled (background work can wait for 0)."""
+        return self._in_flight
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block; exceptions are counted and re-raised."""
+        collectors = getattr(_collectors, "active", None)
+        cpu_start = time.process_time_ns() if collectors else 0
+        start = time.perf_counter_ns()
+        try:
+            yield
+        except BaseException:
+            self.count_error(name)
+            raise
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.observe_stage(name, elapsed / 1e9)
+            if collectors:
+                cpu_ms = (time.process_time_ns() - cpu_start) / 1e6
+                for collector in collectors:
+                    entry = collector.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0, "calls": 0})
+                    entry["wall_ms"] += elapsed / 1e6
+                    entry["cpu_ms"] += cpu_ms
+                    entry["calls"] += 1
+
+    def timed(self, name):
+        """Decorator form of stage()."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            wrapper.__wrapped_stage__ = name
+            return wrapper
+
+        return decorator
+
+    # ---- exposition ---------------------------------------------------
+    def _render_histograms(self, lines, metric, label_name, table):
+        lines.append(f"# TYPE {metric} histogram")
+        for key, histogram in sorted(table.items()):
+            cumulative, total = histogram.snapshot()
+            base = {"service": self.service, label_name: key}
+            for bound, count in zip(histogram.buckets, cumulative):
+                lines.append(f"{metric}_bucket{_labels(**base, le=repr(float(bound)))} {count}")
+            lines.append(f'{metric}_bucket{_labels(**base, le="+Inf")} {cumulative[-1]}')
+            lines.append(f"{metric}_sum{_labels(**base)} {total}")
+            lines.append(f"{metric}_count{_labels(**base)} {cumulative[-1]}")
+
+    def render(self):
+        ns = self.namespace
+        lines = []
+
+        lines.append(f"# HELP {ns}_stage_duration_seconds Pipeline stage latency.")
+        self._render_histograms(lines, f"{ns}_stage_duration_seconds", "stage", dict(self._stages))
+
+        lines.append(f"# HELP {ns}_request_duration_seconds HTTP request latency by endpoint.")
+        self._render_histograms(lines, f"{ns}_request_duration_seconds", "endpoint", dict(self._request_latency))
+
+        lines.append(f"# HELP {ns}_requests_total HTTP requests by endpoint, method and status.")
+        lines.append(f"# TYPE {ns}_requests_total counter")
+        for (endpoint, method, status), counter in sorted(dict(self._requests).items()):
+            labels = _labels(service=self.service, endpoint=endpoint, method=method, status=status)
+            lines.append(f"{ns}_requests_total{labels} {counter.value}")
+
+        lines.append(f"# HELP {ns}_errors_total Exceptions raised inside a stage or 5xx responses.")
+        lines.append(f"# TYPE {ns}_errors_total counter")
+        for where, counter in sorted(dict(self._errors).items()):
+            lines.append(f"{ns}_errors_total{_labels(service=self.service, where=where)} {counter.value}")
+
+        lines.append(f"# HELP {ns}_requests_in_flight HTTP requests currently being handled.")
+        lines.append(f"# TYPE {ns}_requests_in_flight gauge")
+        lines.append(f"{ns}_requests_in_flight{_labels(service=self.service)} {self._in_flight}")
+
+        rss = process_rss_bytes()
+        if rss is not None:
+            lines.append("# HELP process_resident_memory_bytes Resident memory size in bytes.")
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append(f"process_resident_memory_bytes{_labels(service=self.service)} {rss}")
+
+        lines.append("# HELP process_start_time_seconds Start time of the process since unix epoch.")
+        lines.append("# TYPE process_start_time_seconds gauge")
+        lines.append(f"process_start_time_seconds{_labels(service=self.service)} {self._started}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(service=os.environ.get("METRICS_SERVICE", "ml-backend"))
+
+
+def instrument_function(module, name, stage=None, registry=None):
+    """
+    Replace module.name with a timed wrapper.
+
+    Call sites that look the function up through the module at call time
+    (e.g. standardize_image calling detect_plate_mask) are timed without
+    touching the feature code itself. Idempotent.
+    """
+    registry = registry or REGISTRY
+    func = getattr(module, name)
+    if getattr(func, "__wrapped_stage__", None):
+        return func
+    wrapped = registry.timed(stage or name)(func)
+    setattr(module, name, wrapped)
+    return wrapped
+
+
+def register_metrics_endpoint(app, service=None, registry=None, path="/metrics"):
+    """
+    Add request counters/latency hooks and a /metrics route to a Flask app.
+
+    service names the process in every series unless METRICS_SERVICE is set.
+    """
+    from flask import Response, g, request
+
+    registry = registry or REGISTRY
+    if service and "METRICS_SERVICE" not in os.environ:
+        registry.service = service
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_start = time.perf_counter_ns()
+        if request.path != path:
+            g._metrics_in_flight = True
+            registry.request_started()
+
+    @app.after_request
+    def _metrics_record_request(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None and request.path != path:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.observe_request(
+                endpoint, request.method, response.status_code, (time.perf_counter_ns() - start) / 1e9
+            )
+        return response
+
+    @app.teardown_request
+    def _metrics_request_done(exc):
+        if g.pop("_metrics_in_flight", False):
+            registry.request_finished()
+
+    @app.route(path, methods=["GET"])
+    def metrics():
+        return Response(registry.render(), mimetype=None, headers={"Content-Type": CONTENT_TYPE})
+
+    return registry
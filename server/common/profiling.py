@@ -0,0 +1,133 @@
+"""
+Opt-in per-request profiling.
+
+A caller sends ``X-Profile: 1`` (plus ``X-Profile-Token`` when PROFILE_TOKEN
+is set) from an allowed address. The request then runs under cProfile and
+the stage timer collector; the response gets a per-stage wall/CPU
+breakdown and the full profile is written to PROFILE_DIR as a .prof file
+(open with ``python -m pstats`` or snakeviz).
+
+Configuration (environment):
+    PROFILE_ALLOWED_IPS  comma-separated caller addresses (default: localhost)
+    PROFILE_TOKEN        shared secret required in X-Profile-Token (optional)
+    PROFILE_DIR          where .prof dumps are written
+"""
+
+import cProfile
+import hmac
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from common.metrics import collect_stages
+
+PROFILE_HEADER = "X-Profile"
+TOKEN_HEADER = "X-Profile-Token"
+
+ALLOWED_IPS = {
+    ip.strip()
+    for ip in os.environ.get("PROFILE_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if ip.strip()
+}
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+
+# cProfile hooks the interpreter's profiler slot; profile one request at a time.
+_profiler_lock = threading.Lock()
+_profiling = threading.local()
+
+
+def profiler_active():
+    """Whether the calling thread is inside a RequestProfiler block."""
+    return getattr(_profiling, "active", False)
+
+
+def profiling_requested(request):
+    return request.headers.get(PROFILE_HEADER, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def caller_allowed(request):
+    """Address allowlist (direct peer only, forwarded headers are not trusted) plus optional token."""
+    if request.remote_addr not in ALLOWED_IPS:
+        return False
+    if PROFILE_TOKEN:
+        return hmac.compare_digest(request.headers.get(TOKEN_HEADER, ""), PROFILE_TOKEN)
+    return True
+
+
+class RequestProfiler:
+    """
+    Context manager that profiles the enclosed block.
+
+        with RequestProfiler(profile_dir, label="predict") as profiler:
+            ...
+        response["profile"] = profiler.summary()
+    """
+
+    def __init__(self, profile_dir, label="request"):
+        self.profile_dir = Path(os.environ.get("PROFILE_DIR", profile_dir))
+        self.label = label
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+        self.stages = {}
+        self.dump_path = None
+        self.error = None
+        self._profile = None
+        self._collect = None
+        self._locked = False
+
+    def __enter__(self):
+        self._collect = collect_stages()
+        self.stages = self._collect.__enter__()
+        _profiling.active = True
+        self._locked = _profiler_lock.acquire(blocking=False)
+        if self._locked:
+            self._profile = cProfile.Profile()
+            self._wall_start = time.perf_counter_ns()
+            self._cpu_start = time.process_time_ns()
+            self._profile.enable()
+        else:
+            self.error = "Another request is being profiled; stage breakdown only"
+            self._wall_start = time.perf_counter_ns()
+            self._cpu_start = time.process_time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._profile is not None:
+                self._profile.disable()
+        finally:
+            if self._locked:
+                _profiler_lock.release()
+            _profiling.active = False
+            self._collect.__exit__(exc_type, exc, tb)
+
+        self.wall_ms = (time.perf_counter_ns() - self._wall_start) / 1e6
+        self.cpu_ms = (time.process_time_ns() - self._cpu_start) / 1e6
+
+        if self._profile is not None:
+            try:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                self.dump_path = self.profile_dir / f"{self.profile_id}.prof"
+                self._profile.dump_stats(str(self.dump_path))
+            except OSError as e:
+                self.error = f"Could not write profile: {e}"
+                self.dump_path = None
+        return False
+
+    def summary(self):
+        return {
+            "id": self.profile_id,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "stages": {
+                name: {
+                    "wall_ms": round(entry["wall_ms"], 3),
+                    "cpu_ms": round(entry["cpu_ms"], 3),
+                    "calls": entry["calls"],
+                }
+                for name, entry in self.stages.items()
+            },
+            "dump": str(self.dump_path) if self.dump_path else None,
+            "error": self.error,
+        }
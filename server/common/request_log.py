@@ -0,0 +1,123 @@
+"""
+Non-blocking structured request logging.
+
+Each request builds one dict (metadata, stage timings, probability, model
+version). log() hands it to a daemon writer thread through a bounded
+queue; JSON encoding and the write itself happen on that thread. When the
+sink cannot keep up and the queue is full, records are dropped and counted
+rather than blocking the request thread.
+
+Configuration (environment):
+    LOG_FILE               append JSON lines here instead of stdout
+    LOG_QUEUE_SIZE         bounded queue length (default 1000)
+    LOG_DEBUG_SAMPLE_RATE  fraction of requests that carry verbose debug detail (default 0.01)
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from common.metrics import REGISTRY
+
+
+class RequestLogger:
+    def __init__(self, service, sink=None, max_queue=1000, debug_sample_rate=0.01):
+        self.service = service
+        self.debug_sample_rate = debug_sample_rate
+        self.dropped = 0
+        self._sink = sink
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=f"{service}-request-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, service):
+        log_file = os.environ.get("LOG_FILE")
+        sink = open(log_file, "a", encoding="utf-8", buffering=1 << 16) if log_file else None
+        return cls(
+            service,
+            sink=sink,
+            max_queue=int(os.environ.get("LOG_QUEUE_SIZE", "1000")),
+            debug_sample_rate=float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01")),
+        )
+
+    def sample_debug(self):
+        """Whether this request should carry verbose debug detail."""
+        return self.debug_sample_rate > 0 and random.random() < self.debug_sample_rate
+
+    def log(self, record):
+        """Queue one record; never blocks. Returns False if the record was dropped."""
+        record.setdefault("ts", time.time())
+        record.setdefault("service", self.service)
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            REGISTRY.count_error("request_log_dropped")
+            return False
+
+    def _write(self, records):
+        sink = self._sink or sys.stdout
+        lines = []
+        for record in records:
+            try:
+                lines.append(json.dumps(record, default=str))
+            except (TypeError, ValueError) as e:
+                lines.append(json.dumps({"service": self.service, "log_error": str(e)}))
+        try:
+            sink.write("\n".join(lines) + "\n")
+            sink.flush()
+        except (OSError, ValueError):
+            REGISTRY.count_error("request_log_write")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            # Drain whatever else is waiting so a burst costs one write/flush.
+            while len(batch) < 256:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write(batch)
+                    return
+                batch.append(record)
+            self._write(batch)
+
+    def close(self, timeout=2.0):
+        """Flush queued records and stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+def stage_timings(stages):
+    """Collapse a collect_stages() dict to {stage: wall_ms}."""
+    return {name: round(entry["wall_ms"], 3) for name, entry in stages.items()}
+
+
+def model_file_version(path):
+    """File name plus content hash, so log records identify the exact model build."""
+    if os.path.isdir(path):
+        return os.path.basename(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(path)}@{digest.hexdigest()[:12]}"
@@ -0,0 +1,226 @@
+"""
+Shadow evaluation of candidate models on live traffic.
+
+    shadow = ShadowEvaluator.from_env(default_dir)
+    shadow.add("retrained", score_fn, threshold=0.41, version="model.pkl@3f2a...")
+    ...
+    shadow.submit(features, primary_probability, primary_threshold, meta)
+
+submit() hands the request's already extracted features to a daemon
+worker through a bounded queue and returns at once. The worker calls each
+candidate's score_fn(features, meta) and compares its decision
+(probability >= its own threshold) with the primary model's. The request
+never waits on shadow work, and that work is dropped rather than queued
+under load:
+    - the worker only scores while no HTTP request is in flight
+      (REGISTRY.in_flight), so it neither takes CPU time nor holds the GIL
+      while a request runs;
+    - it skips items older than max_age_s: a server that stays busy sheds
+      shadow work instead of catching up on a backlog after the burst;
+    - when the queue is full, submit() drops the request;
+    - on Linux the worker thread runs at a lower priority (nice +10).
+
+Per candidate, the worker keeps agreement counts, positive rates and the
+mean probability difference, and writes them to <dir>/shadow_stats.json
+every 50 scored requests. Each disagreement is appended to
+<dir>/shadow_disagreements.jsonl with both probabilities, the request
+metadata and the features, so it can be replayed.
+
+Configuration (environment):
+    SHADOW_MODELS        comma-separated candidate model paths (read by the service; empty = off)
+    SHADOW_DIR           output directory (default: the service's choice)
+    SHADOW_QUEUE_SIZE    bounded queue length, in requests (default 32)
+    SHADOW_MAX_AGE_S     skip requests that waited longer than this (default 5)
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from common.metrics import REGISTRY
+
+STATS_EVERY = 50
+IDLE_POLL_S = 0.005
+
+
+class ShadowEvaluator:
+    def __init__(self, out_dir, max_queue=32, max_age_s=5.0, nice=10, busy=None):
+        self.out_dir = Path(out_dir)
+        self.max_age_s = max_age_s
+        self.nice = nice
+        self.busy = busy or (lambda: REGISTRY.in_flight > 0)
+        self.submitted = 0
+        self.dropped = 0
+        self.stale = 0
+        self.errors = 0
+        self._candidates = {}
+        self._stats = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, default_dir):
+        return cls(
+            os.environ.get("SHADOW_DIR", default_dir),
+            max_queue=int(os.environ.get("SHADOW_QUEUE_SIZE", "32")),
+            max_age_s=float(os.environ.get("SHADOW_MAX_AGE_S", "5")),
+        )
+
+    def add(self, name, score, threshold, version=None):
+        """Register a candidate: score(features, meta) -> probability; decision is probability >= threshold."""
+        if name in self._candidates:
+            raise ValueError(f"Duplicate shadow model {name!r}")
+        self._candidates[name] = (score, float(threshold))
+        self._stats[name] = {
+            "version": version,
+            "threshold": float(threshold),
+            "scored": 0,
+            "agree": 0,
+            "primary_positive": 0,
+            "candidate_positive": 0,
+            "abs_diff_sum": 0.0,
+            "score_ms_sum": 0.0,
+        }
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shadow-models", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def submit(self, features, primary_probability, primary_threshold, meta=None):
+        """Queue one request for shadow scoring; never blocks. Returns False if it was dropped."""
+        if not self.enabled:
+            return False
+        item = (time.time(), dict(features), float(primary_probability), float(primary_threshold), dict(meta or {}))
+        try:
+            self._queue.put_nowait(item)
+            self.submitted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            REGISTRY.count_error("shadow_dropped")
+            return False
+
+    # ---- worker thread --------------------------------------------------
+    def _score(self, ts, features, primary_probability, primary_threshold, meta):
+        primary_positive = primary_probability >= primary_threshold
+        disagreements = []
+        for name, (score, threshold) in self._candidates.items():
+            start = time.perf_counter()
+            try:
+                probability = float(score(features, meta))
+            except Exception:
+                self.errors += 1
+                REGISTRY.count_error("shadow_score")
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            positive = probability >= threshold
+            with self._lock:
+                stats = self._stats[name]
+                stats["scored"] += 1
+                stats["agree"] += positive == primary_positive
+                stats["primary_positive"] += primary_positive
+                stats["candidate_positive"] += positive
+                stats["abs_diff_sum"] += abs(probability - primary_probability)
+                stats["score_ms_sum"] += elapsed_ms
+            if positive != primary_positive:
+                disagreements.append({
+                    "ts": ts,
+                    "model": name,
+                    "version": self._stats[name]["version"],
+                    "primary_probability": round(primary_probability, 4),
+                    "primary_threshold": primary_threshold,
+                    "candidate_probability": round(probability, 4),
+                    "candidate_threshold": threshold,
+                    "meta": meta,
+                    "features": features,
+                })
+        return disagreements
+
+    def _append_disagreements(self, records):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.out_dir / "shadow_disagreements.jsonl", "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=float) + "\n")
+
+    def _write_stats(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / "shadow_stats.json"
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": time.time(), **self.stats()}, f, indent=2)
+        os.replace(tmp, path)
+
+    def _run(self):
+        if self.nice and hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except OSError:
+                pass
+        scored = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            while self.busy() and time.time() - item[0] <= self.max_age_s:
+                time.sleep(IDLE_POLL_S)
+            if time.time() - item[0] > self.max_age_s:
+                self.stale += 1
+                continue
+            disagreements = self._score(*item)
+            scored += 1
+            try:
+                if disagreements:
+                    self._append_disagreements(disagreements)
+                if scored % STATS_EVERY == 0:
+                    self._write_stats()
+            except OSError:
+                REGISTRY.count_error("shadow_write")
+        try:
+            if scored:
+                self._write_stats()
+        except OSError:
+            REGISTRY.count_error("shadow_write")
+
+    def close(self, timeout=5.0):
+        """Score what is queued, write the stats and stop the worker thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            models = {}
+            for name, s in self._stats.items():
+                n = s["scored"]
+                models[name] = {
+                    "version": s["version"],
+                    "threshold": s["threshold"],
+                    "scored": n,
+                    "agreement": round(s["agree"] / n, 4) if n else None,
+                    "disagreements": n - s["agree"],
+                    "primary_positive_rate": round(s["primary_positive"] / n, 4) if n else None,
+                    "candidate_positive_rate": round(s["candidate_positive"] / n, 4) if n else None,
+                    "mean_abs_probability_diff": round(s["abs_diff_sum"] / n, 4) if n else None,
+                    "mean_score_ms": round(s["score_ms_sum"] / n, 3) if n else None,
+                }
+        return {
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "errors": self.errors,
+            "models": models,
+        }
@@ -0,0 +1,281 @@
+"""
+Model gateway: one upload, both models.
+
+Decodes each image once and scores the shared pixel buffer with every
+enabled model runtime concurrently:
+
+    features -> handcrafted Roberts/texture/colony pipeline (backend2)
+    cnn      -> EfficientNetB0 + metadata MLP (backend)
+
+Enable models with GATEWAY_MODELS, e.g. GATEWAY_MODELS=features.
+With GATEWAY_MODE=cascade the feature model runs first and the CNN only
+scores plates whose feature probability falls within CASCADE_BAND of
+the feature threshold applied to that plate.
+"""
+
+import base64
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import Flask, jsonify, request
+from flask_cors import CORS
+from PIL import Image
+
+from cascade import CascadeStats, cascade_decision, in_band
+from config import (
+    CASCADE_BAND,
+    CASCADE_CNN_WEIGHT,
+    ENABLED_MODELS,
+    GATEWAY_MODE,
+    MODEL_WORKERS,
+    PORT,
+    SERVER_DIR,
+)
+from runtimes import as_shared_buffer, load_runtimes
+
+sys.path.insert(0, str(SERVER_DIR))
+from common.metrics import REGISTRY as metrics, register_metrics_endpoint
+
+
+# ============================================================
+# Flask app setup
+# ============================================================
+app = Flask(__name__)
+CORS(app)
+
+
+# ============================================================
+# Load model runtimes
+# ============================================================
+print("[INFO] Enabled models:", ", ".join(ENABLED_MODELS) or "none")
+
+runtimes, load_errors = load_runtimes(ENABLED_MODELS)
+register_metrics_endpoint(app, service="gateway")
+for name, message in load_errors.items():
+    print(f"[ERROR] Failed to load model runtime '{name}': {message}")
+for name, runtime in runtimes.items():
+    print(f"[INFO] Model runtime '{name}' loaded: {runtime.loaded}")
+
+executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="gateway-model")
+
+mode = GATEWAY_MODE
+if mode == "cascade" and not {"features", "cnn"} <= set(runtimes):
+    print("[ERROR] Cascade mode needs both 'features' and 'cnn'; falling back to parallel mode")
+    mode = "parallel"
+print(f"[INFO] Gateway mode: {mode}")
+if mode == "cascade":
+    print(f"[INFO] Cascade band: threshold -{CASCADE_BAND[0]} / +{CASCADE_BAND[1]}, CNN weight: {CASCADE_CNN_WEIGHT}")
+    for legacy in ("CASCADE_BAND_LOW", "CASCADE_BAND_HIGH"):
+        if legacy in os.environ:
+            print(f"[WARN] {legacy} is ignored: the band is now CASCADE_BAND_BELOW/ABOVE around the feature threshold")
+
+cascade_stats = CascadeStats()
+
+
+# ============================================================
+# Helper: Decode base64 image once into a shared RGB buffer
+# ============================================================
+def decode_image(image_base64: str) -> np.ndarray:
+    """
+    Converts base64 image string (optionally a data URL) into a read-only
+    RGB uint8 array shared by all model runtimes.
+    """
+    if "," in image_base64:
+        image_base64 = image_base64.split(",", 1)[1]
+
+    image_bytes = base64.b64decode(image_base64)
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+    return as_shared_buffer(np.asarray(img))
+
+
+def parse_time_hours(colony_age) -> int:
+    digits = "".join(filter(str.isdigit, str(colony_age)))
+    return int(digits) if digits else 48
+
+
+def run_model(runtime, image_rgb, agar, time_hr, characteristics) -> dict:
+    """Runs one runtime; failures are reported per model instead of failing the request."""
+    if not runtime.loaded:
+        return {"error": "Model not loaded"}
+    try:
+        return runtime.predict(image_rgb, agar, time_hr, characteristics)
+    except Exception as e:
+        import traceback
+
+        traceback.print_exc()
+        return {"error": "Prediction failed", "message": str(e)}
+
+
+def predict_parallel(image_rgb, agar, time_hr, characteristics) -> dict:
+    """Scores the image with every enabled model concurrently."""
+    futures = {
+        name: executor.submit(run_model, runtime, image_rgb, agar, time_hr, characteristics)
+        for name, runtime in runtimes.items()
+    }
+    return {"models": {name: future.result() for name, future in futures.items()}}
+
+
+def predict_cascade(image_rgb, agar, time_hr, characteristics) -> dict:
+    """
+    Runs the feature model first and escalates to the CNN only when the
+    feature probability is within CASCADE_BAND of its threshold (or the
+    feature model failed).
+    """
+    models = {}
+    feature_result = run_model(runtimes["features"], image_rgb, agar, time_hr, characteristics)
+    models["features"] = feature_result
+
+    if "error" in feature_result:
+        escalated = True
+        cnn_result = run_model(runtimes["cnn"], image_rgb, agar, time_hr, characteristics)
+        models["cnn"] = cnn_result
+        decision = None
+        if "error" not in cnn_result:
+            decision = {
+                "probability": cnn_result["probability"],
+                "threshold": cnn_result["threshold"],
+                "is_bpseudo": cnn_result["is_bpseudo"],
+                "source": "cnn",
+            }
+    else:
+        escalated = in_band(feature_result["probability"], feature_result["threshold"], CASCADE_BAND)
+        cnn_result = None
+        if escalated:
+            cnn_result = run_model(runtimes["cnn"], image_rgb, agar, time_hr, characteristics)
+            models["cnn"] = cnn_result
+            if "error" in cnn_result:
+                cnn_result = None
+        decision = cascade_decision(feature_result, cnn_result, CASCADE_BAND, CASCADE_CNN_WEIGHT)
+
+    cascade_stats.record(escalated)
+
+    return {
+        "models": models,
+        "cascade": {
+            "escalated": escalated,
+            "band": list(CASCADE_BAND),
+            "decision": decision,
+        },
+    }
+
+
+# ============================================================
+# API: Health check
+# ============================================================
+@app.route("/health", methods=["GET"])
+def health():
+    models = {name: {"loaded": runtime.loaded} for name, runtime in runtimes.items()}
+    models.update({name: {"loaded": False, "error": message} for name, message in load_errors.items()})
+    any_loaded = any(runtime.loaded for runtime in runtimes.values())
+
+    return jsonify(
+        {
+            "status": "ok" if any_loaded else "model_not_loaded",
+            "mode": mode,
+            "enabled_models": ENABLED_MODELS,
+            "models": models,
+            "cascade": (
+                {
+                    "band": list(CASCADE_BAND),
+                    "cnn_weight": CASCADE_CNN_WEIGHT,
+                    **cascade_stats.to_dict(),
+                }
+                if mode == "cascade"
+                else None
+            ),
+        }
+    )
+
+
+# ============================================================
+# API: Predict
+# Expected JSON (same contract as both backends):
+# {
+#   "image": "base64 image string",
+#   "agar": "Ashdown",
+#   "colony_age": "48 hours",
+#   "characteristics": []
+# }
+# ============================================================
+@app.route("/predict", methods=["POST"])
+def predict():
+    try:
+        if not runtimes:
+            return jsonify(
+                {
+                    "error": "No models loaded",
+                    "message": "Check GATEWAY_MODELS and server logs.",
+                }
+            ), 500
+
+        data = request.get_json()
+
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+
+        image_base64 = data.get("image")
+        agar = data.get("agar", "Blood")
+        colony_age = data.get("colony_age", "48")
+        characteristics = data.get("characteristics", [])
+
+        if not image_base64:
+            return jsonify({"error": "No image provided"}), 400
+
+        time_hr = parse_time_hours(colony_age)
+
+        t_start = time.perf_counter()
+        with metrics.stage("decode"):
+            image_rgb = decode_image(image_base64)
+        t_decoded = time.perf_counter()
+
+        if mode == "cascade":
+            results = predict_cascade(image_rgb, agar, time_hr, characteristics)
+        else:
+            results = predict_parallel(image_rgb, agar, time_hr, characteristics)
+        t_end = time.perf_counter()
+
+        return jsonify(
+            {
+                **results,
+                "mode": mode,
+                "metadata": {
+                    "agar": agar,
+                    "colony_age": colony_age,
+                    "time_hours": time_hr,
+                    "characteristics": characteristics,
+                },
+                "timings_ms": {
+                    "decode": round((t_decoded - t_start) * 1000, 2),
+                    "models": round((t_end - t_decoded) * 1000, 2),
+                    "total": round((t_end - t_start) * 1000, 2),
+                },
+            }
+        ), 200
+
+    except Exception as e:
+        import traceback
+
+        traceback.print_exc()
+        return jsonify(
+            {
+                "error": "Prediction failed",
+                "message": str(e),
+            }
+        ), 500
+
+
+# ============================================================
+# Run Flask server
+# ============================================================
+if __name__ == "__main__":
+    print(f"\n[INFO] Starting model gateway on port {PORT}")
+    print(f"[INFO] Health check : http://localhost:{PORT}/health")
+    print(f"[INFO] Predict      : http://localhost:{PORT}/predict")
+    print(f"[INFO] Metrics      : http://localhost:{PORT}/metrics\n")
+
+    app.run(host="0.0.0.0", port=PORT, debug=False)
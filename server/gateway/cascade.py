@@ -0,0 +1,70 @@
+"""
+Cost-aware cascade: cheap feature model first, CNN only near the threshold.
+
+The handcrafted-feature model costs a few milliseconds; EfficientNetB0
+costs far more CPU. When the feature probability falls outside the
+uncertainty band the feature decision stands on its own. Inside the band
+the CNN is run as well and the two scores are combined. The band is
+(below, above) around the threshold the feature result was decided with,
+so it follows the per-stratum threshold of each plate's agar and age.
+"""
+
+import threading
+
+
+def in_band(probability, threshold, band):
+    below, above = band
+    return threshold - below <= probability <= threshold + above
+
+
+def combine_scores(feature_result, cnn_result, cnn_weight):
+    """
+    Weighted average of both probabilities, compared against the same
+    weighted average of the two models' decision thresholds.
+    """
+    probability = (1 - cnn_weight) * feature_result["probability"] + cnn_weight * cnn_result["probability"]
+    threshold = (1 - cnn_weight) * feature_result["threshold"] + cnn_weight * cnn_result["threshold"]
+    return {
+        "probability": round(probability, 4),
+        "threshold": round(threshold, 4),
+        "is_bpseudo": bool(probability >= threshold),
+    }
+
+
+def cascade_decision(feature_result, cnn_result, band, cnn_weight):
+    """
+    Final cascade decision from the feature result and, when escalated, the
+    CNN result. Shared by the gateway and the offline tuning tool.
+    """
+    if cnn_result is None or not in_band(feature_result["probability"], feature_result["threshold"], band):
+        return {
+            "probability": feature_result["probability"],
+            "threshold": feature_result["threshold"],
+            "is_bpseudo": feature_result["is_bpseudo"],
+            "source": "features",
+        }
+    return {**combine_scores(feature_result, cnn_result, cnn_weight), "source": "combined"}
+
+
+class CascadeStats:
+    """Thread-safe escalation counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.escalated = 0
+
+    def record(self, escalated):
+        with self._lock:
+            self.requests += 1
+            if escalated:
+                self.escalated += 1
+
+    def to_dict(self):
+        with self._lock:
+            requests, escalated = self.requests, self.escalated
+        return {
+            "requests": requests,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+CNN_BACKEND_DIR = SERVER_DIR / "backend"
+FEATURE_BACKEND_DIR = SERVER_DIR / "backend2"
+
+# Models served by the gateway, comma separated: "features", "cnn"
+ENABLED_MODELS = [
+    name.strip().lower()
+    for name in os.environ.get("GATEWAY_MODELS", "features,cnn").split(",")
+    if name.strip()
+]
+
+# "parallel": every enabled model scores every image
+# "cascade":  feature model first, CNN only when the feature probability
+#             falls inside the uncertainty band (needs both models)
+GATEWAY_MODE = os.environ.get("GATEWAY_MODE", "parallel").lower()
+
+# Feature-model probabilities from BELOW under to ABOVE over the feature
+# threshold applied to the plate (threshold table stratum or bundle
+# threshold) are escalated to the CNN. Pick the margins with tune_cascade.py.
+CASCADE_BAND = (
+    float(os.environ.get("CASCADE_BAND_BELOW", "0.15")),
+    float(os.environ.get("CASCADE_BAND_ABOVE", "0.20")),
+)
+
+# Weight of the CNN probability when combining escalated scores
+CASCADE_CNN_WEIGHT = float(os.environ.get("CASCADE_CNN_WEIGHT", "0.5"))
+
+# Threads shared by all requests for running model runtimes concurrently
+MODEL_WORKERS = int(os.environ.get("GATEWAY_MODEL_WORKERS", "4"))
+
+# The CNN backend reports "Possibly/Probably B. pseudomallei" from 0.5 upwards
+CNN_DECISION_THRESHOLD = 0.5
+
+PORT = int(os.environ.get("PORT", 5010))
@@ -0,0 +1,148 @@
+"""
+Model runtimes used by the gateway.
+
+Each runtime wraps one backend's model and helpers (imported from that
+backend's app.py, so preprocessing and feature code stay identical to the
+standalone services) and scores an already decoded RGB pixel buffer.
+"""
+
+import importlib.util
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from config import CNN_BACKEND_DIR, CNN_DECISION_THRESHOLD, FEATURE_BACKEND_DIR
+
+
+def load_backend_module(module_name, backend_dir):
+    """Import a backend's app.py under a unique module name."""
+    if str(backend_dir) not in sys.path:
+        sys.path.insert(0, str(backend_dir))
+
+    spec = importlib.util.spec_from_file_location(module_name, backend_dir / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 2)
+
+
+class FeatureModelRuntime:
+    """Handcrafted Roberts/texture/colony features + sklearn pipeline (backend2)."""
+
+    name = "features"
+
+    def __init__(self):
+        self.backend = load_backend_module("feature_backend_app", FEATURE_BACKEND_DIR)
+
+        from src.preprocessing import preprocess_rgb_array_for_features, preprocess_rgb_array_native
+
+        native = getattr(self.backend, "NATIVE_RESOLUTION", False)
+        self._preprocess = preprocess_rgb_array_native if native else preprocess_rgb_array_for_features
+
+    @property
+    def loaded(self):
+        return self.backend.model is not None and self.backend.feature_columns is not None
+
+    def predict(self, image_rgb, agar, time_hr, characteristics):
+        t0 = time.perf_counter()
+        img_gray, mask = self._preprocess(image_rgb)
+        t1 = time.perf_counter()
+        X = self.backend.extract_features_from_gray(img_gray, mask, agar, time_hr)
+        t2 = time.perf_counter()
+        probability = self.backend.get_bpseudomallei_probability(X)
+        t3 = time.perf_counter()
+        threshold = self.backend.threshold_for(agar, time_hr)
+
+        return {
+            "probability": round(probability, 4),
+            "threshold": threshold,
+            "is_bpseudo": bool(probability >= threshold),
+            "timings_ms": {
+                "standardize": _ms(t0, t1),
+                "features": _ms(t1, t2),
+                "model": _ms(t2, t3),
+                "total": _ms(t0, t3),
+            },
+        }
+
+
+class CNNModelRuntime:
+    """EfficientNetB0 + metadata MLP (backend)."""
+
+    name = "cnn"
+
+    def __init__(self):
+        self.backend = load_backend_module("cnn_backend_app", CNN_BACKEND_DIR)
+        self.threshold = CNN_DECISION_THRESHOLD
+
+    @property
+    def loaded(self):
+        return (
+            self.backend.model is not None
+            and self.backend.encoder is not None
+            and self.backend.scaler is not None
+        )
+
+    def predict(self, image_rgb, agar, time_hr, characteristics):
+        t0 = time.perf_counter()
+        # Same RGB -> L conversion as the backend's reference preprocess_image
+        img_gray = Image.fromarray(image_rgb).convert("L")
+        img_batch = self.backend.prepare_image_batch(img_gray)
+        species = self.backend.determine_species(characteristics)
+        metadata_vector = self.backend.encode_metadata(agar, species, time_hr)
+        if metadata_vector is None:
+            raise ValueError("Failed to encode metadata")
+        t1 = time.perf_counter()
+        probability = self.backend.run_model(img_batch, metadata_vector)
+        t2 = time.perf_counter()
+
+        return {
+            "probability": round(probability, 4),
+            "threshold": self.threshold,
+            "is_bpseudo": bool(probability >= self.threshold),
+            "timings_ms": {
+                "preprocess": _ms(t0, t1),
+                "model": _ms(t1, t2),
+                "total": _ms(t0, t2),
+            },
+        }
+
+
+RUNTIME_CLASSES = {
+    FeatureModelRuntime.name: FeatureModelRuntime,
+    CNNModelRuntime.name: CNNModelRuntime,
+}
+
+
+def load_runtimes(names):
+    """
+    Load the requested runtimes.
+
+    Returns (runtimes, errors): runtimes maps name -> runtime for every
+    model that imported successfully, errors maps name -> message.
+    """
+    runtimes = {}
+    errors = {}
+    for name in names:
+        runtime_class = RUNTIME_CLASSES.get(name)
+        if runtime_class is None:
+            errors[name] = f"Unknown model '{name}'. Available: {sorted(RUNTIME_CLASSES)}"
+            continue
+        try:
+            runtimes[name] = runtime_class()
+        except Exception as e:
+            errors[name] = str(e)
+    return runtimes, errors
+
+
+def as_shared_buffer(image_rgb):
+    """Mark a decoded image read-only before handing it to several runtimes."""
+    image_rgb = np.ascontiguousarray(image_rgb)
+    image_rgb.flags.writeable = False
+    return image_rgb
@@ -0,0 +1,263 @@
+"""
+Offline cascade tuning: replay a labeled image folder through both models
+and pick CASCADE_BAND margins that trade accuracy against average latency.
+
+Folder layout (label taken from the sub-folder name):
+
+    plates/
+        positive/   (or 1, bpseudomallei)
+        negative/   (or 0, other)
+
+Usage:
+    python tune_cascade.py plates/ --agar Ashdown --colony-age 48 --save-scores scores.csv
+    python tune_cascade.py --from-scores scores.csv --output cascade_report.json
+
+Scoring runs both models on every image once; the band sweep is then
+computed from the recorded probabilities and per-model timings. Each
+image's feature decision uses the threshold the gateway applies to it:
+the feature backend's threshold_for(agar, time_hr), i.e. the threshold
+table stratum or the model bundle's threshold. It is recorded per image
+as feature_threshold (score files without that column are looked up again).
+"""
+
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from cascade import cascade_decision, in_band
+from config import CASCADE_CNN_WEIGHT, CNN_DECISION_THRESHOLD
+
+POSITIVE_LABELS = {"positive", "1", "bpseudomallei", "pseudomallei"}
+NEGATIVE_LABELS = {"negative", "0", "other", "not_bpseudomallei"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp"}
+SCORE_FIELDS = [
+    "image", "label", "agar", "time_hr",
+    "feature_probability", "feature_threshold", "feature_ms", "cnn_probability", "cnn_ms",
+]
+
+
+def labeled_images(folder):
+    for label_dir in sorted(p for p in Path(folder).iterdir() if p.is_dir()):
+        name = label_dir.name.lower()
+        if name in POSITIVE_LABELS:
+            label = 1
+        elif name in NEGATIVE_LABELS:
+            label = 0
+        else:
+            print(f"[WARN] Skipping folder with unknown label: {label_dir}")
+            continue
+        for path in sorted(label_dir.rglob("*")):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                yield path, label
+
+
+def score_folder(folder, agar, time_hr, characteristics):
+    """Runs both models on every image; returns one score row per image."""
+    from runtimes import as_shared_buffer, load_runtimes
+
+    runtimes, errors = load_runtimes(["features", "cnn"])
+    if errors or not all(runtime.loaded for runtime in runtimes.values()):
+        sys.exit(f"[ERROR] Both models must be loaded to tune the cascade: {errors}")
+
+    rows = []
+    for path, label in labeled_images(folder):
+        image_rgb = as_shared_buffer(np.asarray(Image.open(path).convert("RGB")))
+        feature_result = runtimes["features"].predict(image_rgb, agar, time_hr, characteristics)
+        cnn_result = runtimes["cnn"].predict(image_rgb, agar, time_hr, characteristics)
+        rows.append(
+            {
+                "image": str(path),
+                "label": label,
+                "agar": agar,
+                "time_hr": time_hr,
+                "feature_probability": feature_result["probability"],
+                "feature_threshold": feature_result["threshold"],
+                "feature_ms": feature_result["timings_ms"]["total"],
+                "cnn_probability": cnn_result["probability"],
+                "cnn_ms": cnn_result["timings_ms"]["total"],
+            }
+        )
+        print(f"[SCORE] {path.name}: label={label} "
+              f"features={feature_result['probability']:.3f} cnn={cnn_result['probability']:.3f}")
+    return rows
+
+
+def load_scores(path, agar, time_hr):
+    """Score rows from a CSV; agar/time_hr fill in files written before those columns existed."""
+    with open(path, newline="") as f:
+        return [
+            {
+                "image": row["image"],
+                "label": int(row["label"]),
+                "agar": row.get("agar") or agar,
+                "time_hr": int(float(row.get("time_hr") or time_hr)),
+                "feature_probability": float(row["feature_probability"]),
+                "feature_threshold": float(row["feature_threshold"]) if row.get("feature_threshold") else None,
+                "feature_ms": float(row["feature_ms"]),
+                "cnn_probability": float(row["cnn_probability"]),
+                "cnn_ms": float(row["cnn_ms"]),
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def save_scores(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SCORE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def fill_feature_thresholds(rows):
+    """Set feature_threshold where a score file lacks it, with the feature backend's own lookup."""
+    missing = [row for row in rows if row["feature_threshold"] is None]
+    if not missing:
+        return
+    from runtimes import load_runtimes
+
+    runtimes, errors = load_runtimes(["features"])
+    if errors:
+        sys.exit(f"[ERROR] The feature backend is needed to look up thresholds: {errors}")
+    threshold_for = runtimes["features"].backend.threshold_for
+    for row in missing:
+        row["feature_threshold"] = float(threshold_for(row["agar"], row["time_hr"]))
+
+
+def evaluate_band(rows, band, cnn_weight):
+    """Accuracy, sensitivity, specificity, escalation rate and mean latency of one band."""
+    tp = tn = fp = fn = escalated = 0
+    latency = 0.0
+    for row in rows:
+        feature_threshold = row["feature_threshold"]
+        feature_result = {
+            "probability": row["feature_probability"],
+            "threshold": feature_threshold,
+            "is_bpseudo": row["feature_probability"] >= feature_threshold,
+        }
+        cnn_result = None
+        latency += row["feature_ms"]
+        if band is not None and in_band(row["feature_probability"], feature_threshold, band):
+            escalated += 1
+            latency += row["cnn_ms"]
+            cnn_result = {"probability": row["cnn_probability"], "threshold": CNN_DECISION_THRESHOLD}
+        predicted = cascade_decision(feature_result, cnn_result, band, cnn_weight)["is_bpseudo"]
+        if row["label"] == 1:
+            tp += predicted
+            fn += not predicted
+        else:
+            fp += predicted
+            tn += not predicted
+
+    n = max(1, len(rows))
+    return {
+        "band": [round(band[0], 4), round(band[1], 4)] if band is not None else None,
+        "accuracy": round((tp + tn) / n, 4),
+        "sensitivity": round(tp / (tp + fn), 4) if tp + fn else None,
+        "specificity": round(tn / (tn + fp), 4) if tn + fp else None,
+        "escalation_rate": round(escalated / n, 4),
+        "mean_latency_ms": round(latency / n, 2),
+    }
+
+
+def pareto_front(results):
+    """Bands not beaten on both accuracy and latency by any other band."""
+    front = []
+    best_accuracy = -1.0
+    for result in sorted(results, key=lambda r: (r["mean_latency_ms"], -r["accuracy"])):
+        if result["accuracy"] > best_accuracy:
+            front.append(result)
+            best_accuracy = result["accuracy"]
+    return front
+
+
+def sweep(rows, cnn_weight, step):
+    """Every (below, above) margin pair on the grid, up to the widest any image's threshold allows."""
+    thresholds = [row["feature_threshold"] for row in rows]
+    belows = np.arange(0.0, max(thresholds) + 1e-9, step)
+    aboves = np.arange(0.0, 1.0 - min(thresholds) + 1e-9, step)
+    return [
+        evaluate_band(rows, (float(below), float(above)), cnn_weight)
+        for below in belows
+        for above in aboves
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", nargs="?", help="Labeled image folder to replay")
+    parser.add_argument("--from-scores", help="Reuse a scores CSV written by --save-scores")
+    parser.add_argument("--save-scores", help="Write per-image probabilities and timings to CSV")
+    parser.add_argument("--agar", default="Blood")
+    parser.add_argument("--colony-age", default="48")
+    parser.add_argument("--cnn-weight", type=float, default=CASCADE_CNN_WEIGHT)
+    parser.add_argument("--step", type=float, default=0.05, help="Band grid step")
+    parser.add_argument("--max-accuracy-loss", type=float, default=0.01,
+                        help="Recommend the fastest band within this accuracy of the best band")
+    parser.add_argument("--output", help="Write the full sweep report to JSON")
+    args = parser.parse_args()
+
+    time_hr = int("".join(filter(str.isdigit, args.colony_age)) or 48)
+    if args.from_scores:
+        rows = load_scores(args.from_scores, args.agar, time_hr)
+    elif args.folder:
+        rows = score_folder(args.folder, args.agar, time_hr, [])
+    else:
+        parser.error("Provide a labeled folder or --from-scores")
+
+    if not rows:
+        sys.exit("[ERROR] No labeled images found")
+    fill_feature_thresholds(rows)
+    if args.save_scores:
+        save_scores(rows, args.save_scores)
+    feature_thresholds = sorted({row["feature_threshold"] for row in rows})
+
+    results = sweep(rows, args.cnn_weight, args.step)
+    features_only = evaluate_band(rows, None, args.cnn_weight)
+    always_escalate = evaluate_band(rows, (1.0, 1.0), args.cnn_weight)
+    front = pareto_front(results)
+
+    best_accuracy = max(r["accuracy"] for r in results)
+    recommended = min(
+        (r for r in results if r["accuracy"] >= best_accuracy - args.max_accuracy_loss),
+        key=lambda r: (r["mean_latency_ms"], -r["accuracy"]),
+    )
+
+    print(f"\n[INFO] {len(rows)} images, feature threshold(s) {', '.join(map(str, feature_thresholds))}, "
+          f"CNN weight {args.cnn_weight}")
+    print(f"{'band':<16}{'accuracy':>10}{'sens':>8}{'spec':>8}{'escalated':>11}{'mean ms':>10}")
+    for label, r in [("features only", features_only), ("always both", always_escalate)] + [
+        (f"-{r['band'][0]:.2f} / +{r['band'][1]:.2f}", r) for r in front
+    ]:
+        print(f"{label:<16}{r['accuracy']:>10.4f}{r['sensitivity'] or 0:>8.3f}{r['specificity'] or 0:>8.3f}"
+              f"{r['escalation_rate']:>11.1%}{r['mean_latency_ms']:>10.1f}")
+    print(f"\n[INFO] Recommended: CASCADE_BAND_BELOW={recommended['band'][0]} "
+          f"CASCADE_BAND_ABOVE={recommended['band'][1]} "
+          f"(accuracy {recommended['accuracy']}, {recommended['escalation_rate']:.1%} escalated, "
+          f"{recommended['mean_latency_ms']} ms mean)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "images": len(rows),
+                    "feature_thresholds": feature_thresholds,
+                    "cnn_weight": args.cnn_weight,
+                    "features_only": features_only,
+                    "always_escalate": always_escalate,
+                    "recommended": recommended,
+                    "pareto_front": front,
+                    "sweep": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"[INFO] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
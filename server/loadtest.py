@@ -0,0 +1,515 @@
+"""
+Load test: replay plate photos against a local prediction service
+
+Sends /predict requests to backend2 (features, :5005), backend (CNN, :5000)
+or the gateway (:5010) and reports throughput, latency percentiles and
+error rates. While it runs it samples the server process's RSS and CPU
+(with its child processes, e.g. gunicorn workers). Plates come from an
+image directory or from the procedural generator (backend2/src/synthetic.py).
+Every request body is encoded once, before the run, so the client spends
+its CPU on HTTP and not on JPEG/base64 work.
+
+Load models:
+    --concurrency N        closed loop: N clients, each sends its next request
+                           as soon as the previous one returns
+    --rate R               open loop: R requests/s (Poisson or --arrival uniform),
+                           dispatched by --concurrency senders. Latency is measured
+                           from the scheduled arrival, so client-side queueing
+                           while the server lags counts (no coordinated omission).
+
+Upload contracts:
+    json                   {"image": "<base64>", "agar": ..., "colony_age": ...}
+    dataurl                the same with a data:image/jpeg;base64, prefix (browser uploads)
+    multipart              multipart/form-data with the raw JPEG as "image": no
+                           base64 inflation. Neither Flask service accepts it yet;
+                           use it against routes that do (server/index.js).
+
+Only loopback hosts are accepted. Server sampling reads /proc (Linux) and
+finds the server from the listening port, or takes --server-pid. On a
+one-machine setup client and server share the CPUs; the report includes
+the client's own CPU time so that can be checked.
+
+Usage:
+    python loadtest.py --backend backend2 --concurrency 4 --duration 60
+    python loadtest.py --backend backend2 --rate 5 --duration 120 --images ../data/raw
+    python loadtest.py --backend gateway --synthetic 24 --sizes 4032x3024 --field tta=4
+    python loadtest.py --backend backend2 --concurrency 4 --compare reports/loadtest/previous.json
+"""
+
+import argparse
+import base64
+import csv
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+SERVER_DIR = Path(__file__).resolve().parent
+FEATURE_BACKEND_DIR = SERVER_DIR / "backend2"
+REPORTS_DIR = SERVER_DIR / "reports" / "loadtest"
+
+BACKEND_URLS = {
+    "backend2": "http://127.0.0.1:5005",
+    "backend": "http://127.0.0.1:5000",
+    "gateway": "http://127.0.0.1:5010",
+}
+CONTRACTS = ("json", "dataurl", "multipart")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ============================================================
+# Corpus: (name, JPEG/PNG bytes, agar, colony_age)
+# ============================================================
+def load_images(image_dir, limit):
+    """Image files under image_dir, with agar and colony age from a metadata.csv next to them if present."""
+    image_dir = Path(image_dir)
+    metadata = {}
+    metadata_csv = image_dir / "metadata.csv"
+    if metadata_csv.exists():
+        with open(metadata_csv, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                metadata[row.get("filename", "")] = row
+    paths = sorted(p for p in image_dir.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    corpus = []
+    for path in paths[:limit] if limit else paths:
+        rel_path = path.relative_to(image_dir).as_posix()
+        meta = metadata.get(rel_path) or metadata.get(path.name) or {}
+        corpus.append((rel_path, path.read_bytes(), meta.get("agar") or "Ashdown", str(meta.get("time_hr") or 48)))
+    return corpus
+
+
+def synthetic_images(count, sizes, seed):
+    """count procedural plates from backend2's generator, JPEG-encoded like a phone upload."""
+    if str(FEATURE_BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(FEATURE_BACKEND_DIR))
+    import cv2
+    from src.synthetic import synthetic_corpus
+
+    corpus = []
+    for name, image, meta in synthetic_corpus(count, sizes=sizes, seed=seed):
+        jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        corpus.append((name, jpeg, meta["agar"], str(meta["time_hr"])))
+    return corpus
+
+
+def encode_request(contract, image_bytes, agar, colony_age, fields):
+    """(body bytes, content type) of one request in the given upload contract."""
+    if contract == "multipart":
+        boundary = uuid.uuid4().hex
+        parts = []
+        for key, value in {"agar": agar, "colony_age": colony_age, **fields}.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="plate.jpg"\r\n'
+                     f"Content-Type: image/jpeg\r\n\r\n".encode() + image_bytes + b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+        return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+    encoded = base64.b64encode(image_bytes).decode("ascii")
+    if contract == "dataurl":
+        encoded = "data:image/jpeg;base64," + encoded
+    payload = {"image": encoded, "agar": agar, "colony_age": colony_age, **fields}
+    return json.dumps(payload).encode(), "application/json"
+
+
+def parse_field(value):
+    """KEY=VALUE; the value is parsed as JSON when it is valid JSON (tta=4 -> 4, tta=true -> True)."""
+    key, sep, raw = value.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {value!r}")
+    try:
+        return key, json.loads(raw)
+    except ValueError:
+        return key, raw
+
+
+def parse_size(value):
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+# ============================================================
+# Server process sampling (/proc)
+# ============================================================
+def listening_pid(port):
+    """PID of the process listening on a local TCP port, or None (Linux only)."""
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == "0A" and int(fields[1].rsplit(":", 1)[1], 16) == port:  # 0A = LISTEN
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    if not inodes:
+        return None
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            for fd in os.listdir(f"/proc/{pid}/fd"):
+                if os.readlink(f"/proc/{pid}/fd/{fd}") in targets:
+                    return int(pid)
+        except OSError:
+            continue
+    return None
+
+
+def process_tree(root):
+    """root and all its descendants."""
+    children = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(pid))
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+def read_usage(pids):
+    """(CPU seconds, RSS bytes) summed over pids that still exist."""
+    cpu_ticks = rss_pages = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as f:
+                rss_pages += int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        cpu_ticks += int(fields[11]) + int(fields[12])  # utime + stime
+    return cpu_ticks / CLK_TCK, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class ServerSampler:
+    """Samples CPU % (of one core) and RSS of a process tree every interval seconds on a daemon thread."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="server-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        pids = process_tree(self.pid)
+        last_wall, (last_cpu, _) = time.perf_counter(), read_usage(pids)
+        refresh = 0
+        while not self._stop.wait(self.interval):
+            refresh += 1
+            if refresh % 10 == 0:  # pick up workers forked during the run
+                pids = process_tree(self.pid)
+            wall, (cpu, rss) = time.perf_counter(), read_usage(pids)
+            self.samples.append((wall, 100 * (cpu - last_cpu) / (wall - last_wall), rss / 2**20))
+            last_wall, last_cpu = wall, cpu
+
+    def summary(self, start, end):
+        window = [s for s in self.samples if start <= s[0] <= end] or self.samples
+        if not window:
+            return None
+        cpu = [s[1] for s in window]
+        rss = [s[2] for s in window]
+        return {
+            "pid": self.pid,
+            "processes": len(process_tree(self.pid)),
+            "samples": len(window),
+            "cpu_percent_mean": round(statistics.fmean(cpu), 1),
+            "cpu_percent_max": round(max(cpu), 1),
+            "rss_mb_start": round(rss[0], 1),
+            "rss_mb_max": round(max(rss), 1),
+            "rss_mb_end": round(rss[-1], 1),
+            "timeline": [[round(t - start, 2), round(c, 1), round(r, 1)] for t, c, r in window],
+        }
+
+
+# ============================================================
+# Load generation
+# ============================================================
+class Client:
+    """One keep-alive HTTP connection; reconnects once when the server closed it between requests."""
+
+    def __init__(self, host, port, path, timeout):
+        self.host, self.port, self.path, self.timeout = host, port, path, timeout
+        self.conn = None
+
+    def post(self, body, content_type):
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request("POST", self.path, body, {"Content-Type": content_type})
+                response = self.conn.getresponse()
+                response.read()
+                if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                    self.close()
+                return response.status
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def run_load(client_args, bodies, concurrency, rate, arrival, duration, warmup, seed):
+    """Send requests for warmup + duration seconds; returns [(scheduled, start, end, status or error name)]."""
+    results = []
+    begin = time.perf_counter()
+    deadline = begin + warmup + duration
+    jobs = queue.Queue() if rate else None
+
+    def send(client, scheduled, index):
+        body, content_type = bodies[index % len(bodies)]
+        start = time.perf_counter()
+        try:
+            outcome = client.post(body, content_type)
+        except (OSError, http.client.HTTPException) as e:
+            client.close()
+            outcome = type(e).__name__
+        results.append((scheduled, start, time.perf_counter(), outcome))
+
+    def closed_loop(worker):
+        client, index = Client(*client_args), worker
+        while time.perf_counter() < deadline:
+            send(client, time.perf_counter(), index)
+            index += concurrency
+        client.close()
+
+    def open_loop(_):
+        client = Client(*client_args)
+        while (job := jobs.get()) is not None:
+            send(client, *job)
+        client.close()
+
+    threads = [threading.Thread(target=open_loop if rate else closed_loop, args=(i,), daemon=True)
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    if rate:
+        rng = random.Random(seed)
+        scheduled, index = begin, 0
+        while scheduled < deadline:
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            jobs.put((scheduled, index))
+            index += 1
+            scheduled += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        for _ in threads:
+            jobs.put(None)
+    for thread in threads:
+        thread.join()
+    return results, begin
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def summarize(results, start, end):
+    """Client-side summary of the requests scheduled inside [start, end)."""
+    window = [r for r in results if start <= r[0] < end]
+    ok = [r for r in window if r[3] == 200]
+    outcomes = {}
+    for r in window:
+        outcomes[str(r[3])] = outcomes.get(str(r[3]), 0) + 1
+    latency = [(r[2] - r[0]) * 1000 for r in ok]
+    service = [(r[2] - r[1]) * 1000 for r in ok]
+    seconds = end - start
+    summary = {
+        "requests": len(window),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(window), 4) if window else None,
+        "outcomes": outcomes,
+        "throughput_rps": round(len(ok) / seconds, 3),
+        "offered_rps": round(len(window) / seconds, 3),
+    }
+    if latency:
+        summary["latency_ms"] = {
+            "p50": round(percentile(latency, 0.50), 1),
+            "p90": round(percentile(latency, 0.90), 1),
+            "p95": round(percentile(latency, 0.95), 1),
+            "p99": round(percentile(latency, 0.99), 1),
+            "max": round(max(latency), 1),
+            "mean": round(statistics.fmean(latency), 1),
+        }
+        summary["service_ms_p50"] = round(percentile(service, 0.50), 1)
+    return summary
+
+
+COMPARED = (
+    ("throughput_rps", ("client", "throughput_rps")),
+    ("error_rate", ("client", "error_rate")),
+    ("latency p50 ms", ("client", "latency_ms", "p50")),
+    ("latency p95 ms", ("client", "latency_ms", "p95")),
+    ("latency p99 ms", ("client", "latency_ms", "p99")),
+    ("server cpu % mean", ("server", "cpu_percent_mean")),
+    ("server rss MB max", ("server", "rss_mb_max")),
+)
+
+
+def lookup(report, keys):
+    for key in keys:
+        report = report.get(key) if isinstance(report, dict) else None
+    return report
+
+
+def print_comparison(report, previous, path):
+    print(f"\nAgainst {path} ({previous.get('created_at')}, {previous['config'].get('label')}):")
+    print(f"  {'':20s} {'before':>10s} {'now':>10s} {'change':>8s}")
+    for label, keys in COMPARED:
+        before, now = lookup(previous, keys), lookup(report, keys)
+        if before is None or now is None:
+            continue
+        change = f"{now / before - 1:+8.1%}" if before else ""
+        print(f"  {label:20s} {before:10.4g} {now:10.4g} {change}")
+    differing = {k: (previous["config"].get(k), v) for k, v in report["config"].items()
+                 if k not in ("label", "url") and previous["config"].get(k) != v}
+    if differing:
+        print(f"[WARN] Runs differ in configuration: {differing}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=list(BACKEND_URLS), default="backend2")
+    parser.add_argument("--url", help="base URL (default: the --backend's local port)")
+    parser.add_argument("--endpoint", default="/predict")
+    parser.add_argument("--contract", choices=CONTRACTS, default="json")
+    parser.add_argument("--field", action="append", type=parse_field, default=[], metavar="KEY=VALUE",
+                        help="extra request field, e.g. tta=4 (repeatable)")
+    parser.add_argument("--images", help="directory of plate photos (metadata.csv with filename,agar,time_hr is optional)")
+    parser.add_argument("--limit", type=int, default=0, help="use at most this many images from --images")
+    parser.add_argument("--synthetic", type=int, default=12, help="procedural plates when --images is not given")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=[(640, 480), (1600, 1200), (4032, 3024)],
+                        metavar="WxH", help="synthetic photo sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=4, help="clients (closed loop) or senders (with --rate)")
+    parser.add_argument("--rate", type=float, help="open loop: arrivals per second")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout, seconds")
+    parser.add_argument("--server-pid", type=int, help="process to sample (default: whoever listens on the port)")
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--label", help="name of this run in the report (default: backend/contract/load)")
+    parser.add_argument("--output", help=f"report path (default: {REPORTS_DIR}/<label>_<time>.json)")
+    parser.add_argument("--compare", metavar="REPORT", help="print this run next to an earlier report")
+    args = parser.parse_args(argv)
+
+    url = urlsplit(args.url or BACKEND_URLS[args.backend])
+    if url.scheme != "http" or (url.hostname or "") not in LOOPBACK_HOSTS and not (url.hostname or "").startswith("127."):
+        parser.error(f"only http://localhost targets are allowed, got {url.geturl()}")
+    if args.concurrency < 1 or (args.rate is not None and args.rate <= 0):
+        parser.error("--concurrency must be >= 1 and --rate > 0")
+    port = url.port or 80
+    fields = dict(args.field)
+    load = f"rate{args.rate:g}" if args.rate else f"c{args.concurrency}"
+    label = args.label or f"{args.backend}_{args.contract}_{load}"
+
+    corpus = load_images(args.images, args.limit) if args.images else synthetic_images(args.synthetic, args.sizes, args.seed)
+    if not corpus:
+        print("[ERROR] No images to send")
+        return 1
+    bodies = [encode_request(args.contract, data, agar, age, fields) for _, data, agar, age in corpus]
+    body_kb = statistics.fmean(len(body) for body, _ in bodies) / 1024
+    print(f"[INFO] {len(corpus)} images, mean request body {body_kb:.0f} KB ({args.contract})")
+
+    server_pid = args.server_pid or (listening_pid(port) if sys.platform.startswith("linux") else None)
+    if server_pid:
+        print(f"[INFO] Sampling server process {server_pid}")
+    else:
+        print(f"[WARN] No server process found for port {port}; RSS/CPU will not be reported")
+    sampler = ServerSampler(server_pid, args.sample_interval).start() if server_pid else None
+
+    print(f"[INFO] {label}: {url.geturl()}{args.endpoint}, "
+          f"{'%g req/s (%s), %d senders' % (args.rate, args.arrival, args.concurrency) if args.rate else '%d clients' % args.concurrency}, "
+          f"{args.warmup:g}s warm-up + {args.duration:g}s")
+    client_cpu = time.process_time()
+    results, begin = run_load((url.hostname, port, args.endpoint, args.timeout), bodies, args.concurrency,
+                              args.rate, args.arrival, args.duration, args.warmup, args.seed)
+    client_cpu = time.process_time() - client_cpu
+    if sampler:
+        sampler.stop()
+
+    start, end = begin + args.warmup, begin + args.warmup + args.duration
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "label": label,
+            "url": url.geturl() + args.endpoint,
+            "backend": args.backend,
+            "contract": args.contract,
+            "fields": fields,
+            "load": {"concurrency": args.concurrency, "rate": args.rate, "arrival": args.arrival if args.rate else None},
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "corpus": {"source": args.images or "synthetic", "images": len(corpus),
+                       "sizes": None if args.images else [f"{w}x{h}" for w, h in args.sizes]},
+            "mean_body_kb": round(body_kb, 1),
+        },
+        "environment": {"host_cpus": os.cpu_count(), "python": platform.python_version(), "machine": platform.machine()},
+        "client": {**summarize(results, start, end), "client_cpu_s": round(client_cpu, 2),
+                   "completed_after_window": sum(1 for r in results if r[0] >= end)},
+        "server": sampler.summary(start, end) if sampler else None,
+    }
+
+    output = Path(args.output) if args.output else REPORTS_DIR / f"{label}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    tmp.replace(output)
+
+    client, server = report["client"], report["server"]
+    print(f"\n{client['requests']} requests in {args.duration:g}s: {client['throughput_rps']:.2f} ok/s "
+          f"(offered {client['offered_rps']:.2f}/s), error rate "
+          f"{'n/a' if client['error_rate'] is None else format(client['error_rate'], '.2%')}, outcomes {client['outcomes']}")
+    if "latency_ms" in client:
+        latency = client["latency_ms"]
+        print(f"latency ms: p50 {latency['p50']}  p90 {latency['p90']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+              f"max {latency['max']}  (service p50 {client['service_ms_p50']})")
+    if server:
+        print(f"server: CPU {server['cpu_percent_mean']}% mean / {server['cpu_percent_max']}% max of one core, "
+              f"RSS {server['rss_mb_start']} -> {server['rss_mb_end']} MB (max {server['rss_mb_max']})")
+    print(f"client CPU {client['client_cpu_s']}s over {args.warmup + args.duration:g}s")
+    print(f"[INFO] Report: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f), args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())